@@ -0,0 +1,122 @@
+from fastapi import APIRouter, HTTPException, Body, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
+import json
+
+from app.api.simulation import (
+    ReplicateRequest, ScenarioBatchRequest, SimulationRequest,
+    run_complex, run_replicates, run_scenarios,
+)
+from app.core import config
+from app.core.jobs import FINISHED, SUCCEEDED, JobQueue, QueueFull
+
+router = APIRouter()
+job_queue = JobQueue(
+    workers=config.JOB_WORKERS,
+    max_pending=config.JOB_MAX_PENDING,
+    max_finished=config.JOB_MAX_FINISHED,
+    default_timeout=config.JOB_TIMEOUT or None,
+)
+
+def submit(kind, fn, timeout):
+    try:
+        return job_queue.submit(kind, fn, timeout).snapshot()
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+def find(job_id):
+    try:
+        return job_queue.get(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+
+@router.post("/complex", status_code=202)
+async def submit_complex(
+    request: SimulationRequest = Body(...),
+    timeout: Optional[float] = Query(None, description="Seconds the job may run, defaults to JOB_TIMEOUT"),
+):
+    """
+    Queue a complex simulation and return its job without waiting for it
+    """
+    return submit("complex", lambda progress: run_complex(request, progress), timeout)
+
+@router.post("/replicates", status_code=202)
+async def submit_replicates(
+    request: ReplicateRequest = Body(...),
+    timeout: Optional[float] = Query(None, description="Seconds the job may run, defaults to JOB_TIMEOUT"),
+):
+    """
+    Queue seeded replicates of a complex simulation
+    """
+    return submit("replicates", lambda progress: run_replicates(request, progress), timeout)
+
+@router.post("/scenarios", status_code=202)
+async def submit_scenarios(
+    request: ScenarioBatchRequest = Body(...),
+    timeout: Optional[float] = Query(None, description="Seconds the job may run, defaults to JOB_TIMEOUT"),
+):
+    """
+    Queue a batch of incident scenarios
+    """
+    return submit("scenarios", lambda progress: run_scenarios(request, progress), timeout)
+
+@router.get("/")
+async def list_jobs():
+    """
+    Status of every queued, running and recently finished job
+    """
+    return [job.snapshot() for job in job_queue.jobs()]
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """
+    Status and progress of a job
+    """
+    return find(job_id).snapshot()
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str):
+    """
+    Result of a finished job; 409 while it is still queued or running or when it did not succeed
+    """
+    status = find(job_id).snapshot(include_result=True)
+    if status["state"] != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=status)
+    return status["result"]
+
+@router.get("/{job_id}/events")
+async def stream_job(
+    job_id: str,
+    interval: float = Query(0.25, gt=0, description="Seconds between progress checks"),
+):
+    """
+    Stream a job's status as newline-delimited JSON on every change, until it finishes
+    """
+    job = find(job_id)
+
+    async def events():
+        revision = None
+        while True:
+            # Read the revision first so a change during the snapshot is sent next
+            # time; the final status is always sent
+            current = job.revision
+            status = job.snapshot()
+            if current != revision or status["state"] in FINISHED:
+                revision = current
+                yield json.dumps(status) + "\n"
+            if status["state"] in FINISHED:
+                return
+            await asyncio.sleep(interval)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancel a queued job, or stop a running one at its next checkpoint
+    """
+    job = find(job_id)
+    if not job.cancel():
+        raise HTTPException(status_code=409, detail=f"Job {job_id} has already finished")
+    return job.snapshot()
@@ -1,11 +1,97 @@
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Query, HTTPException, Header
+from fastapi.responses import Response, StreamingResponse
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 
+from app.core import binary_network, config
+from app.core.response_cache import ResponseCache, accepts_gzip, etag_matches, make_etag
 from app.services.network_service import NetworkService
 
 router = APIRouter()
 network_service = NetworkService()
+response_cache = ResponseCache(config.RESPONSE_CACHE_MAX_BYTES, config.RESPONSE_CACHE_MAX_ENTRY_BYTES)
+
+GEOJSON_MEDIA_TYPE = "application/geo+json"
+
+def _prefers_binary(accept, media_type=binary_network.MEDIA_TYPE):
+    """
+    True when the Accept header ranks a binary format (the network one by default)
+    above everything else
+    """
+    if not accept:
+        return False
+    binary_q, other_q = 0.0, 0.0
+    for part in accept.split(","):
+        offered, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if offered.strip() == media_type:
+            binary_q = max(binary_q, q)
+        else:
+            other_q = max(other_q, q)
+    return binary_q > 0 and binary_q >= other_q
+
+def _not_modified(key, accept=None, if_none_match=None):
+    """
+    304 for a request whose key already loaded the current network and whose
+    ETag names that version, decided before anything is loaded; else None
+    """
+    if not if_none_match:
+        return None
+    fmt = "binary" if _prefers_binary(accept) else "geojson"
+    version = network_service.request_version(key)
+    if version is None or version != network_service.graph_version:
+        return None
+    if not etag_matches(if_none_match, version, fmt):
+        return None
+    return Response(status_code=304, headers={
+        "Vary": "Accept, Accept-Encoding", "Cache-Control": "no-cache", "ETag": make_etag(version, fmt)
+    })
+
+def _network_response(accept=None, if_none_match=None, accept_encoding=None):
+    """
+    Respond with the currently loaded network in the format the client asked for.
+
+    Encoded bodies are cached per graph version, so repeat requests skip the
+    encoder and clients holding a current ETag get a 304 with no body.
+    """
+    fmt = "binary" if _prefers_binary(accept) else "geojson"
+    media_type = binary_network.MEDIA_TYPE if fmt == "binary" else GEOJSON_MEDIA_TYPE
+    version = network_service.graph_version
+    headers = {"Vary": "Accept, Accept-Encoding", "Cache-Control": "no-cache"}
+
+    if etag_matches(if_none_match, version, fmt):
+        headers["ETag"] = make_etag(version, fmt)
+        return Response(status_code=304, headers=headers)
+
+    entry = response_cache.get(version, fmt)
+    if entry is None and fmt == "binary":
+        body = binary_network.encode_network(network_service.current_core)
+        entry = response_cache.put(version, fmt, body)
+        if entry is None:
+            headers["ETag"] = make_etag(version, fmt)
+            return Response(content=body, media_type=media_type, headers=headers)
+
+    if entry is not None:
+        if accepts_gzip(accept_encoding):
+            headers.update({"ETag": entry.gzip_etag, "Content-Encoding": "gzip"})
+            return Response(content=entry.gzip_body, media_type=media_type, headers=headers)
+        headers["ETag"] = entry.etag
+        return Response(content=entry.body, media_type=media_type, headers=headers)
+
+    # First GeoJSON request for this version: stream it and keep a copy
+    headers["ETag"] = make_etag(version, fmt)
+    return StreamingResponse(
+        response_cache.stream_and_store(version, fmt, network_service.iter_geojson()),
+        media_type=media_type,
+        headers=headers,
+    )
 
 class BoundingBox(BaseModel):
     min_x: float
@@ -19,38 +105,58 @@ async def get_network(
     min_y: float = Query(..., description="Minimum latitude"),
     max_x: float = Query(..., description="Maximum longitude"),
     max_y: float = Query(..., description="Maximum latitude"),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
 ):
     """
     Get a road network within the specified bounding box
     """
     try:
         bbox = BoundingBox(min_x=min_x, min_y=min_y, max_x=max_x, max_y=max_y)
-        network = network_service.get_network(bbox)
-        return network
+        not_modified = _not_modified(network_service.bbox_key(bbox), accept, if_none_match)
+        if not_modified is not None:
+            return not_modified
+        network_service.load_network(bbox)
+        return _network_response(accept, if_none_match, accept_encoding)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sample")
-async def get_sample_network():
+async def get_sample_network(
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
     """
     Get a sample road network for testing
     """
     try:
         # This will return a small predefined network for testing
-        network = network_service.get_sample_network()
-        return network
+        not_modified = _not_modified("sample", accept, if_none_match)
+        if not_modified is not None:
+            return not_modified
+        network_service.load_sample_network()
+        return _network_response(accept, if_none_match, accept_encoding)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/square-intersection")
-async def get_square_intersection():
+async def get_square_intersection(
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
     """
     Get a square intersection (chock) network with traffic signals
     """
     try:
         # This will return a square intersection network with traffic signals
-        network = network_service.get_square_intersection_network()
-        return network
+        not_modified = _not_modified("square-intersection", accept, if_none_match)
+        if not_modified is not None:
+            return not_modified
+        network_service.load_square_intersection_network()
+        return _network_response(accept, if_none_match, accept_encoding)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -89,7 +195,7 @@ async def debug_network():
             "edge_count": len(edges),
             "sample_node": sample_node,
             "sample_edge": sample_edge,
-            "has_geojson": network_service.current_geojson is not None
+            "has_geojson": network_service.current_core is not None
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Body, Header
+from fastapi.responses import Response
+from typing import List, Optional, Union
+from pydantic import BaseModel
+
+from app.api.network import _prefers_binary, network_service
+from app.core import matrix as matrix_format
+from app.services.route_service import RouteService
+
+router = APIRouter()
+# Matrices are computed on the network most recently loaded through /network
+route_service = RouteService(network_service)
+
+class MatrixRequest(BaseModel):
+    sources: List[Union[int, str, List[float]]]  # node IDs or [longitude, latitude] pairs
+    targets: Optional[List[Union[int, str, List[float]]]] = None  # defaults to the sources
+
+@router.post("/matrix")
+def travel_time_matrix(request: MatrixRequest = Body(...), accept: Optional[str] = Header(None)):
+    """
+    Travel-time matrix (seconds) between every source and target of the loaded network
+    """
+    try:
+        sources, targets, matrix = route_service.travel_time_matrix(request.sources, request.targets)
+        if _prefers_binary(accept, matrix_format.MEDIA_TYPE):
+            return Response(
+                content=matrix_format.encode_matrix(matrix),
+                media_type=matrix_format.MEDIA_TYPE,
+                headers={"Vary": "Accept"},
+            )
+        # One row per source, null where a target cannot be reached
+        rows = [[None if value == float("inf") else value for value in row] for row in matrix.tolist()]
+        return {
+            "sources": sources,
+            "targets": targets,
+            "travel_time": rows,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
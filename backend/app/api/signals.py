@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+
+from app.api.simulation import simulation_service
+
+router = APIRouter()
+
+@router.get("/state")
+async def get_signal_state(
+    t: str = Query(..., description="Comma-separated simulation times in seconds"),
+    ids: Optional[str] = Query(None, description="Comma-separated intersection or road IDs (all when omitted)"),
+):
+    """
+    Light shown by each approach of the current simulation at one or many times
+    """
+    try:
+        times = [float(value) for value in t.split(",") if value.strip()]
+        road_ids = [value.strip() for value in ids.split(",") if value.strip()] if ids else None
+        return simulation_service.signal_states(times, road_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
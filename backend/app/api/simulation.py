@@ -12,10 +12,22 @@ class Incident(BaseModel):
     severity: float  # 0.0 to 1.0, where 1.0 is completely blocked
     description: Optional[str] = None
 
+class Demand(BaseModel):
+    source: str
+    target: str
+    flow: float  # vehicles per hour from source to target
+
 class SimulationRequest(BaseModel):
     duration: int = 300  # simulation duration in seconds
     incidents: Optional[List[Incident]] = None
     vehicles_count: int = 10
+    routing: str = "auto"  # auto, dijkstra, astar (straight-line bound) or alt (landmarks)
+    landmarks: Optional[int] = None  # ALT landmark count, defaults to ROUTING_LANDMARKS
+    engine: str = "static"  # static (routes only), micro or event (vehicles, signals, queues), ctm (cell flow)
+    signal_timing: str = "fixed"  # fixed or webster (cycles and splits from the demand)
+    demand: Optional[List[Demand]] = None  # OD flows for webster timing, defaults to the routed vehicles
+    green_wave: bool = False  # offset signals along named arterials for green waves both ways
+    seed: Optional[int] = None  # seed for the random routes, makes a run reproducible
 
 @router.post("/basic")
 async def simulate_basic():
@@ -29,7 +41,7 @@ async def simulate_basic():
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/dynamic")
-async def simulate_dynamic(incident: Incident = Body(...)):
+def simulate_dynamic(incident: Incident = Body(...)):
     """
     Run a dynamic simulation with an incident, returning updated timings & alternative routes
     """
@@ -39,17 +51,112 @@ async def simulate_dynamic(incident: Incident = Body(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/incidents")
+def update_incidents(incidents: List[Incident] = Body(...)):
+    """
+    Replace the active incidents (an empty list clears them), re-routing only affected vehicles
+    """
+    try:
+        result = simulation_service.update_incidents(incidents)
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def run_complex(request, progress=None):
+    """
+    Complex simulation for a SimulationRequest; shared with the background job endpoints
+    """
+    return simulation_service.run_complex_simulation(
+        duration=request.duration,
+        incidents=request.incidents or [],
+        vehicles_count=request.vehicles_count,
+        routing=request.routing,
+        landmarks=request.landmarks,
+        engine=request.engine,
+        signal_timing=request.signal_timing,
+        demand=request.demand,
+        green_wave=request.green_wave,
+        seed=request.seed,
+        progress=progress
+    )
+
+# CPU-bound simulations are plain `def` handlers so they run in the threadpool,
+# not on the event loop; /jobs runs them in the background instead
 @router.post("/complex")
-async def simulate_complex(request: SimulationRequest = Body(...)):
+def simulate_complex(request: SimulationRequest = Body(...)):
     """
     Run a complex simulation with multiple incidents & concurrent vehicles
     """
     try:
-        result = simulation_service.run_complex_simulation(
-            duration=request.duration,
-            incidents=request.incidents or [],
-            vehicles_count=request.vehicles_count
-        )
+        result = run_complex(request)
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class ReplicateRequest(SimulationRequest):
+    replicates: int = 10  # seeded runs, each replicate's seed is spawned from `seed`
+    confidence: float = 0.95  # level of the confidence intervals of the mean
+    include_runs: bool = False  # also return every replicate's full simulation
+
+def run_replicates(request, progress=None):
+    """
+    Seeded replicates for a ReplicateRequest
+    """
+    return simulation_service.run_replicates(
+        replicates=request.replicates,
+        duration=request.duration,
+        incidents=request.incidents or [],
+        vehicles_count=request.vehicles_count,
+        routing=request.routing,
+        landmarks=request.landmarks,
+        engine=request.engine,
+        signal_timing=request.signal_timing,
+        demand=request.demand,
+        green_wave=request.green_wave,
+        seed=request.seed,
+        confidence=request.confidence,
+        include_runs=request.include_runs,
+        progress=progress
+    )
+
+@router.post("/replicates")
+def simulate_replicates(request: ReplicateRequest = Body(...)):
+    """
+    Run seeded replicates of a complex simulation and return travel time statistics per route & road
+    """
+    try:
+        result = run_replicates(request)
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class Scenario(BaseModel):
+    id: Optional[str] = None  # defaults to the scenario's position in the batch
+    incidents: List[Incident]
+
+class ScenarioBatchRequest(BaseModel):
+    scenarios: List[Scenario]
+    vehicles_count: int = 100  # OD pairs shared by every scenario
+    workers: Optional[int] = None  # process pool size, defaults to SCENARIO_WORKERS
+
+def run_scenarios(request, progress=None):
+    """
+    Scenario comparison for a ScenarioBatchRequest
+    """
+    return simulation_service.run_scenarios(
+        [(scenario.id or str(i + 1), scenario.incidents) for i, scenario in enumerate(request.scenarios)],
+        vehicles_count=request.vehicles_count,
+        workers=request.workers,
+        progress=progress
+    )
+
+@router.post("/scenarios")
+def simulate_scenarios(request: ScenarioBatchRequest = Body(...)):
+    """
+    Run a batch of incident scenarios in parallel and compare their impact on one fleet
+    """
+    try:
+        result = run_scenarios(request)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -59,7 +166,7 @@ class SquareIntersectionRequest(BaseModel):
     with_incident: bool = False
 
 @router.post("/square-intersection")
-async def simulate_square_intersection(request: SquareIntersectionRequest = Body(...)):
+def simulate_square_intersection(request: SquareIntersectionRequest = Body(...)):
     """
     Run a simulation with a square intersection (chock) with traffic signals
     """
@@ -71,3 +178,13 @@ async def simulate_square_intersection(request: SquareIntersectionRequest = Body
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/route-cache")
+async def route_cache_stats():
+    """
+    Hit/miss counters and size of the simulation route cache
+    """
+    try:
+        return simulation_service.network_service.route_cache.stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
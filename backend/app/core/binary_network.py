@@ -0,0 +1,131 @@
+"""
+Compact binary network format, an alternative to GeoJSON for map clients.
+
+Layout (little-endian, every section padded to 8 bytes):
+
+    header    magic "STNB", u16 version, u16 flags, u32 nodes, u32 edges,
+              u32 names, u32 coordinate scale (units per degree)
+    node ids  int64[nodes], or a string table when FLAG_STRING_IDS is set
+    lon       int32[nodes], quantized and delta-encoded
+    lat       int32[nodes], quantized and delta-encoded
+    edges     int32[2 * edges], interleaved (u, v) node index pairs
+    length    float32[edges]
+    travel    float32[edges]
+    name ids  int32[edges], -1 when the road has no name
+    names     string table: u32 byte length + UTF-8 names joined by NUL
+"""
+
+import struct
+import numpy as np
+
+MEDIA_TYPE = "application/vnd.smart-traffic.network"
+MAGIC = b"STNB"
+VERSION = 1
+
+# 1e-7 degrees is ~1 cm, well below OSM's own precision
+COORDINATE_SCALE = 10_000_000
+
+FLAG_STRING_IDS = 1
+
+_HEADER = struct.Struct("<4sHHIIII")
+
+
+def _pad(buffer):
+    buffer.extend(b"\0" * (-len(buffer) % 8))
+
+
+def _string_table(buffer, strings):
+    data = "\0".join(strings).encode("utf-8")
+    buffer.extend(struct.pack("<I", len(data)))
+    buffer.extend(data)
+    _pad(buffer)
+
+
+def _read_string_table(data, offset, count):
+    (size,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    strings = data[offset:offset + size].decode("utf-8").split("\0") if count else []
+    offset += size
+    return strings, offset + (-offset % 8)
+
+
+def _quantize(values):
+    """
+    Quantize degrees onto the fixed grid and delta-encode them in node order
+    """
+    q = np.round(np.nan_to_num(values, nan=0.0) * COORDINATE_SCALE).astype(np.int64)
+    deltas = np.diff(q, prepend=0)
+    if len(deltas) and np.abs(deltas).max() > np.iinfo(np.int32).max:
+        raise ValueError("Network spans too wide an area for the binary format")
+    return deltas.astype(np.int32)
+
+
+def encode_network(core):
+    """
+    Encode a compact graph into the binary network format
+    """
+    string_ids = core.node_ids.dtype.kind not in "iu"
+    buffer = bytearray(_HEADER.pack(
+        MAGIC, VERSION, FLAG_STRING_IDS if string_ids else 0,
+        core.num_nodes, core.num_edges, len(core.names), COORDINATE_SCALE,
+    ))
+    _pad(buffer)
+
+    if string_ids:
+        _string_table(buffer, [str(n) for n in core.node_ids.tolist()])
+    else:
+        buffer.extend(core.node_ids.astype("<i8").tobytes())
+    for column in (
+        _quantize(core.x),
+        _quantize(core.y),
+        np.column_stack([core.edge_u, core.edge_v]).ravel(),
+    ):
+        buffer.extend(column.astype("<i4").tobytes())
+        _pad(buffer)
+    buffer.extend(core.length.astype("<f4").tobytes())
+    _pad(buffer)
+    buffer.extend(core.travel_time.astype("<f4").tobytes())
+    _pad(buffer)
+    buffer.extend(core.name_ids.astype("<i4").tobytes())
+    _pad(buffer)
+    _string_table(buffer, core.names)
+    return bytes(buffer)
+
+
+def decode_network(data):
+    """
+    Decode the binary network format into NumPy columns (coordinates in degrees)
+    """
+    magic, version, flags, nodes, edges, names, scale = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a supported binary network payload")
+    offset = _HEADER.size + (-_HEADER.size % 8)
+
+    def take(dtype, count):
+        nonlocal offset
+        column = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += column.nbytes
+        offset += -offset % 8
+        return column
+
+    if flags & FLAG_STRING_IDS:
+        node_ids, offset = _read_string_table(data, offset, nodes)
+    else:
+        node_ids = take("<i8", nodes)
+    lon = np.cumsum(take("<i4", nodes), dtype=np.int64) / scale
+    lat = np.cumsum(take("<i4", nodes), dtype=np.int64) / scale
+    pairs = take("<i4", 2 * edges).reshape(-1, 2)
+    length = take("<f4", edges)
+    travel_time = take("<f4", edges)
+    name_ids = take("<i4", edges)
+    road_names, offset = _read_string_table(data, offset, names)
+    return {
+        "node_ids": node_ids,
+        "x": lon,
+        "y": lat,
+        "edges": pairs,
+        "length": length,
+        "travel_time": travel_time,
+        "name_ids": name_ids,
+        "names": road_names,
+    }
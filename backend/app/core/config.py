@@ -0,0 +1,90 @@
+"""
+Runtime settings, read from the environment (a .env file is honored if present).
+"""
+
+import json
+import math
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Directory holding memory-mapped graph snapshots keyed by bounding box
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+
+# Bounding boxes are snapped outward to this many decimal degrees before keying
+SNAPSHOT_BBOX_PRECISION = int(os.getenv("SNAPSHOT_BBOX_PRECISION", "4"))
+
+# Overpass response cache managed by app.core.overpass_cache
+OVERPASS_CACHE_DIR = os.getenv("OVERPASS_CACHE_DIR", "cache")
+OVERPASS_CACHE_MAX_BYTES = int(os.getenv("OVERPASS_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+OVERPASS_CACHE_MAX_AGE = int(os.getenv("OVERPASS_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+# Let the cache delete raw OSMnx JSON files it did not write once they are
+# compacted or evicted; off keeps them (e.g. when they are checked in)
+OVERPASS_CACHE_REMOVE_RAW = os.getenv("OVERPASS_CACHE_REMOVE_RAW", "false").lower() in ("1", "true", "yes")
+
+# Networks are loaded and cached as fixed grid tiles of this many degrees
+NETWORK_TILE_SIZE = float(os.getenv("NETWORK_TILE_SIZE", "0.02"))
+NETWORK_TILE_WORKERS = int(os.getenv("NETWORK_TILE_WORKERS", "4"))
+# Largest bbox side (degrees) one request may load. An unaligned bbox of that
+# side covers ceil(span / tile size) + 1 tiles per axis, which sets the default
+# tile limit (26 x 26 tiles of 0.02 degrees); every uncached tile is one Overpass query
+NETWORK_MAX_SPAN = float(os.getenv("NETWORK_MAX_SPAN", "0.5"))
+NETWORK_MAX_TILES = int(os.getenv(
+    "NETWORK_MAX_TILES", str((math.ceil(round(NETWORK_MAX_SPAN / NETWORK_TILE_SIZE, 9)) + 1) ** 2)
+))
+
+# Encoded /network responses kept in memory, keyed by graph version and format
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(64 * 1024 ** 2)))
+
+# Edge weighting: speeds (km/h) for untagged roads by OSM highway class, e.g.
+# HIGHWAY_SPEEDS='{"residential": 25, "primary": 70}', and the fallback speed
+HIGHWAY_SPEEDS = json.loads(os.getenv("HIGHWAY_SPEEDS", "{}"))
+DEFAULT_SPEED_KPH = float(os.getenv("DEFAULT_SPEED_KPH", "50"))
+
+# Contraction hierarchies for travel-time routing; graphs with fewer edges keep
+# plain Dijkstra. Built hierarchies are persisted under SNAPSHOT_DIR/contraction.
+CONTRACTION_HIERARCHIES = os.getenv("CONTRACTION_HIERARCHIES", "true").lower() in ("1", "true", "yes")
+CONTRACTION_MIN_EDGES = int(os.getenv("CONTRACTION_MIN_EDGES", "5000"))
+
+# Start method of worker processes (contraction builds, matrices, scenarios).
+# The API process runs thread pools, so workers are never plain forks of it.
+PROCESS_START_METHOD = os.getenv("PROCESS_START_METHOD", "forkserver")
+
+# Default number of ALT landmarks for goal-directed routing (requests may override)
+ROUTING_LANDMARKS = int(os.getenv("ROUTING_LANDMARKS", "8"))
+
+# Origins with at least this many distinct destinations get one shortest-path
+# tree instead of separate point-to-point queries
+ROUTE_TREE_MIN_TARGETS = int(os.getenv("ROUTE_TREE_MIN_TARGETS", "4"))
+
+# LRU cache of computed routes per NetworkService, bounded by entries and bytes
+ROUTE_CACHE_MAX_ENTRIES = int(os.getenv("ROUTE_CACHE_MAX_ENTRIES", "100000"))
+ROUTE_CACHE_MAX_BYTES = int(os.getenv("ROUTE_CACHE_MAX_BYTES", str(64 * 1024 ** 2)))
+
+# Travel-time matrices: searches are split into batches of origins and run on a
+# process pool once there are enough of them; requests above MAX_CELLS are refused
+MATRIX_WORKERS = int(os.getenv("MATRIX_WORKERS", str(min(4, os.cpu_count() or 1))))
+MATRIX_BATCH_SIZE = int(os.getenv("MATRIX_BATCH_SIZE", "32"))
+MATRIX_PARALLEL_MIN_SOURCES = int(os.getenv("MATRIX_PARALLEL_MIN_SOURCES", "64"))
+MATRIX_MAX_CELLS = int(os.getenv("MATRIX_MAX_CELLS", "1000000"))
+
+# Incident scenario sweeps (/simulate/scenarios) run on a process pool with the
+# graph in shared memory once a batch has at least SCENARIO_PARALLEL_MIN scenarios
+SCENARIO_WORKERS = int(os.getenv("SCENARIO_WORKERS", str(os.cpu_count() or 1)))
+SCENARIO_PARALLEL_MIN = int(os.getenv("SCENARIO_PARALLEL_MIN", "4"))
+
+# Upper bound on seeded replicates per /simulate/replicates request; batches of
+# at least REPLICATE_PARALLEL_MIN replicates run on a process pool over the shared graph
+SIMULATION_MAX_REPLICATES = int(os.getenv("SIMULATION_MAX_REPLICATES", "200"))
+REPLICATE_WORKERS = int(os.getenv("REPLICATE_WORKERS", str(os.cpu_count() or 1)))
+REPLICATE_PARALLEL_MIN = int(os.getenv("REPLICATE_PARALLEL_MIN", "4"))
+
+# Background simulation jobs (/jobs): worker threads, unfinished jobs accepted
+# at once, finished jobs kept for retrieval, and the default timeout in seconds
+# (0 disables it; requests may set their own)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "64"))
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", "256"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "600"))
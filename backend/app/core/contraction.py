@@ -0,0 +1,320 @@
+import heapq
+import numpy as np
+import networkx as nx
+
+from app.core.snapshot import read_array_dir, write_array_dir
+
+# Bump whenever the on-disk layout or the contraction algorithm changes
+CONTRACTION_VERSION = 1
+
+_ARRAYS = (
+    "rank",
+    "arc_tail", "arc_head", "arc_weight", "arc_edge", "arc_first", "arc_second",
+    "up_indptr", "up_arcs", "down_indptr", "down_arcs",
+)
+
+
+class ContractionHierarchy:
+    """
+    Contraction hierarchy over one edge weight of a compact graph.
+
+    Nodes are contracted in order of importance; shortcuts keep distances
+    intact among the nodes that remain. A query then runs two small Dijkstra
+    searches that only climb the hierarchy (forward from the source, backward
+    from the target) and meet near the top, settling a few hundred nodes
+    instead of a large part of the network.
+
+    Arcs live in one table. Original arcs carry the edge index they came from;
+    shortcuts carry the two arcs they replace (arc_first then arc_second) so
+    paths can be unpacked back into edges of the compact graph.
+    """
+
+    def __init__(self, rank, arc_tail, arc_head, arc_weight, arc_edge, arc_first,
+                 arc_second, up_indptr, up_arcs, down_indptr, down_arcs,
+                 weight="travel_time", fingerprint=None):
+        self.rank = np.asarray(rank, dtype=np.int32)
+        self.arc_tail = np.asarray(arc_tail, dtype=np.int32)
+        self.arc_head = np.asarray(arc_head, dtype=np.int32)
+        self.arc_weight = np.asarray(arc_weight, dtype=np.float64)
+        self.arc_edge = np.asarray(arc_edge, dtype=np.int32)
+        self.arc_first = np.asarray(arc_first, dtype=np.int32)
+        self.arc_second = np.asarray(arc_second, dtype=np.int32)
+        self.up_indptr = np.asarray(up_indptr, dtype=np.int64)
+        self.up_arcs = np.asarray(up_arcs, dtype=np.int32)
+        self.down_indptr = np.asarray(down_indptr, dtype=np.int64)
+        self.down_arcs = np.asarray(down_arcs, dtype=np.int32)
+        self.weight = weight
+        self.fingerprint = fingerprint
+        # Folder the hierarchy was saved to or loaded from; worker processes map it from there
+        self.path = None
+        self._lists = None
+
+    @property
+    def num_shortcuts(self):
+        return int(np.count_nonzero(self.arc_first >= 0))
+
+    @classmethod
+    def build(cls, core, weight="travel_time", witness_limit=64):
+        """
+        Contract every node of a compact graph.
+
+        Witness searches give up after `witness_limit` settled nodes and add
+        the shortcut anyway, which costs a few spare arcs but never correctness.
+        Runs in pure Python, so large regions should be built once and persisted.
+        """
+        n = core.num_nodes
+        inf = float("inf")
+        tail, head, cost, edge, first, second = [], [], [], [], [], []
+        out = [dict() for _ in range(n)]
+        inn = [dict() for _ in range(n)]
+
+        def add_arc(u, v, c, e, a, b):
+            existing = out[u].get(v)
+            if existing is not None and cost[existing] <= c:
+                return
+            arc = len(tail)
+            tail.append(u)
+            head.append(v)
+            cost.append(c)
+            edge.append(e)
+            first.append(a)
+            second.append(b)
+            out[u][v] = arc
+            inn[v][u] = arc
+
+        weights = core.edge_weights(weight).tolist()
+        for e, (u, v) in enumerate(zip(core.edge_u.tolist(), core.edge_v.tolist())):
+            c = weights[e]
+            if u == v or c == inf:
+                continue
+            add_arc(u, v, c, e, -1, -1)
+            if not core.directed:
+                add_arc(v, u, c, e, -1, -1)
+
+        # out/inn only hold arcs between nodes that are not contracted yet
+        contracted_neighbors = [0] * n
+        level = [0] * n
+
+        def witness(source, skip, bound, targets):
+            dist = {source: 0.0}
+            heap = [(0.0, source)]
+            settled = 0
+            remaining = set(targets)
+            while heap and remaining and settled < witness_limit:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                if d > bound:
+                    break
+                settled += 1
+                remaining.discard(u)
+                for v, arc in out[u].items():
+                    if v == skip:
+                        continue
+                    nd = d + cost[arc]
+                    if nd < dist.get(v, inf):
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+            return dist
+
+        def shortcuts(v):
+            ins = list(inn[v].items())
+            outs = list(out[v].items())
+            found = []
+            for u, a_in in ins:
+                targets = {x: cost[a_in] + cost[a_out] for x, a_out in outs if x != u}
+                if not targets:
+                    continue
+                dist = witness(u, v, max(targets.values()), targets)
+                for x, a_out in outs:
+                    if x != u and dist.get(x, inf) > targets[x]:
+                        found.append((u, x, targets[x], a_in, a_out))
+            return found, len(ins) + len(outs)
+
+        def priority(v):
+            # Edge difference, spread out by contracted neighbors and hierarchy depth
+            found, degree = shortcuts(v)
+            return 2 * (len(found) - degree) + contracted_neighbors[v] + level[v], found
+
+        heap = [(priority(v)[0], v) for v in range(n)]
+        heapq.heapify(heap)
+        rank = np.zeros(n, dtype=np.int32)
+        # Arcs towards higher-ranked nodes, grouped by the node they are searched from
+        up_tail, up_arcs, down_head, down_arcs = [], [], [], []
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            # Lazy update: re-evaluate and defer if the node got more expensive
+            current, found = priority(v)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+            for u, x, c, a_in, a_out in found:
+                add_arc(u, x, c, -1, a_in, a_out)
+            rank[v] = order
+            order += 1
+            # Every remaining neighbor outranks v, so v's arcs are final
+            for x, arc in out[v].items():
+                up_tail.append(v)
+                up_arcs.append(arc)
+                del inn[x][v]
+            for u, arc in inn[v].items():
+                down_head.append(v)
+                down_arcs.append(arc)
+                del out[u][v]
+            for u in set(inn[v]) | set(out[v]):
+                contracted_neighbors[u] += 1
+                level[u] = max(level[u], level[v] + 1)
+            out[v], inn[v] = {}, {}
+
+        up_indptr, up_arcs = _group(up_tail, up_arcs, n)
+        down_indptr, down_arcs = _group(down_head, down_arcs, n)
+
+        return cls(
+            rank=rank, arc_tail=tail, arc_head=head, arc_weight=cost, arc_edge=edge,
+            arc_first=first, arc_second=second, up_indptr=up_indptr, up_arcs=up_arcs,
+            down_indptr=down_indptr, down_arcs=down_arcs, weight=weight,
+            fingerprint=core.fingerprint(),
+        )
+
+    def _search_lists(self):
+        if self._lists is None:
+            self._lists = (
+                self.up_indptr.tolist(), self.up_arcs.tolist(),
+                self.down_indptr.tolist(), self.down_arcs.tolist(),
+                self.arc_tail.tolist(), self.arc_head.tolist(), self.arc_weight.tolist(),
+            )
+        return self._lists
+
+    def distance(self, source, target):
+        """
+        Shortest-path cost between two node indices (inf when unreachable)
+        """
+        return self._search(source, target)[0]
+
+    def shortest_path(self, source, target):
+        """
+        Shortest path between two node indices as (nodes, edges) of the compact graph;
+        raises nx.NetworkXNoPath when unreachable
+        """
+        if source == target:
+            return [source], []
+        best, meet, fwd_pred, bwd_pred = self._search(source, target)
+        if meet < 0:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+
+        tail, head = self._search_lists()[4:6]
+        arcs = []
+        node = meet
+        while node != source:
+            arc = fwd_pred[node]
+            arcs.append(arc)
+            node = tail[arc]
+        arcs.reverse()
+        node = meet
+        while node != target:
+            arc = bwd_pred[node]
+            arcs.append(arc)
+            node = head[arc]
+        return self.unpack(source, arcs)
+
+    def unpack(self, source, arcs):
+        """
+        Expand a chain of (shortcut) arcs into the (nodes, edges) of original edges
+        """
+        first, second = self.arc_first, self.arc_second
+        nodes, edges = [source], []
+        stack = list(reversed(arcs))
+        while stack:
+            arc = stack.pop()
+            if first[arc] < 0:
+                nodes.append(int(self.arc_head[arc]))
+                edges.append(int(self.arc_edge[arc]))
+            else:
+                stack.append(int(second[arc]))
+                stack.append(int(first[arc]))
+        return nodes, edges
+
+    def _search(self, source, target):
+        """
+        Bidirectional upward Dijkstra; returns (cost, meeting node, forward preds, backward preds)
+        """
+        up_indptr, up_arcs, down_indptr, down_arcs, tail, head, cost = self._search_lists()
+        inf = float("inf")
+        fwd_dist, bwd_dist = {source: 0.0}, {target: 0.0}
+        fwd_pred, bwd_pred = {}, {}
+        fwd_heap, bwd_heap = [(0.0, source)], [(0.0, target)]
+        best, meet = inf, -1
+        if source == target:
+            return 0.0, source, fwd_pred, bwd_pred
+
+        while (fwd_heap and fwd_heap[0][0] < best) or (bwd_heap and bwd_heap[0][0] < best):
+            if fwd_heap and fwd_heap[0][0] < best:
+                d, u = heapq.heappop(fwd_heap)
+                if d <= fwd_dist[u]:
+                    other = bwd_dist.get(u)
+                    if other is not None and d + other < best:
+                        best, meet = d + other, u
+                    for slot in range(up_indptr[u], up_indptr[u + 1]):
+                        arc = up_arcs[slot]
+                        v = head[arc]
+                        nd = d + cost[arc]
+                        if nd < fwd_dist.get(v, inf):
+                            fwd_dist[v] = nd
+                            fwd_pred[v] = arc
+                            heapq.heappush(fwd_heap, (nd, v))
+            if bwd_heap and bwd_heap[0][0] < best:
+                d, u = heapq.heappop(bwd_heap)
+                if d <= bwd_dist[u]:
+                    other = fwd_dist.get(u)
+                    if other is not None and d + other < best:
+                        best, meet = d + other, u
+                    for slot in range(down_indptr[u], down_indptr[u + 1]):
+                        arc = down_arcs[slot]
+                        v = tail[arc]
+                        nd = d + cost[arc]
+                        if nd < bwd_dist.get(v, inf):
+                            bwd_dist[v] = nd
+                            bwd_pred[v] = arc
+                            heapq.heappush(bwd_heap, (nd, v))
+        return best, meet, fwd_pred, bwd_pred
+
+    def save(self, path):
+        """
+        Write the hierarchy as a folder of .npy columns, renamed into place atomically
+        """
+        write_array_dir(path, {name: getattr(self, name) for name in _ARRAYS}, {
+            "version": CONTRACTION_VERSION,
+            "weight": self.weight,
+            "fingerprint": self.fingerprint,
+        })
+        self.path = path
+        return path
+
+    @classmethod
+    def load(cls, path, fingerprint=None):
+        """
+        Memory-map a saved hierarchy; returns None when it is missing, stale,
+        unreadable or was built for a different graph
+        """
+        try:
+            meta, arrays = read_array_dir(path, _ARRAYS, CONTRACTION_VERSION)
+        except (OSError, ValueError):
+            return None
+        if fingerprint is not None and meta.get("fingerprint") != fingerprint:
+            return None
+        ch = cls(weight=meta["weight"], fingerprint=meta["fingerprint"], **arrays)
+        ch.path = path
+        return ch
+
+
+def _group(keys, values, n):
+    """
+    CSR offsets and values of (key, value) pairs grouped by key
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    values = np.asarray(values, dtype=np.int32)
+    order = np.argsort(keys, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=indptr[1:])
+    return indptr, values[order]
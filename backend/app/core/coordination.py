@@ -0,0 +1,354 @@
+"""
+Green-wave coordination of signal offsets along arterials.
+
+An arterial is a chain of roads sharing a name, broken where the named road
+forks. Its signalized intersections form a corridor. The corridor's signals
+are stretched to one common cycle, and each intersection's plan is then
+shifted by an offset. Every approach keeps its own phase, so the offset
+between two neighbouring signals can be chosen link by link: it is the shift
+that maximises the time a platoon released on the upstream green spends
+arriving on the downstream green, summed over both directions (ties go to
+the shift that serves the two directions most evenly).
+
+One shift rarely suits both directions, so each signal may also swap the
+order of its two through phases (lead-lag). All links of a corridor are
+scored for every pair of phase orders at their ends against a grid of
+candidate shifts in one NumPy pass, and the best chain of phase orders is
+picked by dynamic programming. Offsets then accumulate along the corridor.
+Corridors are coordinated longest first, and a signal shared with a longer
+corridor keeps its plan and offset.
+"""
+
+import numpy as np
+
+
+class Arterial:
+    """
+    A chain of same-named roads: its node indices in order and the edge between each pair
+    """
+
+    def __init__(self, name, nodes, edges):
+        self.name = name
+        self.nodes = nodes
+        self.edges = edges
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+def find_arterials(core, min_nodes=3):
+    """
+    Same-named road chains of at least `min_nodes` nodes, split at forks of the named road
+    """
+    named = np.flatnonzero(core.name_ids >= 0)
+    u, v = core.edge_u[named], core.edge_v[named]
+    # One edge per named road segment, whichever direction(s) it is drawn in
+    _, unique = np.unique(
+        np.c_[core.name_ids[named], np.minimum(u, v), np.maximum(u, v)], axis=0, return_index=True
+    )
+    adjacency = {}
+    for e in named[np.sort(unique)].tolist():
+        name, a, b = int(core.name_ids[e]), int(core.edge_u[e]), int(core.edge_v[e])
+        if a == b:
+            continue
+        adjacency.setdefault((name, a), []).append((b, e))
+        adjacency.setdefault((name, b), []).append((a, e))
+
+    arterials, used = [], set()
+
+    def walk(name, node, step):
+        nodes, edges = [node], []
+        while step is not None:
+            nxt, e = step
+            used.add(e)
+            nodes.append(nxt)
+            edges.append(e)
+            step = None
+            around = adjacency[(name, nxt)]
+            if len(around) == 2:
+                step = next((s for s in around if s[1] not in used), None)
+        if len(nodes) >= min_nodes:
+            arterials.append(Arterial(core.names[name], nodes, edges))
+
+    # Chains run between ends and forks; whatever is left over are loops
+    for (name, node), around in adjacency.items():
+        if len(around) != 2:
+            for step in around:
+                if step[1] not in used:
+                    walk(name, node, step)
+    for (name, node), around in adjacency.items():
+        for step in around:
+            if step[1] not in used:
+                walk(name, node, step)
+    return arterials
+
+
+def circular_overlap(start, length, other_start, other_length, cycle):
+    """
+    Overlap of the windows [start, start + length) and [other_start, other_start + other_length) modulo cycle
+    """
+    r = np.mod(other_start - start, cycle)
+    ahead = np.minimum(length, r + other_length) - r
+    behind = np.minimum(length, r - cycle + other_length)
+    return np.maximum(ahead, 0.0) + np.maximum(behind, 0.0)
+
+
+class GreenWave:
+    """
+    Offsets for the signal plans of a compact graph; see the module docstring
+    """
+
+    def __init__(self, core, traffic_lights, edge_times=None, step=1.0):
+        self.core = core
+        self.step = step
+        self.times = np.asarray(core.travel_time if edge_times is None else edge_times, dtype=np.float64)
+        self.lights = {}
+        self.phases = {}
+        for light in traffic_lights or ():
+            try:
+                at = core.index_of(int(light["intersection_id"]))
+            except (KeyError, ValueError):
+                continue
+            self.lights[at] = light
+            for position, phase in enumerate(light["cycles"]):
+                node, _, neighbour = phase["road_id"].partition("-")
+                try:
+                    self.phases[(at, core.index_of(int(neighbour)))] = position
+                except (KeyError, ValueError):
+                    continue
+
+    def corridors(self, arterials=None, min_signals=2):
+        """
+        Signalized positions of each arterial with at least `min_signals` signals,
+        longest first, as (arterial, positions) pairs
+        """
+        if arterials is None:
+            arterials = find_arterials(self.core)
+        corridors = []
+        for arterial in arterials:
+            positions = [i for i, node in enumerate(arterial.nodes) if node in self.lights]
+            if len(positions) >= min_signals:
+                corridors.append((arterial, positions))
+        corridors.sort(key=lambda corridor: -len(corridor[1]))
+        return corridors
+
+    def coordinate(self, arterials=None, min_signals=2):
+        """
+        Coordinated copies of the traffic lights and a report per corridor
+        """
+        core = self.core
+        corridors = self.corridors(arterials, min_signals)
+        cycles = self._common_cycles(corridors)
+        base = {node: self._resequence(self.lights[node], cycle) for node, cycle in cycles.items()}
+        plans, offsets, report = {}, {}, []
+        ids = [str(n) for n in core.node_ids.tolist()]
+
+        for arterial, positions in corridors:
+            nodes = arterial.nodes
+            signals = [nodes[p] for p in positions]
+            forward, reverse = self._travel_times(arterial)
+
+            # Candidate plans per signal: as fixed by a longer corridor, or with
+            # this corridor's two through phases in either order (lead-lag)
+            options = []
+            for p, node in zip(positions, signals):
+                if node in plans:
+                    options.append([plans[node]])
+                    continue
+                through = (self.phases.get((node, nodes[p - 1])) if p > 0 else None,
+                           self.phases.get((node, nodes[p + 1])) if p + 1 < len(nodes) else None)
+                options.append([base[node]] if None in through else [
+                    base[node], self._resequence(self.lights[node], cycles[node], swap=through)
+                ])
+
+            # One row per link and pair of candidate plans at its ends
+            rows, keys = [], []
+            for i, (p, q) in enumerate(zip(positions, positions[1:])):
+                for va, plan_a in enumerate(options[i]):
+                    for vb, plan_b in enumerate(options[i + 1]):
+                        keys.append((i, va, vb))
+                        rows.append(self._link(nodes, p, q, plan_a, plan_b, forward, reverse, cycles[nodes[p]]))
+            table = np.array(rows, dtype=np.float64)
+            shifts, scores = self._best_shifts(table)
+            lookup = {key: row for row, key in enumerate(keys)}
+
+            # Best chain of candidate plans (Viterbi over at most two per signal)
+            value, back = [0.0] * len(options[0]), []
+            for i in range(len(signals) - 1):
+                pointers, step = [], []
+                for vb in range(len(options[i + 1])):
+                    va = max(range(len(value)), key=lambda va: value[va] + scores[lookup[(i, va, vb)]])
+                    pointers.append(va)
+                    step.append(value[va] + scores[lookup[(i, va, vb)]])
+                back.append(pointers)
+                value = step
+            chosen = [max(range(len(value)), key=value.__getitem__)]
+            for pointers in reversed(back):
+                chosen.append(pointers[chosen[-1]])
+            chosen.reverse()
+            links = [lookup[(i, chosen[i], chosen[i + 1])] for i in range(len(signals) - 1)]
+            for node, options_at, v in zip(signals, options, chosen):
+                plans[node] = options_at[v]
+
+            # Offsets accumulate from the first signal a longer corridor already fixed
+            anchor = next((i for i, node in enumerate(signals) if node in offsets), 0)
+            offsets.setdefault(signals[anchor], 0.0)
+            for i in range(anchor + 1, len(signals)):
+                offsets.setdefault(signals[i], (offsets[signals[i - 1]] + shifts[links[i - 1]]) % cycles[signals[i]])
+            for i in range(anchor - 1, -1, -1):
+                offsets.setdefault(signals[i], (offsets[signals[i + 1]] - shifts[links[i]]) % cycles[signals[i]])
+
+            uncoordinated = [lookup[(i, 0, 0)] for i in range(len(signals) - 1)]
+            achieved = np.array([offsets[b] - offsets[a] for a, b in zip(signals, signals[1:])])
+            report.append({
+                "name": arterial.name,
+                "intersections": [ids[node] for node in signals],
+                "cycle": cycles[signals[0]],
+                "offsets": [round(offsets[node], 1) for node in signals],
+                "green_arrivals": self._share(table[links], achieved),
+                "uncoordinated_green_arrivals": self._share(table[uncoordinated], np.zeros(len(uncoordinated))),
+            })
+
+        lights = []
+        for node, light in self.lights.items():
+            plan = plans.get(node, base.get(node, light))
+            if node in offsets:
+                plan = self._shift(plan, offsets[node])
+            lights.append(plan)
+        return lights, report
+
+    def _travel_times(self, arterial):
+        """
+        Cumulative travel time to each node of an arterial, along and against its direction
+        """
+        nodes = arterial.nodes
+        forward = np.r_[0.0, np.cumsum(self.times[arterial.edges])]
+        reverse_edges = np.array([self.core.find_edge(b, a) for a, b in zip(nodes, nodes[1:])])
+        reverse = np.r_[0.0, np.cumsum(np.where(reverse_edges >= 0, self.times[reverse_edges], np.inf))]
+        return forward, reverse
+
+    def _link(self, nodes, p, q, plan_a, plan_b, forward, reverse, cycle):
+        """
+        Table row for the signals at positions p < q of an arterial: the cycle,
+        then per direction the (start, green) of the releasing approach and of
+        the receiving approach and the travel time between them
+        """
+        return (
+            cycle,
+            *self._window(plan_a, nodes[p], nodes[p - 1] if p > 0 else None),
+            *self._window(plan_b, nodes[q], nodes[q - 1]),
+            forward[q] - forward[p],
+            *self._window(plan_b, nodes[q], nodes[q + 1] if q + 1 < len(nodes) else None),
+            *self._window(plan_a, nodes[p], nodes[p + 1]),
+            reverse[q] - reverse[p],
+        )
+
+    def _best_shifts(self, table):
+        """
+        Best shift and its score for every link row, over a grid of candidate shifts
+        """
+        cycle = table[:, 0]
+        candidates = np.arange(0.0, cycle.max(), self.step)
+        shift = np.where(candidates[None, :] < cycle[:, None], candidates[None, :], np.nan)
+        score = np.nan_to_num(self._arrivals_on_green(table, shift), nan=-1.0)
+        best = np.argmax(score, axis=1)
+        return candidates[best], score[np.arange(len(table)), best]
+
+    def _common_cycles(self, corridors):
+        """
+        One cycle per group of corridors sharing signals: the longest of its signals
+        """
+        parent = {}
+
+        def find(node):
+            while parent.setdefault(node, node) != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        for arterial, positions in corridors:
+            signals = [arterial.nodes[p] for p in positions]
+            for node in signals[1:]:
+                parent[find(node)] = find(signals[0])
+        longest = {}
+        for node in parent:
+            root = find(node)
+            longest[root] = max(longest.get(root, 0.0), float(self.lights[node]["total_cycle_time"]))
+        return {node: longest[find(node)] for node in parent}
+
+    def _window(self, plan, at, come_from):
+        """
+        (start, green) of the approach into `at` from `come_from` in a plan; the
+        whole cycle when there is no such signalized approach
+        """
+        position = self.phases.get((at, come_from))
+        if position is None:
+            return 0.0, float(plan["total_cycle_time"])
+        phase = plan["cycles"][position]
+        return float(phase["green_start"]), float(phase["green_duration"])
+
+    def _arrivals_on_green(self, table, shift, per_direction=False):
+        """
+        Seconds of each platoon arriving on green per link and candidate shift
+        (downstream offset minus upstream offset), both directions summed
+        """
+        (cycle, out_start, out_green, out_next_start, out_next_green, out_time,
+         in_start, in_green, in_next_start, in_next_green, in_time) = (column[:, None] for column in table.T)
+        with np.errstate(invalid="ignore"):
+            outbound = circular_overlap(out_start + out_time, out_green, out_next_start + shift, out_next_green, cycle)
+            inbound = circular_overlap(in_start + in_time, in_green, in_next_start - shift, in_next_green, cycle)
+        outbound = np.where(np.isfinite(out_time), outbound, 0.0)
+        inbound = np.where(np.isfinite(in_time), inbound, 0.0)
+        if per_direction:
+            return outbound[:, 0], inbound[:, 0]
+        # Among equally good shifts prefer the one serving both directions evenly
+        return outbound + inbound + 1e-3 * np.minimum(outbound, inbound)
+
+    def _share(self, table, shift):
+        """
+        Seconds arriving on green over the most that could (the shorter of the
+        two greens of each link), per direction, for some links at given shifts
+        """
+        outbound, inbound = self._arrivals_on_green(table, shift[:, None], per_direction=True)
+        out_green = np.minimum(table[:, 2], table[:, 4]).sum()
+        in_green = np.minimum(table[:, 7], table[:, 9]).sum()
+        return {
+            "outbound": round(float(outbound.sum() / out_green), 3) if out_green else None,
+            "inbound": round(float(inbound.sum() / in_green), 3) if in_green else None,
+        }
+
+    def _resequence(self, light, cycle, swap=None):
+        """
+        Copy of a plan lengthened to `cycle`, extra time shared out in proportion
+        to green, optionally with the phases at the two `swap` positions exchanged
+        in the sequence
+        """
+        extra = cycle - float(light["total_cycle_time"])
+        if extra <= 0 and swap is None:
+            return dict(light, cycles=[dict(phase) for phase in light["cycles"]])
+        order = sorted(range(len(light["cycles"])), key=lambda i: light["cycles"][i]["green_start"])
+        if swap is not None:
+            i, j = order.index(swap[0]), order.index(swap[1])
+            order[i], order[j] = order[j], order[i]
+        total_green = sum(phase["green_duration"] for phase in light["cycles"])
+        phases, start = [None] * len(order), 0.0
+        for i in order:
+            phase = light["cycles"][i]
+            share = phase["green_duration"] / total_green if total_green else 1.0 / len(order)
+            green = round(phase["green_duration"] + max(extra, 0.0) * share, 1)
+            if i == order[-1] and extra > 0:
+                # The last phase absorbs rounding so the sequence fills the cycle exactly
+                green = round(cycle - start - phase["yellow_duration"], 1)
+            phases[i] = dict(phase, green_start=round(start, 1), green_duration=green)
+            start += green + phase["yellow_duration"]
+        return dict(light, cycles=phases, total_cycle_time=cycle)
+
+    def _shift(self, light, offset):
+        """
+        Copy of a plan with every green start moved by `offset` (modulo its cycle)
+        """
+        cycle = float(light["total_cycle_time"])
+        return dict(light, offset=round(offset, 1), cycles=[
+            dict(phase, green_start=round((phase["green_start"] + offset) % cycle, 1))
+            for phase in light["cycles"]
+        ])
@@ -0,0 +1,266 @@
+"""
+Mesoscopic cell transmission model (CTM) over a compact graph.
+
+Every driving direction of every edge (a link, numbered like the links of
+app.core.microsim) is cut into cells that a vehicle crosses in about one tick
+at free-flow speed. Each tick, a cell sends min(vehicles, capacity) and
+receives min(capacity, w/v * free space), with a triangular fundamental
+diagram derived from the saturation headway and jam spacing. Flow between
+neighbouring cells of a link is min(send, receive).
+
+Every link of the loaded graph gets cells. Demand enters at the boundary
+where each routed vehicle starts its first link. At intersections, the last
+cell of a link splits its sending flow over movements (next link, or leaving
+the network at a destination) by turning fractions counted from the routed
+fleet; links the fleet never leaves split evenly over every onward link
+except the U-turn, and leave the network at dead ends. The signal plans gate each incoming
+link. Each outgoing link scales the movements feeding it to its receiving
+capacity, and an incoming link keeps its split (first in, first out), so it
+moves at the pace of its most restricted movement. All of this is a handful
+of NumPy operations over the full cell and movement arrays per tick.
+"""
+
+import numpy as np
+
+from app.core.jobs import checkpoint
+from app.core.microsim import JAM_SPACING, SATURATION_HEADWAY, Fleet
+from app.core.signals import SignalTable
+
+
+class CellTransmissionModel:
+    """
+    Density and flow propagation for a routed fleet; see the module docstring
+    """
+
+    def __init__(self, core, paths, departures, traffic_lights=None, edge_times=None,
+                 tick=1.0, headway=SATURATION_HEADWAY, jam_spacing=JAM_SPACING):
+        self.core = core
+        self.tick = tick
+        fleet = Fleet(core, paths, departures, edge_times)
+        times = np.asarray(core.travel_time if edge_times is None else edge_times, dtype=np.float64)
+
+        # Turning movements counted from consecutive legs; -1 leaves the network
+        legs = np.flatnonzero(fleet.has_leg)
+        ends = fleet.last - 1
+        ends = ends[fleet.has_leg[np.maximum(ends, 0)] & (fleet.last > fleet.first)]
+        onward = legs[fleet.has_leg[legs + 1]]
+        m_from = np.r_[fleet.links[onward], fleet.links[ends]]
+        m_to = np.r_[fleet.links[onward + 1], np.full(len(ends), -1)]
+
+        # Every driving direction of every edge is a link; directed graphs only run forward
+        if core.directed:
+            self.links = 2 * np.arange(core.num_edges, dtype=np.int64)
+        else:
+            self.links = np.arange(2 * core.num_edges, dtype=np.int64)
+        num_links = len(self.links)
+        compact = np.full(2 * core.num_edges, -1, dtype=np.int64)
+        compact[self.links] = np.arange(num_links)
+        edges, against = self.links // 2, (self.links % 2).astype(bool)
+        self.link_head = np.where(against, core.edge_u[edges], core.edge_v[edges])
+        self.link_tail = np.where(against, core.edge_v[edges], core.edge_u[edges])
+
+        fleet_from = compact[m_from]
+        fleet_to = np.where(m_to < 0, -1, compact[np.maximum(m_to, 0)])
+        default_from, default_to = self._default_movements(
+            np.setdiff1d(np.arange(num_links), fleet_from), core.num_nodes
+        )
+        # Count each (from, to) pair through one int64 key; sorted keys keep the
+        # movements of a link contiguous and in link order
+        span = num_links + 1
+        keys, counts = np.unique(
+            np.r_[fleet_from, default_from] * span + (np.r_[fleet_to, default_to] + 1),
+            return_counts=True,
+        )
+        self.m_from, self.m_to = keys // span, keys % span - 1
+        totals = np.bincount(self.m_from, weights=counts, minlength=num_links)
+        self.m_share = counts / totals[self.m_from] if len(counts) else np.zeros(0)
+        # Every link has at least one movement (a dead end leaves the network).
+        # Column l of m_table lists the movements of link l, one slot per row, so
+        # reducing over rows runs along contiguous memory; padding points one
+        # past the last movement, at a neutral value
+        m_start = np.searchsorted(self.m_from, np.arange(num_links))
+        m_count = np.diff(np.r_[m_start, len(self.m_from)])
+        slots = np.arange(m_count.max() if num_links else 0)[:, None]
+        self.m_table = np.where(slots < m_count, m_start + slots, len(self.m_from))
+
+        # Cells: every link cut into pieces crossed in about one tick
+        link_time = np.where(np.isfinite(times), times, 0.0)[self.links // 2]
+        link_length = core.length.astype(np.float64)[self.links // 2]
+        cells = np.maximum(1, np.rint(link_time / tick)).astype(np.int64)
+        self.link_first = np.zeros(num_links, dtype=np.int64)
+        np.cumsum(cells[:-1], out=self.link_first[1:])
+        self.link_last = self.link_first + cells - 1
+        num_cells = int(cells.sum())
+        cell_link = np.repeat(np.arange(num_links), cells)
+        self.is_last = np.zeros(num_cells, dtype=bool)
+        self.is_last[self.link_last] = True
+
+        # Every cell discharges one vehicle per headway
+        self.capacity = tick / headway
+        self.jam = np.maximum(self.capacity * 1.5, (link_length / cells / jam_spacing)[cell_link])
+        self.wave = np.minimum(1.0, self.capacity / (self.jam - self.capacity))
+        self.link_time = link_time
+
+        # Signal approach that gates each link's exit: into its head from its tail
+        signals = SignalTable.compile(core, traffic_lights)
+        self.signals = signals
+        self.link_approach = signals.approaches(self.link_head, self.link_tail)
+
+        # Demand: each vehicle joins the queue at the start of its first link when it departs
+        starting = fleet.has_leg[fleet.first]
+        self.origin_links = compact[fleet.links[fleet.first[starting]]]
+        self.departures = fleet.departures[starting]
+        self.num_links = num_links
+
+        self.density = np.zeros(num_cells)
+        self.link_outflow = np.zeros(num_links)
+        self.waiting = np.zeros(num_links)
+        self.entered = 0.0
+        self.exited = 0.0
+        self.vehicle_time = 0.0
+        self.time = 0.0
+        self.timeline = []
+
+    def _default_movements(self, links, num_nodes):
+        """
+        (from, to) movements splitting each of `links` evenly over the links
+        leaving its head, except the way back along the same edge; -1 (leave
+        the network) where there is no other way on
+        """
+        order = np.argsort(self.link_tail, kind="stable")
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.link_tail, minlength=num_nodes), out=indptr[1:])
+        heads = self.link_head[links]
+        counts = indptr[heads + 1] - indptr[heads]
+        starts = np.repeat(indptr[heads] - np.cumsum(counts) + counts, counts)
+        m_from = np.repeat(links, counts)
+        m_to = order[starts + np.arange(int(counts.sum()))]
+        onward = self.links[m_to] // 2 != self.links[m_from] // 2
+        m_from, m_to = m_from[onward], m_to[onward]
+        dead_ends = np.setdiff1d(links, m_from)
+        return np.r_[m_from, dead_ends], np.r_[m_to, np.full(len(dead_ends), -1)]
+
+    @property
+    def num_cells(self):
+        return len(self.density)
+
+    def run(self, duration, sample_every=60.0):
+        """
+        Propagate flow from t = 0 to `duration`, recording a timeline sample every `sample_every`
+        """
+        tick = self.tick
+        n = self.density
+        if len(n) == 0:
+            return self
+        first, last = self.link_first, self.link_last
+        m_from, m_share, m_table = self.m_from, self.m_share, self.m_table
+        num_links, num_moves = self.num_links, len(m_from)
+        # Scatter structures of the movements, built once: movements into a
+        # link, and each movement's receiving scale (sinks read a constant 1)
+        through = np.flatnonzero(self.m_to >= 0)
+        through_to = self.m_to[through]
+        m_scale = np.where(self.m_to < 0, num_links, self.m_to)
+        sinks = np.flatnonzero(self.m_to < 0)
+        scale = np.ones(num_links + 1)
+        # Per-movement values with one neutral padding slot for m_table
+        move_scale = np.ones(num_moves + 1)
+        moved = np.zeros(num_moves + 1)
+        capacity, jam, wave = self.capacity, self.jam, self.wave
+        send, receive = np.empty(len(n)), np.empty(len(n))
+        flow = np.empty(len(n) - 1)
+        # Cell i hands over to cell i + 1 unless it ends its link
+        link_ends = last[last < len(n) - 1]
+
+        order = np.argsort(self.departures, kind="stable")
+        departures, origin_links = self.departures[order], self.origin_links[order]
+        released = 0
+        next_sample = 0.0
+
+        t = 0.0
+        while t < duration:
+            checkpoint()
+            if t >= next_sample:
+                self._sample(t)
+                next_sample += sample_every
+
+            upto = int(np.searchsorted(departures, t + tick, side="left"))
+            if upto > released:
+                self.waiting += np.bincount(origin_links[released:upto], minlength=num_links)
+                released = upto
+
+            np.minimum(n, capacity, out=send)
+            np.subtract(jam, n, out=receive)
+            receive *= wave
+            np.minimum(capacity, receive, out=receive)
+
+            # Within links
+            np.minimum(send[:-1], receive[1:], out=flow)
+            flow[link_ends] = 0.0
+
+            # Through intersections
+            green = self.signals.green_at(t)[self.link_approach]
+            link_send = send[last] * green
+            demand = link_send[m_from] * m_share
+            wanted = np.bincount(through_to, weights=demand[through], minlength=num_links)
+            room = receive[first]
+            np.divide(room, wanted, out=scale[:num_links], where=wanted > room)
+            scale[:num_links][wanted <= room] = 1.0
+            np.take(scale, m_scale, out=move_scale[:num_moves])
+            pace = move_scale[m_table].min(axis=0)
+            np.multiply(demand, pace[m_from], out=moved[:num_moves])
+            out_of_link = moved[m_table].sum(axis=0)
+            into_link = np.bincount(through_to, weights=moved[through], minlength=num_links)
+
+            # Vehicles waiting at their origins take whatever room is left
+            entering = np.minimum(self.waiting, np.maximum(room - into_link, 0.0))
+            self.waiting -= entering
+
+            n[:-1] -= flow
+            n[1:] += flow
+            n[last] -= out_of_link
+            n[first] += into_link + entering
+
+            self.link_outflow += out_of_link
+            self.entered += float(entering.sum())
+            self.exited += float(moved[sinks].sum())
+            # Vehicles are conserved, so the network holds what entered and has not exited
+            self.vehicle_time += (self.entered - self.exited + float(self.waiting.sum())) * tick
+            t += tick
+
+        self.time = t
+        self._sample(t)
+        return self
+
+    def _sample(self, t):
+        self.timeline.append({
+            "time": t,
+            "in_network": float(self.density.sum()),
+            "waiting_at_origins": float(self.waiting.sum()),
+            "exited": self.exited
+        })
+
+    def link_density(self):
+        """
+        Vehicles per link (aligned with self.links) at the current time
+        """
+        return np.bincount(
+            np.repeat(np.arange(self.num_links), self.link_last - self.link_first + 1),
+            weights=self.density, minlength=self.num_links,
+        )
+
+    def stats(self):
+        """
+        Network totals; delay is vehicle time beyond the free-flow time of completed link crossings
+        """
+        free_flow = float(np.dot(self.link_outflow, self.link_time))
+        return {
+            "vehicles": len(self.departures),
+            "cells": self.num_cells,
+            "entered": self.entered,
+            "exited": self.exited,
+            "in_network": float(self.density.sum()),
+            "waiting_at_origins": float(self.waiting.sum()),
+            "simulated_time": self.time,
+            "total_travel_time": self.vehicle_time,
+            "total_delay": max(0.0, self.vehicle_time - free_flow),
+        }
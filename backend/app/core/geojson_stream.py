@@ -0,0 +1,96 @@
+import json
+import numpy as np
+
+# Features are rendered in batches so memory stays flat regardless of graph size
+BATCH_SIZE = 4096
+CHUNK_SIZE = 64 * 1024
+
+_HEADER = b'{"type": "FeatureCollection", "features": ['
+_FOOTER = b"]}"
+
+_NODE = (
+    '{"type": "Feature", "geometry": {"type": "Point", "coordinates": [%s, %s]}, '
+    '"properties": {"id": %s, "type": "intersection"}}'
+)
+_EDGE = (
+    '{"type": "Feature", "geometry": {"type": "LineString", '
+    '"coordinates": [[%s, %s], [%s, %s]]}, '
+    '"properties": {"id": %s, "source": %s, "target": %s, "length": %s, '
+    '"travel_time": %s, "name": %s, "type": "road"}}'
+)
+
+
+def _numbers(values):
+    """
+    Shortest round-trip JSON tokens for a numeric column (non-finite values become null)
+    """
+    tokens = values.astype(str)
+    tokens[~np.isfinite(values)] = "null"
+    return tokens.tolist()
+
+
+def iter_features(core):
+    """
+    Yield each node and edge of a compact graph as an encoded GeoJSON Feature string
+    """
+    for start in range(0, core.num_nodes, BATCH_SIZE):
+        stop = min(start + BATCH_SIZE, core.num_nodes)
+        # Missing coordinates fall back to 0
+        xs = _numbers(np.nan_to_num(core.x[start:stop], nan=0.0))
+        ys = _numbers(np.nan_to_num(core.y[start:stop], nan=0.0))
+        ids = [json.dumps(str(n)) for n in core.node_ids[start:stop].tolist()]
+        for i in range(stop - start):
+            yield _NODE % (xs[i], ys[i], ids[i])
+
+    # name_id -1 (no name) indexes the trailing fallback entry
+    names = [json.dumps(name) for name in core.names] + [json.dumps("Unknown Road")]
+    for start in range(0, core.num_edges, BATCH_SIZE):
+        stop = min(start + BATCH_SIZE, core.num_edges)
+        u = core.edge_u[start:stop]
+        v = core.edge_v[start:stop]
+        ux = _numbers(np.nan_to_num(core.x[u], nan=0.0))
+        uy = _numbers(np.nan_to_num(core.y[u], nan=0.0))
+        vx = _numbers(np.nan_to_num(core.x[v], nan=0.0))
+        vy = _numbers(np.nan_to_num(core.y[v], nan=0.0))
+        u_ids = [str(n) for n in core.node_ids[u].tolist()]
+        v_ids = [str(n) for n in core.node_ids[v].tolist()]
+        lengths = _numbers(core.length[start:stop])
+        times = _numbers(core.travel_time[start:stop])
+        name_ids = core.name_ids[start:stop].tolist()
+        for i in range(stop - start):
+            yield _EDGE % (
+                ux[i], uy[i], vx[i], vy[i],
+                json.dumps(f"{u_ids[i]}-{v_ids[i]}"),
+                json.dumps(u_ids[i]),
+                json.dumps(v_ids[i]),
+                lengths[i],
+                times[i],
+                names[name_ids[i]],
+            )
+
+
+def iter_geojson(core, chunk_size=CHUNK_SIZE):
+    """
+    Stream a compact graph as a GeoJSON FeatureCollection in byte chunks of about chunk_size
+    """
+    buffer = [_HEADER.decode()]
+    size = len(_HEADER)
+    first = True
+    for feature in iter_features(core):
+        if not first:
+            buffer.append(", ")
+        buffer.append(feature)
+        first = False
+        size += len(feature) + 2
+        if size >= chunk_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    buffer.append(_FOOTER.decode())
+    yield "".join(buffer).encode("utf-8")
+
+
+def encode_geojson(core):
+    """
+    Whole FeatureCollection as bytes
+    """
+    return b"".join(iter_geojson(core))
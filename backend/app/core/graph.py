@@ -0,0 +1,426 @@
+import hashlib
+import heapq
+import numpy as np
+import networkx as nx
+
+from app.core.overlay import WeightOverlay
+
+
+class CompactGraph:
+    """
+    Array-backed road network built once from a NetworkX graph.
+
+    Nodes are addressed by dense int32 indices, adjacency is stored as CSR
+    offset/neighbor arrays and edge attributes live in float32 columns, so the
+    simulation hot paths never touch NetworkX dict-of-dicts.
+
+    Every edge also keeps its source identity: the OSM way ID (-1 when
+    unknown) and its MultiGraph key, which tell parallel roads apart.
+    """
+
+    def __init__(self, node_ids, x, y, edge_u, edge_v, length, travel_time,
+                 name_ids, names, indptr=None, indices=None, adj_edges=None,
+                 directed=False, osm_ids=None, edge_keys=None):
+        self.node_ids = np.asarray(node_ids)
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.edge_u = np.asarray(edge_u, dtype=np.int32)
+        self.edge_v = np.asarray(edge_v, dtype=np.int32)
+        self.length = np.asarray(length, dtype=np.float32)
+        self.travel_time = np.asarray(travel_time, dtype=np.float32)
+        self.name_ids = np.asarray(name_ids, dtype=np.int32)
+        if osm_ids is None:
+            osm_ids = np.full(len(self.edge_u), -1, dtype=np.int64)
+        if edge_keys is None:
+            edge_keys = np.zeros(len(self.edge_u), dtype=np.int32)
+        self.osm_ids = np.asarray(osm_ids, dtype=np.int64)
+        self.edge_keys = np.asarray(edge_keys, dtype=np.int32)
+        self.names = list(names)
+        self.directed = directed
+
+        if indptr is None:
+            indptr, indices, adj_edges = self._build_csr()
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.adj_edges = np.asarray(adj_edges, dtype=np.int32)
+
+        self._sorted_ids = None
+        self._sorted_order = None
+        self._lists = None
+        self._weight_lists = {}
+        self._fingerprint = None
+        # Optional routing indexes (ContractionHierarchy, Landmarks), attached by the network service
+        self.contraction = None
+        self.landmarks = None
+
+    @classmethod
+    def empty(cls):
+        """
+        Graph without nodes or edges
+        """
+        return cls(
+            node_ids=np.zeros(0, dtype=np.int64), x=[], y=[], edge_u=[], edge_v=[],
+            length=[], travel_time=[], name_ids=[], names=[],
+        )
+
+    @classmethod
+    def from_networkx(cls, G):
+        """
+        Build the compact representation from a NetworkX (Multi)(Di)Graph.
+        Neighbor order follows G's adjacency order so results match NetworkX.
+        """
+        node_ids = list(G.nodes())
+        index = {node: i for i, node in enumerate(node_ids)}
+        n = len(node_ids)
+
+        x = np.full(n, np.nan, dtype=np.float64)
+        y = np.full(n, np.nan, dtype=np.float64)
+        for i, (_, data) in enumerate(G.nodes(data=True)):
+            if data.get("x") is not None:
+                x[i] = data["x"]
+            if data.get("y") is not None:
+                y[i] = data["y"]
+
+        if G.is_multigraph():
+            edge_iter = G.edges(keys=True, data=True)
+        else:
+            edge_iter = ((u, v, 0, data) for u, v, data in G.edges(data=True))
+
+        edge_u, edge_v, length, travel_time, name_ids = [], [], [], [], []
+        osm_ids, edge_keys = [], []
+        names, name_index = [], {}
+        edge_index = {}
+        for e, (u, v, key, data) in enumerate(edge_iter):
+            ui, vi = index[u], index[v]
+            edge_u.append(ui)
+            edge_v.append(vi)
+            length.append(data.get("length", 0))
+            # NetworkX treats a missing weight attribute as 1
+            travel_time.append(data.get("travel_time", 1))
+            osm_ids.append(_osm_id(data.get("osmid")))
+            edge_keys.append(key if isinstance(key, int) else 0)
+            name = data.get("name")
+            if name is None:
+                name_ids.append(-1)
+            else:
+                if isinstance(name, list):
+                    name = ", ".join(str(part) for part in name)
+                name = str(name)
+                if name not in name_index:
+                    name_index[name] = len(names)
+                    names.append(name)
+                name_ids.append(name_index[name])
+            edge_index[(ui, vi, key)] = e
+            if not G.is_directed():
+                edge_index[(vi, ui, key)] = e
+
+        # Walk G's own adjacency so neighbor order is identical to G.edges(node)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        indices, adj_edges = [], []
+        for i, (node, nbrs) in enumerate(G.adjacency()):
+            for nbr, attrs in nbrs.items():
+                ni = index[nbr]
+                keys = attrs.keys() if G.is_multigraph() else (0,)
+                for key in keys:
+                    indices.append(ni)
+                    adj_edges.append(edge_index[(i, ni, key)])
+            indptr[i + 1] = len(indices)
+
+        return cls(
+            node_ids=_id_array(node_ids),
+            x=x,
+            y=y,
+            edge_u=edge_u,
+            edge_v=edge_v,
+            length=length,
+            travel_time=travel_time,
+            name_ids=name_ids,
+            names=names,
+            indptr=indptr,
+            indices=indices,
+            adj_edges=adj_edges,
+            directed=G.is_directed(),
+            osm_ids=osm_ids,
+            edge_keys=edge_keys,
+        )
+
+    def _build_csr(self):
+        """
+        Build CSR arrays from the edge columns (used when no adjacency order is given)
+        """
+        edge_ids = np.arange(len(self.edge_u), dtype=np.int32)
+        if self.directed:
+            src, dst, eid = self.edge_u, self.edge_v, edge_ids
+        else:
+            loops = self.edge_u == self.edge_v
+            src = np.concatenate([self.edge_u, self.edge_v[~loops]])
+            dst = np.concatenate([self.edge_v, self.edge_u[~loops]])
+            eid = np.concatenate([edge_ids, edge_ids[~loops]])
+        order = np.argsort(src, kind="stable")
+        counts = np.bincount(src, minlength=self.num_nodes)
+        indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return indptr, dst[order], eid[order]
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.edge_u)
+
+    def memory_usage(self):
+        """
+        Total bytes held by the array columns
+        """
+        arrays = (self.node_ids, self.x, self.y, self.edge_u, self.edge_v,
+                  self.length, self.travel_time, self.name_ids,
+                  self.indptr, self.indices, self.adj_edges)
+        return int(sum(a.nbytes for a in arrays))
+
+    def fingerprint(self):
+        """
+        Content hash of the graph; identical networks share a fingerprint
+        """
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(f"{self.directed}:{self.num_nodes}:{self.num_edges}".encode())
+            for array in (self.node_ids, self.x, self.y, self.edge_u, self.edge_v,
+                          self.length, self.travel_time, self.name_ids,
+                          self.indptr, self.indices, self.adj_edges):
+                digest.update(np.ascontiguousarray(array))
+            digest.update("\0".join(self.names).encode("utf-8"))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def index_of(self, node_id):
+        """
+        Dense index of an original node ID; raises KeyError when absent
+        """
+        if self._sorted_ids is None:
+            self._sorted_order = np.argsort(self.node_ids, kind="stable")
+            self._sorted_ids = self.node_ids[self._sorted_order]
+        try:
+            pos = int(np.searchsorted(self._sorted_ids, node_id))
+        except TypeError:
+            raise KeyError(node_id)
+        if pos >= len(self._sorted_ids) or self._sorted_ids[pos] != node_id:
+            raise KeyError(node_id)
+        return int(self._sorted_order[pos])
+
+    def node_id(self, index):
+        """
+        Original node ID (as a Python scalar) for a dense index
+        """
+        return self.node_ids[index].item()
+
+    def degree(self):
+        """
+        Degree of every node as an int array (self-loops count twice, as in NetworkX)
+        """
+        degree = np.diff(self.indptr)
+        if self.directed:
+            degree = degree + np.bincount(self.edge_v, minlength=self.num_nodes)
+        else:
+            loops = self.edge_u[self.edge_u == self.edge_v]
+            degree = degree + np.bincount(loops, minlength=self.num_nodes)
+        return degree
+
+    def neighbors(self, index):
+        """
+        Neighbor indices of a node in adjacency order
+        """
+        return self.indices[self.indptr[index]:self.indptr[index + 1]]
+
+    def incident_edges(self, index):
+        """
+        Edge indices of a node's adjacency slots, aligned with neighbors()
+        """
+        return self.adj_edges[self.indptr[index]:self.indptr[index + 1]]
+
+    def find_edge(self, u, v):
+        """
+        Edge index between two node indices, or -1 if they are not adjacent
+        """
+        row = self.neighbors(u)
+        hits = np.flatnonzero(row == v)
+        if len(hits) == 0:
+            return -1
+        return int(self.adj_edges[self.indptr[u] + hits[0]])
+
+    def edge_weights(self, weight="travel_time"):
+        """
+        Edge attribute column by name
+        """
+        if weight == "travel_time":
+            return self.travel_time
+        if weight == "length":
+            return self.length
+        raise ValueError(f"Unknown edge weight: {weight}")
+
+    def adjacency_lists(self):
+        """
+        CSR arrays as Python lists; scalar indexing on lists is far cheaper
+        than on NumPy arrays inside the search loops
+        """
+        if self._lists is None:
+            self._lists = (self.indptr.tolist(), self.indices.tolist(), self.adj_edges.tolist())
+        return self._lists
+
+    def weight_list(self, weight="travel_time"):
+        """
+        Cached Python-list copy of an edge weight column
+        """
+        if weight not in self._weight_lists:
+            self._weight_lists[weight] = self.edge_weights(weight).tolist()
+        return self._weight_lists[weight]
+
+    def adjacency_views(self):
+        """
+        CSR arrays as memoryviews. They index about as cheaply as lists inside
+        the search loops but read the arrays in place, so a graph mapped from
+        shared memory is not copied into every process that searches it.
+        """
+        return tuple(
+            memoryview(np.ascontiguousarray(array))
+            for array in (self.indptr, self.indices, self.adj_edges)
+        )
+
+    def weight_view(self, weight="travel_time"):
+        """
+        Memoryview of an edge weight column, read in place
+        """
+        return memoryview(np.ascontiguousarray(self.edge_weights(weight)))
+
+    def dijkstra(self, source, target=None, weights="travel_time", targets=None, views=False):
+        """
+        Single-source Dijkstra over the CSR arrays.
+        Returns (dist, pred) dicts keyed by node index, where pred maps a node to
+        (previous node, edge index); stops early once target (or every node in
+        `targets`) is settled.
+        `weights` is a column name or a per-edge sequence; infinite weights are closed.
+        With `views` the arrays are read through memoryviews instead of the cached list copies.
+        """
+        if views:
+            w = self.weight_view(weights) if isinstance(weights, str) else weights
+            indptr, indices, adj_edges = self.adjacency_views()
+        else:
+            w = self.weight_list(weights) if isinstance(weights, str) else weights
+            indptr, indices, adj_edges = self.adjacency_lists()
+        inf = float("inf")
+        dist = {source: 0.0}
+        pred = {source: (-1, -1)}
+        done = set()
+        remaining = set(targets) if targets is not None else None
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            if u == target:
+                break
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining:
+                    break
+            for slot in range(indptr[u], indptr[u + 1]):
+                e = adj_edges[slot]
+                cost = w[e]
+                if cost == inf:
+                    continue
+                v = indices[slot]
+                nd = d + cost
+                if nd < dist.get(v, inf):
+                    dist[v] = nd
+                    pred[v] = (u, e)
+                    heapq.heappush(heap, (nd, v))
+        return dist, pred
+
+    def shortest_path(self, source, target, weights="travel_time", closed=None, overlay=None):
+        """
+        Shortest path between two node indices.
+        Returns (nodes, edges) index lists; raises nx.NetworkXNoPath when unreachable.
+        `closed` is an optional set of edge indices that may not be used and
+        `overlay` an optional WeightOverlay of incident multipliers read on top
+        of the base weights.
+
+        With a contraction hierarchy attached, travel_time queries go through it;
+        closures and slowdowns only ever lengthen paths, so its answer stands
+        whenever it avoids every overlaid edge and Dijkstra is needed only for the rest.
+        """
+        if closed:
+            overlay = WeightOverlay(self, dict(overlay.factors) if overlay else None)
+            for e in closed:
+                overlay.close(e)
+        ch = self.contraction
+        if ch is not None and isinstance(weights, str) and weights == ch.weight:
+            if not overlay or overlay.slows_only:
+                nodes, edges = ch.shortest_path(source, target)
+                if not overlay or overlay.edges.isdisjoint(edges):
+                    return nodes, edges
+        if overlay:
+            weights = overlay.weights(weights)
+        dist, pred = self.dijkstra(source, target=target, weights=weights)
+        if target not in dist:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        return unwind_path(pred, target)
+
+    def to_networkx(self):
+        """
+        Materialize a NetworkX view of the graph (for debugging and legacy callers)
+        """
+        G = nx.DiGraph() if self.directed else nx.Graph()
+        for i in range(self.num_nodes):
+            data = {}
+            if not np.isnan(self.x[i]):
+                data["x"] = float(self.x[i])
+            if not np.isnan(self.y[i]):
+                data["y"] = float(self.y[i])
+            G.add_node(self.node_id(i), **data)
+        for e in range(self.num_edges):
+            data = {
+                "length": float(self.length[e]),
+                "travel_time": float(self.travel_time[e]),
+            }
+            if self.name_ids[e] >= 0:
+                data["name"] = self.names[self.name_ids[e]]
+            G.add_edge(self.node_id(self.edge_u[e]), self.node_id(self.edge_v[e]), **data)
+        return G
+
+
+def _osm_id(osmid):
+    """
+    Integer OSM way ID of an edge; simplified edges carry a list and use its
+    smallest ID, and edges without one get -1
+    """
+    if isinstance(osmid, (list, tuple)):
+        osmid = min(osmid, default=None)
+    try:
+        return int(osmid)
+    except (TypeError, ValueError):
+        return -1
+
+
+def _id_array(node_ids):
+    """
+    Pack node IDs into the narrowest homogeneous NumPy array
+    """
+    if all(isinstance(n, (int, np.integer)) for n in node_ids):
+        return np.asarray(node_ids, dtype=np.int64)
+    return np.asarray([str(n) for n in node_ids])
+
+
+def unwind_path(pred, target):
+    """
+    Rebuild (nodes, edges) of a path from a predecessor map of (node, edge) pairs
+    """
+    nodes, edges = [target], []
+    while pred[nodes[-1]][0] != -1:
+        u, e = pred[nodes[-1]]
+        edges.append(e)
+        nodes.append(u)
+    nodes.reverse()
+    edges.reverse()
+    return nodes, edges
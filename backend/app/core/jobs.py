@@ -0,0 +1,244 @@
+"""
+Background simulation jobs on a bounded worker pool.
+
+A job wraps a blocking callable that is handed a `progress(done, total,
+stage=None)` callback. The callable runs on a thread of the JobQueue's
+pool, off the event loop, and reports progress through the callback. The
+same callback is where cooperative cancellation and timeouts take effect.
+Once a job is cancelled, or has run past its deadline, its next progress
+report raises JobCancelled, and anything it still returns is discarded.
+Long inner loops (simulation ticks, events, route searches) call
+checkpoint() between steps, which does the same for the job running on the
+current thread, so a stopped job frees its worker promptly. Queued jobs are
+cancelled before they start.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+
+FINISHED = (SUCCEEDED, FAILED, CANCELLED, TIMED_OUT)
+
+# Job whose callable runs on the current worker thread
+_current = threading.local()
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job's progress callback once the job is cancelled or timed out
+    """
+
+
+class QueueFull(Exception):
+    """
+    Raised when a job is submitted while the queue already holds its maximum of unfinished jobs
+    """
+
+
+def checkpoint():
+    """
+    Raise JobCancelled when the job running on this thread is cancelled or
+    past its deadline; does nothing outside a job
+    """
+    job = getattr(_current, "job", None)
+    if job is not None:
+        job._check()
+
+
+class Job:
+    """
+    One submitted callable with its state, progress and result
+    """
+
+    def __init__(self, kind, timeout=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.timeout = timeout
+        self.state = QUEUED
+        self.done = 0
+        self.total = None
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Bumped on every change so streams only send new snapshots
+        self.revision = 0
+        self.future = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def deadline(self):
+        if self.timeout is None or self.started_at is None:
+            return None
+        return self.started_at + self.timeout
+
+    @property
+    def active(self):
+        """
+        Whether the job still occupies the queue: unfinished, or stopped while
+        its thread has not yet returned
+        """
+        return self.state not in FINISHED or (self.future is not None and not self.future.done())
+
+    def progress(self, done, total=None, stage=None):
+        """
+        Record progress; raises JobCancelled when the job should stop
+        """
+        self._check()
+        with self._lock:
+            self.done = done
+            if total is not None:
+                self.total = total
+            if stage is not None:
+                self.stage = stage
+            self.revision += 1
+
+    def cancel(self):
+        """
+        Ask the job to stop. Returns False when it has already finished.
+        """
+        with self._lock:
+            if self.state in FINISHED:
+                return False
+            self._cancel.set()
+            if self.future is not None and self.future.cancel():
+                self._finish(CANCELLED)
+            return True
+
+    def expire(self):
+        """
+        Mark a running job that is past its deadline as timed out
+        """
+        with self._lock:
+            deadline = self.deadline
+            if self.state == RUNNING and deadline is not None and time.time() > deadline:
+                self._cancel.set()
+                self._finish(TIMED_OUT)
+
+    def snapshot(self, include_result=False):
+        """
+        JSON-ready status of the job; the result is only included when asked for
+        """
+        self.expire()
+        with self._lock:
+            status = {
+                "id": self.id,
+                "kind": self.kind,
+                "state": self.state,
+                "progress": {"done": self.done, "total": self.total, "stage": self.stage},
+                "timeout": self.timeout,
+                "submitted_at": self.submitted_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "error": self.error,
+            }
+            if include_result:
+                status["result"] = self.result
+            return status
+
+    def _check(self):
+        self.expire()
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def _run(self, fn):
+        with self._lock:
+            if self._cancel.is_set():
+                self._finish(CANCELLED)
+                return
+            self.state = RUNNING
+            self.started_at = time.time()
+            self.revision += 1
+        _current.job = self
+        try:
+            result = fn(self.progress)
+            self._check()
+        except JobCancelled:
+            with self._lock:
+                self._finish(CANCELLED)
+        except Exception as e:
+            with self._lock:
+                self.error = str(e)
+                self._finish(FAILED)
+        else:
+            with self._lock:
+                self.result = result
+                self._finish(SUCCEEDED)
+        finally:
+            _current.job = None
+
+    def _finish(self, state):
+        # Caller holds the lock; the first terminal state wins
+        if self.state in FINISHED:
+            return
+        self.state = state
+        self.finished_at = time.time()
+        self.revision += 1
+
+
+class JobQueue:
+    """
+    Jobs run on `workers` threads. At most `max_pending` jobs may be active at
+    once (unfinished, or cancelled or timed out but still returning from their
+    thread), and the `max_finished` most recent finished jobs are kept for
+    retrieval.
+    """
+
+    def __init__(self, workers=2, max_pending=64, max_finished=256, default_timeout=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.default_timeout = default_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, timeout=None):
+        """
+        Queue `fn(progress)` and return its Job without waiting for it
+        """
+        with self._lock:
+            self._prune()
+            pending = sum(job.active for job in self._jobs.values())
+            if pending >= self.max_pending:
+                raise QueueFull(f"Job queue is full ({self.max_pending} active jobs)")
+            job = Job(kind, timeout if timeout is not None else self.default_timeout)
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(job._run, fn)
+        return job
+
+    def get(self, job_id):
+        """
+        Job by ID; raises KeyError for unknown or pruned jobs
+        """
+        with self._lock:
+            return self._jobs[job_id]
+
+    def cancel(self, job_id):
+        return self.get(job_id).cancel()
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self, wait=True):
+        for job in self.jobs():
+            job.cancel()
+        self._executor.shutdown(wait=wait)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
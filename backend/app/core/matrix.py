@@ -0,0 +1,325 @@
+"""
+Many-to-many travel-time matrices over a compact graph.
+
+Without a contraction hierarchy every row is a one-to-many Dijkstra that stops
+as soon as all destinations are settled. Searches run from whichever side of
+the matrix is smaller (over the reversed graph when that is the target side
+of a directed network) and are split into batches that a process pool works
+through in parallel. With a hierarchy the bucket algorithm is used instead:
+one upward search per target fills per-node buckets and one upward search per
+source scans them; those searches are batched onto the same pool.
+
+Binary layout (little-endian): magic "STNM", u16 version, u16 flags, u32 rows,
+u32 cols, then float32[rows * cols] row-major, inf where unreachable.
+"""
+
+import atexit
+import heapq
+import multiprocessing
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from app.core import config
+from app.core.contraction import ContractionHierarchy
+from app.core.shared_graph import SharedGraph
+
+MEDIA_TYPE = "application/vnd.smart-traffic.matrix"
+MAGIC = b"STNM"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHHII")
+
+# One long-lived process pool serves every matrix; graphs reach it through
+# shared memory, hierarchies through their folder on disk
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+_published = {}
+_MAX_PUBLISHED = 2
+
+# Search lists (and their source mapping) cached inside a pool worker
+_worker_cache = {}
+
+
+def nearest_nodes(core, lon, lat):
+    """
+    Index of the closest node to each (lon, lat) point, by equirectangular distance
+    """
+    lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+    lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+    if core.num_nodes == 0:
+        raise ValueError("No network loaded")
+    xs = np.nan_to_num(core.x, nan=np.inf)
+    ys = np.nan_to_num(core.y, nan=np.inf)
+    result = np.empty(len(lon), dtype=np.int64)
+    # Chunk the points so the (points x nodes) distance block stays small
+    step = max(1, 2_000_000 // core.num_nodes)
+    for start in range(0, len(lon), step):
+        px, py = lon[start:start + step, None], lat[start:start + step, None]
+        dx = (xs[None, :] - px) * np.cos(np.radians(py))
+        dy = ys[None, :] - py
+        result[start:start + step] = np.argmin(dx * dx + dy * dy, axis=1)
+    return result
+
+
+def _search_lists(core, weights, reverse=False):
+    """
+    (indptr, indices, edge weights) lists for searching forward or against edge direction
+    """
+    w = core.edge_weights(weights).tolist()
+    if not reverse:
+        indptr, indices, adj_edges = core.adjacency_lists()
+        return indptr, indices, [w[e] for e in adj_edges]
+    order = np.argsort(core.edge_v, kind="stable")
+    indptr = np.zeros(core.num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(core.edge_v, minlength=core.num_nodes), out=indptr[1:])
+    return indptr.tolist(), core.edge_u[order].tolist(), [w[e] for e in order.tolist()]
+
+
+def _one_to_many(graph, origin, destinations):
+    """
+    Costs from origin to each destination (a list of node indices), stopping once all are settled
+    """
+    indptr, indices, slot_weights = graph
+    inf = float("inf")
+    wanted = {}
+    for column, node in enumerate(destinations):
+        wanted.setdefault(node, []).append(column)
+    row = [inf] * len(destinations)
+    remaining = len(wanted)
+    dist = {origin: 0.0}
+    done = set()
+    heap = [(0.0, origin)]
+    while heap and remaining:
+        d, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        done.add(u)
+        columns = wanted.get(u)
+        if columns is not None:
+            for column in columns:
+                row[column] = d
+            remaining -= 1
+        for slot in range(indptr[u], indptr[u + 1]):
+            cost = slot_weights[slot]
+            if cost == inf:
+                continue
+            v = indices[slot]
+            nd = d + cost
+            if nd < dist.get(v, inf):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return row
+
+
+def _worker_cached(key, load):
+    """
+    Value cached in a pool worker under key; only the latest graph is kept
+    """
+    if key not in _worker_cache:
+        _worker_cache.clear()
+        _worker_cache[key] = load()
+    return _worker_cache[key]
+
+
+def _attach_lists(handle, weights, reverse):
+    core, memory = SharedGraph.attach(handle)
+    return _search_lists(core, weights, reverse=reverse), memory
+
+
+def _solve_batch(task):
+    handle, weights, reverse, origins, destinations = task
+    graph, _ = _worker_cached(
+        (handle[0], weights, reverse), lambda: _attach_lists(handle, weights, reverse)
+    )
+    return [_one_to_many(graph, origin, destinations) for origin in origins]
+
+
+def _upward(indptr, arcs, other_end, cost, source):
+    """
+    Exhaustive Dijkstra over one direction of a contraction hierarchy
+    """
+    inf = float("inf")
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for slot in range(indptr[u], indptr[u + 1]):
+            arc = arcs[slot]
+            v = other_end[arc]
+            nd = d + cost[arc]
+            if nd < dist.get(v, inf):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+def _search_spaces(lists, upward, nodes):
+    """
+    Upward search space of each node as (node indices, costs) arrays; forward
+    searches climb the up arcs, backward ones the down arcs
+    """
+    up_indptr, up_arcs, down_indptr, down_arcs, tail, head, cost = lists
+    if upward:
+        indptr, arcs, other_end = up_indptr, up_arcs, head
+    else:
+        indptr, arcs, other_end = down_indptr, down_arcs, tail
+    spaces = []
+    for node in nodes:
+        dist = _upward(indptr, arcs, other_end, cost, node)
+        spaces.append((
+            np.fromiter(dist.keys(), dtype=np.int64, count=len(dist)),
+            np.fromiter(dist.values(), dtype=np.float64, count=len(dist)),
+        ))
+    return spaces
+
+
+def _search_batch(task):
+    path, fingerprint, upward, nodes = task
+    ch = _worker_cached(path, lambda: ContractionHierarchy.load(path, fingerprint))
+    return _search_spaces(ch._search_lists(), upward, nodes)
+
+
+def _shutdown():
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        for shared in _published.values():
+            shared.close()
+        _published.clear()
+
+
+def _get_pool(workers):
+    """
+    The process pool shared by all matrix requests, created on first use
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(config.PROCESS_START_METHOD),
+            )
+            _pool_workers = workers
+            atexit.unregister(_shutdown)
+            atexit.register(_shutdown)
+        return _pool
+
+
+def _publish(core):
+    """
+    Shared memory handle of a graph for the pool; the last few graphs stay
+    published so requests still in flight on a replaced graph can finish
+    """
+    fingerprint = core.fingerprint()
+    with _pool_lock:
+        shared = _published.pop(fingerprint, None)
+        if shared is None:
+            shared = SharedGraph(core)
+        _published[fingerprint] = shared
+        while len(_published) > _MAX_PUBLISHED:
+            _published.pop(next(iter(_published))).close()
+        return shared.handle
+
+
+def _batches(items, batch_size):
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+def contraction_matrix(ch, sources, targets, workers=1, batch_size=32, parallel_min=64):
+    """
+    Many-to-many costs with the bucket algorithm over a contraction hierarchy.
+
+    The upward searches from every target and source are independent; with
+    enough of them and a hierarchy saved on disk they run as batches on the
+    process pool, whose workers map the hierarchy. Buckets are then joined
+    with the source searches as array operations.
+    """
+    if workers > 1 and ch.path is not None and len(sources) + len(targets) >= parallel_min:
+        pool = _get_pool(workers)
+        tasks = [(ch.path, ch.fingerprint, False, batch) for batch in _batches(targets, batch_size)]
+        tasks += [(ch.path, ch.fingerprint, True, batch) for batch in _batches(sources, batch_size)]
+        spaces = [space for block in pool.map(_search_batch, tasks) for space in block]
+    else:
+        lists = ch._search_lists()
+        spaces = _search_spaces(lists, False, targets) + _search_spaces(lists, True, sources)
+    target_spaces, source_spaces = spaces[:len(targets)], spaces[len(targets):]
+
+    # Buckets: (column, cost) of every target search, grouped by the node they reached
+    nodes = np.concatenate([space[0] for space in target_spaces])
+    columns = np.repeat(np.arange(len(targets)), [len(space[0]) for space in target_spaces])
+    costs = np.concatenate([space[1] for space in target_spaces])
+    order = np.argsort(nodes, kind="stable")
+    columns, costs = columns[order], costs[order]
+    bucket_ptr = np.zeros(ch.rank.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(nodes, minlength=ch.rank.shape[0]), out=bucket_ptr[1:])
+
+    matrix = np.full((len(sources), len(targets)), np.inf)
+    for row, (reached, dist) in enumerate(source_spaces):
+        starts = bucket_ptr[reached]
+        counts = bucket_ptr[reached + 1] - starts
+        total = int(counts.sum())
+        if not total:
+            continue
+        # Positions of every bucket entry of the reached nodes, in order
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        entries = offsets + np.arange(total)
+        np.minimum.at(matrix[row], columns[entries], np.repeat(dist, counts) + costs[entries])
+    return matrix
+
+
+def travel_time_matrix(core, sources, targets, weights="travel_time", workers=1,
+                       batch_size=32, parallel_min=64):
+    """
+    (len(sources), len(targets)) float64 matrix of shortest-path costs between
+    node indices; inf where a target is unreachable
+    """
+    sources, targets = list(sources), list(targets)
+    if not sources or not targets:
+        return np.zeros((len(sources), len(targets)))
+    ch = core.contraction
+    if ch is not None and ch.weight == weights:
+        return contraction_matrix(ch, sources, targets, workers, batch_size, parallel_min)
+
+    # Search from the smaller side; undirected costs are symmetric and directed
+    # ones are found by walking edges backwards from each target
+    transpose = len(targets) < len(sources)
+    origins, destinations = (targets, sources) if transpose else (sources, targets)
+    reverse = transpose and core.directed
+
+    batches = _batches(origins, batch_size)
+    if workers > 1 and len(origins) >= parallel_min and len(batches) > 1:
+        handle = _publish(core)
+        tasks = [(handle, weights, reverse, batch, destinations) for batch in batches]
+        rows = [row for block in _get_pool(workers).map(_solve_batch, tasks) for row in block]
+    else:
+        graph = _search_lists(core, weights, reverse=reverse)
+        rows = [_one_to_many(graph, origin, destinations) for origin in origins]
+
+    matrix = np.array(rows, dtype=np.float64).reshape(len(origins), len(destinations))
+    return matrix.T if transpose else matrix
+
+
+def encode_matrix(matrix):
+    """
+    Encode a cost matrix in the binary matrix format
+    """
+    matrix = np.asarray(matrix, dtype="<f4")
+    rows, cols = matrix.shape
+    return _HEADER.pack(MAGIC, VERSION, 0, rows, cols) + np.ascontiguousarray(matrix).tobytes()
+
+
+def decode_matrix(data):
+    """
+    Decode the binary matrix format into a float32 array
+    """
+    magic, version, _, rows, cols = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a supported binary matrix payload")
+    return np.frombuffer(data, dtype="<f4", count=rows * cols, offset=_HEADER.size).reshape(rows, cols)
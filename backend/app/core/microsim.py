@@ -0,0 +1,249 @@
+"""
+Time-stepped microsimulation of a vehicle fleet over a compact graph.
+
+Every vehicle follows a fixed path of edges. A vehicle crosses an edge at its
+free-flow travel time and then waits at the stop line until it may leave:
+its approach is green (or yellow), the approach's saturation headway has
+passed since the previous vehicle, and the next road has storage left. Vehicles
+queue first in, first out. Only vehicles at a stop line are touched in a tick,
+and those are processed together with NumPy group ranking, so cruising
+vehicles cost nothing until they arrive at the next intersection.
+
+All times are seconds: edge travel times (see app.core.weighting), signal
+cycles, headways and waypoint arrival times.
+"""
+
+from itertools import chain
+
+import numpy as np
+
+from app.core.jobs import checkpoint
+from app.core.signals import SignalTable
+
+# Seconds between consecutive vehicles discharging from one approach (1800 veh/h)
+SATURATION_HEADWAY = 2.0
+
+# Metres of road a queued vehicle occupies
+JAM_SPACING = 7.5
+
+
+def group_rank(groups, keys):
+    """
+    Position of each element within its group when the group is ordered by key
+    """
+    n = len(groups)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    # One float sort key: group major, key minor
+    keys = np.asarray(keys, dtype=np.float64)
+    low = keys.min()
+    order = np.argsort(groups * (keys.max() - low + 1.0) + (keys - low), kind="stable")
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n) - np.repeat(starts, counts)
+    return rank
+
+
+class Fleet:
+    """
+    Flattened vehicle paths.
+
+    The nodes of all paths are laid out end to end; leg j runs from node j to
+    node j + 1 of the same vehicle, so leg arrays are indexed like the node
+    array and the last slot of each vehicle is padding. A link is one driving
+    direction of an edge (2 * edge + 1 for travel against edge_u -> edge_v).
+    """
+
+    def __init__(self, core, paths, departures, edge_times=None):
+        self.core = core
+        count = len(paths)
+        lengths = np.fromiter((len(nodes) for nodes, _ in paths), dtype=np.int64, count=count)
+        self.offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.first = self.offsets[:-1]
+        self.last = self.offsets[1:] - 1
+        self.departures = np.asarray(departures, dtype=np.float64)
+
+        total = int(self.offsets[-1])
+        self.nodes = np.fromiter(
+            chain.from_iterable(nodes for nodes, _ in paths), dtype=np.int64, count=total
+        )
+        edges = np.full(total, -1, dtype=np.int64)
+        has_leg = np.ones(total, dtype=bool)
+        has_leg[self.last] = False
+        edges[has_leg] = np.fromiter(
+            chain.from_iterable(path_edges for _, path_edges in paths), dtype=np.int64,
+            count=int(has_leg.sum()),
+        )
+        self.edges = edges
+        self.has_leg = has_leg
+
+        times = np.asarray(core.travel_time if edge_times is None else edge_times, dtype=np.float64)
+        self.leg_time = np.where(has_leg, times[np.maximum(edges, 0)], 0.0)
+        exit_nodes = np.r_[self.nodes[1:], -1]
+        against = has_leg & (exit_nodes != core.edge_v[np.maximum(edges, 0)])
+        self.links = np.where(has_leg, 2 * edges + against, -1)
+        self.exit_nodes = exit_nodes
+        self.free_time = np.add.reduceat(self.leg_time, self.first) if total else np.zeros(count)
+
+    def __len__(self):
+        return len(self.first)
+
+
+class MicroSimulation:
+    """
+    Tick-based fleet simulation; see the module docstring for the traffic model
+    """
+
+    def __init__(self, core, paths, departures, traffic_lights=None, edge_times=None,
+                 tick=1.0, headway=SATURATION_HEADWAY, jam_spacing=JAM_SPACING):
+        self.core = core
+        self.fleet = Fleet(core, paths, departures, edge_times)
+        self.tick = tick
+        self.headway = headway
+        signals = SignalTable.compile(core, traffic_lights)
+        fleet = self.fleet
+        # The approach a vehicle uses to leave each leg: into the exit node from the entry node
+        self.leg_approach = np.where(
+            fleet.has_leg, signals.approaches(np.maximum(fleet.exit_nodes, 0), fleet.nodes), -1
+        )
+        self.signals = signals
+        self.storage = np.maximum(
+            1, np.floor(np.repeat(core.length.astype(np.float64), 2) / jam_spacing)
+        ).astype(np.int64)
+
+        # Time each vehicle passes each node of its path (nan until reached)
+        self.node_times = np.full(len(fleet.nodes), np.nan)
+        self.node_times[fleet.first] = fleet.departures
+        self.time = 0.0
+
+    def run(self, duration):
+        """
+        Advance the fleet from t = 0 until `duration` or until every vehicle has arrived
+        """
+        fleet, tick, headway = self.fleet, self.tick, self.headway
+        inf = np.inf
+        count = len(fleet)
+        leg = fleet.first.copy()
+        ready = fleet.departures + fleet.leg_time[leg]
+        occupancy = np.zeros(len(self.storage), dtype=np.int64)
+        next_free = np.full(len(self.storage), -inf)
+
+        # Vehicles without a single edge arrive as they depart
+        empty = ~fleet.has_leg[leg]
+        ready[empty] = inf
+        remaining = count - int(empty.sum())
+
+        departure_order = np.argsort(fleet.departures, kind="stable")
+        departure_order = departure_order[~empty[departure_order]]
+        sorted_departures = fleet.departures[departure_order]
+        spawned = 0
+
+        t = 0.0
+        while t < duration and remaining:
+            checkpoint()
+            t_end = min(t + tick, duration)
+
+            # Put this tick's departures on their first road
+            upto = int(np.searchsorted(sorted_departures, t_end, side="right"))
+            if upto > spawned:
+                new = departure_order[spawned:upto]
+                occupancy += np.bincount(fleet.links[leg[new]], minlength=len(occupancy))
+                spawned = upto
+
+            at_line = np.flatnonzero(ready <= t_end)
+            if len(at_line):
+                cur = leg[at_line]
+                links = fleet.links[cur]
+                arriving = fleet.last[at_line] == cur + 1
+
+                # Vehicles on their final road park as soon as they reach its end
+                done = at_line[arriving]
+                if len(done):
+                    self.node_times[leg[done] + 1] = ready[done]
+                    occupancy -= np.bincount(links[arriving], minlength=len(occupancy))
+                    ready[done] = inf
+                    remaining -= len(done)
+
+                waiting = at_line[~arriving]
+                cur, links = cur[~arriving], links[~arriving]
+                # Signal states are sampled once per tick, at its start
+                green = self.signals.green_at(t)[self.leg_approach[cur]]
+                waiting, cur, links = waiting[green], cur[green], links[green]
+                go = np.maximum(ready[waiting], t)
+
+                # Discharge in arrival order, one vehicle per saturation headway
+                rank = group_rank(links, ready[waiting])
+                cross = np.maximum(go, np.maximum(next_free[links], t) + rank * headway)
+                can = cross < t_end
+                nxt = fleet.links[cur + 1]
+                space = self.storage[nxt] - occupancy[nxt]
+                down_rank = np.full(len(waiting), np.iinfo(np.int64).max)
+                down_rank[can] = group_rank(nxt[can], ready[waiting[can]])
+                blocked = can & (down_rank >= space)
+                # Queues stay first in, first out behind a vehicle held by a full road
+                first_blocked = np.full(len(occupancy), np.iinfo(np.int64).max)
+                np.minimum.at(first_blocked, links[blocked], rank[blocked])
+                moving = can & ~blocked & (rank < first_blocked[links])
+
+                if moving.any():
+                    movers, cross = waiting[moving], cross[moving]
+                    from_links, to_links = links[moving], nxt[moving]
+                    np.maximum.at(next_free, from_links, cross + headway)
+                    occupancy -= np.bincount(from_links, minlength=len(occupancy))
+                    occupancy += np.bincount(to_links, minlength=len(occupancy))
+                    leg[movers] += 1
+                    self.node_times[leg[movers]] = cross
+                    ready[movers] = cross + fleet.leg_time[leg[movers]]
+            t = t_end
+
+        self.time = t
+        return self
+
+    @property
+    def arrivals(self):
+        """
+        Arrival time per vehicle (nan while still travelling)
+        """
+        return self.node_times[self.fleet.last]
+
+    def delays(self):
+        """
+        Time lost to signals and queues per arrived vehicle (nan otherwise)
+        """
+        fleet = self.fleet
+        return self.arrivals - fleet.departures - fleet.free_time
+
+    def stats(self):
+        """
+        Fleet-wide counts and travel-time/delay aggregates
+        """
+        fleet = self.fleet
+        arrived = ~np.isnan(self.arrivals)
+        departed = fleet.departures <= self.time
+        delays = self.delays()[arrived]
+        travel = (self.arrivals - fleet.departures)[arrived]
+        return {
+            "vehicles": len(fleet),
+            "arrived": int(arrived.sum()),
+            "en_route": int((departed & ~arrived).sum()),
+            "not_departed": int((~departed).sum()),
+            "simulated_time": self.time,
+            "mean_travel_time": float(travel.mean()) if len(travel) else None,
+            "total_delay": float(delays.sum()),
+            "mean_delay": float(delays.mean()) if len(delays) else None,
+            "p95_delay": float(np.percentile(delays, 95)) if len(delays) else None,
+        }
+
+    def trajectories(self):
+        """
+        Per vehicle, the (node index, time) pairs of the nodes it has passed
+        """
+        fleet = self.fleet
+        nodes, times = fleet.nodes.tolist(), self.node_times.tolist()
+        result = []
+        for start, end in zip(fleet.first.tolist(), (fleet.last + 1).tolist()):
+            result.append([(nodes[j], times[j]) for j in range(start, end) if times[j] == times[j]])
+        return result
@@ -0,0 +1,96 @@
+import hashlib
+from array import array
+
+from app.core.route_cache import incident_key
+
+
+class WeightOverlay:
+    """
+    Incident weight multipliers and closures layered over a shared compact graph.
+
+    The base graph is never copied or modified: the overlay only records a
+    factor per affected edge (inf closes it) and hands out a patched copy of a
+    weight column on demand. Several overlays can sit over the same graph, one
+    per request or scenario.
+    """
+
+    def __init__(self, core, factors=None):
+        self.core = core
+        self.factors = {}
+        self._weights = {}
+        for edge, factor in (factors or {}).items():
+            self.scale(edge, factor)
+
+    @classmethod
+    def closing(cls, core, edges):
+        """
+        Overlay that closes the given edge indices
+        """
+        return cls(core, {edge: float("inf") for edge in edges})
+
+    def scale(self, edge, factor):
+        """
+        Multiply an edge's weight by factor; repeated calls compound
+        """
+        factor = self.factors.get(edge, 1.0) * factor
+        if factor == 1.0:
+            self.factors.pop(edge, None)
+        else:
+            self.factors[edge] = factor
+        self._weights.clear()
+
+    def close(self, edge):
+        self.scale(edge, float("inf"))
+
+    def __bool__(self):
+        return bool(self.factors)
+
+    @property
+    def edges(self):
+        """
+        Edge indices whose weight the overlay changes
+        """
+        return self.factors.keys()
+
+    @property
+    def closed(self):
+        return {edge for edge, factor in self.factors.items() if factor == float("inf")}
+
+    @property
+    def slows_only(self):
+        """
+        True when no edge gets cheaper, so a base-graph path that avoids every
+        overlaid edge is still a shortest path
+        """
+        return all(factor >= 1.0 for factor in self.factors.values())
+
+    def weight(self, edge, weight="travel_time"):
+        return self.core.weight_list(weight)[edge] * self.factors.get(edge, 1.0)
+
+    def weights(self, weight="travel_time"):
+        """
+        Per-edge weight list with the overlay applied (the shared base list when empty)
+        """
+        base = self.core.weight_list(weight) if isinstance(weight, str) else weight
+        if not self.factors:
+            return base
+        key = weight if isinstance(weight, str) else id(weight)
+        if key not in self._weights:
+            patched = list(base)
+            for edge, factor in self.factors.items():
+                patched[edge] = base[edge] * factor
+            self._weights[key] = patched
+        return self._weights[key]
+
+    def key(self):
+        """
+        Fingerprint of the overlay for cache keys; closures alone hash like incident_key
+        """
+        closed = self.closed
+        if len(closed) == len(self.factors):
+            return incident_key(closed)
+        digest = hashlib.blake2b(digest_size=8)
+        edges = sorted(self.factors)
+        digest.update(array("i", edges).tobytes())
+        digest.update(array("d", [self.factors[e] for e in edges]).tobytes())
+        return digest.hexdigest()
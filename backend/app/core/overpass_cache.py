@@ -0,0 +1,384 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+MANIFEST_NAME = "index.json"
+STORE_DIR = "store"
+
+# Files above this size are never empty responses, so scan() does not parse them
+_EMPTY_PROBE_BYTES = 1024
+_POLY_RE = re.compile(r"poly:\s*[\"']([^\"']+)[\"']")
+
+
+def cache_key(url):
+    """
+    Cache key of a request URL; identical to OSMnx's cache file naming
+    """
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def parse_overpass_url(url):
+    """
+    Extract the Overpass QL query and its (north, south, east, west) polygon
+    bounds from a GET-style request URL; either may be None
+    """
+    query = parse_qs(urlsplit(url).query).get("data", [None])[0]
+    if not query:
+        return None, None
+    match = _POLY_RE.search(query)
+    if not match:
+        return query, None
+    values = [float(v) for v in match.group(1).split()]
+    lats, lons = values[0::2], values[1::2]
+    if not lats or len(lats) != len(lons):
+        return query, None
+    return query, [max(lats), min(lats), max(lons), min(lons)]
+
+
+def _is_empty_response(response):
+    return isinstance(response, dict) and response.get("elements") == []
+
+
+class OverpassCache:
+    """
+    Manager for the Overpass response cache directory.
+
+    Keeps a manifest index (query, bbox, timestamps, size, empty flag) next to
+    the raw OSMnx cache files, remembers empty responses without storing them,
+    compacts raw OSMnx JSON files into a gzip store and evicts least recently used
+    entries by total size or age. Recently used responses are also kept parsed
+    in memory so a hit does not re-read multi-megabyte JSON.
+
+    Raw files the manager did not write (legacy OSMnx files, possibly checked
+    in) are left in place, and entries still backed by one are never evicted,
+    unless `remove_raw` is set: compact() then deletes them once copied and
+    eviction deletes the raw file with its entry. Such files hold
+    only the response; the query and bbox of their entries are parsed from
+    the request URL the first time it is looked up. Access times are written
+    back to the manifest at most every `flush_interval` seconds and on flush().
+    """
+
+    def __init__(self, root, max_bytes=None, max_age=None, memory_entries=8, flush_interval=5.0,
+                 remove_raw=False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.remove_raw = remove_raw
+        self.memory_entries = memory_entries
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()
+        self._dirty = False
+        self._written = 0.0
+        self.installed = False
+        self.entries = self._read_manifest()
+
+    # Manifest
+
+    def _manifest_path(self):
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as f:
+                return json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".index-", dir=self.root)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"entries": self.entries}, f)
+        os.replace(tmp, self._manifest_path())
+        self._dirty = False
+        self._written = time.time()
+
+    def flush(self):
+        """
+        Write pending access times to the manifest
+        """
+        with self._lock:
+            if self._dirty:
+                self._write_manifest()
+
+    def _raw_path(self, key):
+        return os.path.join(self.root, f"{key}.json")
+
+    def _store_path(self, key):
+        return os.path.join(self.root, STORE_DIR, f"{key}.json.gz")
+
+    def scan(self):
+        """
+        Reconcile the manifest with the files on disk; returns the number of new entries
+        """
+        with self._lock:
+            added = 0
+            on_disk = set()
+            for filename in os.listdir(self.root) if os.path.isdir(self.root) else []:
+                key, ext = os.path.splitext(filename)
+                if ext != ".json" or filename == MANIFEST_NAME:
+                    continue
+                on_disk.add(key)
+                # Raw files kept next to their store copy are already indexed
+                if key in self.entries and (self.entries[key]["location"] == "raw" or self.entries[key].get("raw")):
+                    continue
+                path = self._raw_path(key)
+                stat = os.stat(path)
+                empty = False
+                if stat.st_size <= _EMPTY_PROBE_BYTES:
+                    try:
+                        with open(path, encoding="utf-8") as f:
+                            empty = _is_empty_response(json.load(f))
+                    except ValueError:
+                        continue
+                entry = self.entries.get(key, {})
+                entry.update({
+                    "query": entry.get("query"),
+                    "bbox": entry.get("bbox"),
+                    "created": entry.get("created", stat.st_mtime),
+                    "last_access": entry.get("last_access", stat.st_mtime),
+                    "size": stat.st_size,
+                    "empty": empty,
+                    "location": "raw",
+                    "raw": True,
+                })
+                self.entries[key] = entry
+                added += 1
+
+            # Drop entries whose backing file vanished (empty entries need no file)
+            for key, entry in list(self.entries.items()):
+                if entry.get("raw") and key not in on_disk:
+                    entry["raw"] = False
+                if entry["location"] == "raw" and key not in on_disk:
+                    del self.entries[key]
+                elif entry["location"] == "store" and not os.path.isfile(self._store_path(key)):
+                    del self.entries[key]
+
+            self._write_manifest()
+            return added
+
+    # Lookups
+
+    def get(self, url):
+        """
+        Cached response for a request URL, or None on a miss
+        """
+        key = cache_key(url)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry["last_access"] = time.time()
+            if entry.get("query") is None:
+                # Legacy files are named by the SHA-1 of this URL and hold no query
+                entry["query"], entry["bbox"] = parse_overpass_url(url)
+            self._dirty = True
+            self.hits += 1
+            if time.time() - self._written >= self.flush_interval:
+                self._write_manifest()
+
+            if entry["empty"]:
+                return {"elements": []}
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            try:
+                if entry["location"] == "store":
+                    with gzip.open(self._store_path(key), "rt", encoding="utf-8") as f:
+                        response = json.load(f)
+                else:
+                    with open(self._raw_path(key), encoding="utf-8") as f:
+                        response = json.load(f)
+            except (OSError, ValueError):
+                del self.entries[key]
+                self.hits -= 1
+                self.misses += 1
+                return None
+            self._remember(key, response)
+            return response
+
+    def put(self, url, response):
+        """
+        Record a response in the gzip store; empty responses become
+        manifest-only negative entries
+        """
+        key = cache_key(url)
+        query, bbox = parse_overpass_url(url)
+        now = time.time()
+        with self._lock:
+            empty = _is_empty_response(response)
+            size = 0
+            location = "none"
+            if not empty:
+                os.makedirs(os.path.join(self.root, STORE_DIR), exist_ok=True)
+                with gzip.open(self._store_path(key), "wt", encoding="utf-8") as f:
+                    json.dump(response, f)
+                size = os.path.getsize(self._store_path(key))
+                location = "store"
+                self._remember(key, response)
+            self.entries[key] = {
+                "query": query,
+                "bbox": bbox,
+                "created": now,
+                "last_access": now,
+                "size": size,
+                "empty": empty,
+                "location": location,
+            }
+            self._enforce_limits()
+            self._write_manifest()
+
+    def _remember(self, key, response):
+        if self.memory_entries <= 0:
+            return
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def is_known_empty(self, north, south, east, west):
+        """
+        True when a cached empty response already covers the given bounding box
+        """
+        with self._lock:
+            for entry in self.entries.values():
+                bbox = entry.get("bbox")
+                if not entry["empty"] or not bbox:
+                    continue
+                n, s, e, w = bbox
+                if s <= south and north <= n and w <= west and east <= e:
+                    return True
+            return False
+
+    # Maintenance
+
+    def compact(self, remove_raw=None):
+        """
+        Copy raw JSON into the gzip store and index empty responses as
+        manifest-only entries. The raw files stay in place unless `remove_raw`
+        (default: the cache's setting) is set; returns the number of bytes
+        reclaimed by removing them.
+        """
+        if remove_raw is None:
+            remove_raw = self.remove_raw
+        with self._lock:
+            reclaimed = 0
+            os.makedirs(os.path.join(self.root, STORE_DIR), exist_ok=True)
+            for key, entry in self.entries.items():
+                raw_path = self._raw_path(key)
+                if entry["location"] == "raw":
+                    raw_size = entry["size"]
+                    if entry["empty"]:
+                        entry.update(size=0, location="none")
+                    else:
+                        with open(raw_path, "rb") as src, gzip.open(self._store_path(key), "wb") as dst:
+                            dst.write(src.read())
+                        entry.update(size=os.path.getsize(self._store_path(key)), location="store")
+                elif remove_raw and entry.get("raw"):
+                    raw_size = os.path.getsize(raw_path) if os.path.isfile(raw_path) else 0
+                else:
+                    continue
+                if remove_raw:
+                    if os.path.isfile(raw_path):
+                        os.remove(raw_path)
+                    entry["raw"] = False
+                    reclaimed += raw_size
+            self._write_manifest()
+            return reclaimed
+
+    def evict(self, max_bytes=None, max_age=None, remove_raw=None):
+        """
+        Drop entries older than max_age seconds, then least recently used entries
+        until the cache fits in max_bytes. Entries backed by a raw file are only
+        evicted, raw file included, with `remove_raw` (default: the cache's
+        setting). Returns the evicted keys.
+        """
+        if remove_raw is None:
+            remove_raw = self.remove_raw
+        with self._lock:
+            evicted = self._evict(max_bytes, max_age, remove_raw)
+            self._write_manifest()
+            return evicted
+
+    def _enforce_limits(self):
+        if self.max_bytes is not None or self.max_age is not None:
+            self._evict(self.max_bytes, self.max_age, self.remove_raw)
+
+    def _evict(self, max_bytes, max_age, remove_raw=False):
+        evicted = []
+        now = time.time()
+        # Entries still backed by a raw file the manager does not own stay
+        by_access = sorted(
+            ((key, entry) for key, entry in self.entries.items()
+             if remove_raw or (not entry.get("raw") and entry["location"] != "raw")),
+            key=lambda item: item[1]["last_access"],
+        )
+        total = sum(entry["size"] for _, entry in by_access)
+        for key, entry in by_access:
+            expired = max_age is not None and now - entry["last_access"] > max_age
+            # Negative entries cost no disk space and only expire by age
+            oversize = max_bytes is not None and total > max_bytes and entry["size"] > 0
+            if not expired and not oversize:
+                continue
+            self._remove(key, entry)
+            total -= entry["size"]
+            evicted.append(key)
+        return evicted
+
+    def _remove(self, key, entry):
+        if os.path.isfile(self._store_path(key)):
+            os.remove(self._store_path(key))
+        if (entry.get("raw") or entry["location"] == "raw") and os.path.isfile(self._raw_path(key)):
+            os.remove(self._raw_path(key))
+        self._memory.pop(key, None)
+        del self.entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "empty_entries": sum(1 for e in self.entries.values() if e["empty"]),
+                "bytes": sum(e["size"] for e in self.entries.values()),
+                "compressed_entries": sum(1 for e in self.entries.values() if e["location"] == "store"),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    # OSMnx integration
+
+    def install(self, ox):
+        """
+        Route OSMnx's HTTP response cache through this manager
+        """
+        module = getattr(ox, "_http", None) or getattr(ox, "downloader", None)
+        if module is None or not hasattr(module, "_retrieve_from_cache"):
+            return False
+
+        def retrieve(url, *args, **kwargs):
+            if not ox.settings.use_cache:
+                return None
+            return self.get(url)
+
+        def save(url, response_json, ok, *args, **kwargs):
+            if not ox.settings.use_cache or not ok:
+                return
+            if isinstance(response_json, dict) and "remark" in response_json:
+                return
+            self.put(url, response_json)
+
+        module._retrieve_from_cache = retrieve
+        module._save_to_cache = save
+        ox.settings.cache_folder = self.root
+        self.installed = True
+        return True
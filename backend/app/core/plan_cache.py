@@ -0,0 +1,93 @@
+import numpy as np
+from collections import Counter
+
+
+class SignalPlanCache:
+    """
+    Signal plans of one graph version, patched one intersection at a time.
+
+    `build(core, index, affected, incident_roads)` makes the plan of the
+    intersection at a node index; `affected` tells whether an incident road
+    ID names that intersection and `incident_roads` counts the active
+    incident road IDs. A plan may only depend on incidents on roads touching
+    that intersection, so when the incidents change only the endpoints of the
+    roads that gained or lost an incident are rebuilt and everything else is
+    served from the cache. A new graph version drops the cache and builds
+    every plan again.
+
+    `changes` holds the diff of the last call (None after a full rebuild).
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.version = None
+        self.core = None
+        self.incident_roads = Counter()
+        self.endpoints = Counter()
+        self.builds = 0
+        self.changes = None
+        self._lights = []
+        self._position = None
+
+    def plans(self, core, version, incident_roads):
+        """
+        Plans of every intersection (degree > 1) under the given incident road IDs
+        """
+        incident_roads = Counter(incident_roads)
+        if version != self.version or self._position is None:
+            self._rebuild(core, version, incident_roads)
+        else:
+            self.update(incident_roads)
+        return list(self._lights)
+
+    def update(self, incident_roads):
+        """
+        Switch to new incident road IDs, rebuilding only the intersections they
+        touch. Returns the diff as a list of {"intersection_id", "before", "after"}
+        for every plan that changed.
+        """
+        incident_roads = Counter(incident_roads)
+        changed = (incident_roads - self.incident_roads) + (self.incident_roads - incident_roads)
+        self._set_incidents(incident_roads)
+        touched = set()
+        for road_id in changed:
+            for part in road_id.split("-"):
+                try:
+                    touched.add(self.core.index_of(int(part)))
+                except (KeyError, ValueError):
+                    continue
+
+        diff = []
+        for index in sorted(touched):
+            position = int(self._position[index])
+            if position < 0:
+                continue
+            before = self._lights[position]
+            after = self._build(index)
+            if after != before:
+                self._lights[position] = after
+                diff.append({"intersection_id": after["intersection_id"], "before": before, "after": after})
+        self.changes = diff
+        return diff
+
+    def _set_incidents(self, incident_roads):
+        self.incident_roads = incident_roads
+        self.endpoints = Counter()
+        for road_id, count in incident_roads.items():
+            for part in road_id.split("-"):
+                self.endpoints[part] += count
+
+    def _build(self, index):
+        affected = str(self.core.node_id(index)) in self.endpoints
+        self.builds += 1
+        return self.build(self.core, index, affected, self.incident_roads)
+
+    def _rebuild(self, core, version, incident_roads):
+        self.core = core
+        self.version = version
+        self.changes = None
+        self._set_incidents(incident_roads)
+        intersections = np.flatnonzero(core.degree() > 1)
+        self._position = np.full(core.num_nodes, -1, dtype=np.int64)
+        self._position[intersections] = np.arange(len(intersections))
+        self._lights = [self._build(index) for index in intersections.tolist()]
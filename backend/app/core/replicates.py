@@ -0,0 +1,137 @@
+"""
+Seeded Monte Carlo replicates and their aggregated statistics.
+
+A replicate is one simulation run whose random route demand is drawn from
+its own seed. The seeds are spawned from a single root seed, so a whole
+batch (or any one replicate, through /simulate/complex) can be reproduced.
+Samples from every replicate are pooled per route (OD pair) and per road
+and summarized with grouped, vectorized quantiles instead of keeping every
+replicate's routes around.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+
+
+def replicate_seeds(seed, count):
+    """
+    Root seed and `count` independent replicate seeds spawned from it; a
+    fresh root seed is drawn when `seed` is None
+    """
+    sequence = np.random.SeedSequence(seed)
+    return int(sequence.entropy), [int(s) for s in sequence.generate_state(count, dtype=np.uint64)]
+
+
+def grouped_summary(groups, values, confidence=0.95):
+    """
+    Statistics of `values` per group label: count, mean, std, p50, p95 and a
+    normal-approximation confidence interval of the mean. Returns the sorted
+    distinct groups and a dict of arrays aligned with them.
+    """
+    groups = np.asarray(groups)
+    values = np.asarray(values, dtype=np.float64)
+    keys, inverse = np.unique(groups, return_inverse=True)
+    order = np.lexsort((values, inverse))
+    values, inverse = values[order], inverse[order]
+    count = np.bincount(inverse, minlength=len(keys))
+    start = np.concatenate(([0], np.cumsum(count)[:-1]))
+
+    mean = np.bincount(inverse, values, len(keys)) / np.maximum(count, 1)
+    squares = np.bincount(inverse, (values - mean[inverse]) ** 2, len(keys))
+    std = np.sqrt(squares / np.maximum(count - 1, 1))
+
+    def quantile(q):
+        # Linear interpolation between order statistics, as np.percentile does
+        position = start + q * (count - 1)
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, start + count - 1)
+        return values[low] + (position - low) * (values[high] - values[low])
+
+    half = NormalDist().inv_cdf(0.5 + confidence / 2) * std / np.sqrt(np.maximum(count, 1))
+    half[count < 2] = np.nan
+    return keys, {
+        "count": count,
+        "mean": mean,
+        "std": std,
+        "p50": quantile(0.5),
+        "p95": quantile(0.95),
+        "ci_low": mean - half,
+        "ci_high": mean + half,
+    }
+
+
+class ReplicateStats:
+    """
+    Travel time samples pooled over replicates, per route and per road
+    """
+
+    def __init__(self, confidence=0.95):
+        self.confidence = confidence
+        self.replicates = 0
+        self.unfinished = 0
+        self.fleet_means = []
+        self._route_keys, self._route_times = [], []
+        self._edge_keys, self._edge_times = [], []
+
+    def add(self, routes, vehicles=None):
+        """
+        Add one replicate. Without `vehicles` the routes' planned times are
+        sampled; with the vehicles of a microsimulation their simulated trip
+        and road times are, and vehicles that never arrived are only counted.
+        """
+        self.replicates += 1
+        times = []
+        if vehicles is None:
+            for route in routes:
+                times.append(route["travel_time"])
+                self._add_route(route, route["travel_time"])
+                self._add_edges(route["waypoints"], "arrival_time")
+        else:
+            for route, vehicle in zip(routes, vehicles):
+                if vehicle["arrival_time"] is None:
+                    self.unfinished += 1
+                    continue
+                travel_time = vehicle["arrival_time"] - vehicle["depart_time"]
+                times.append(travel_time)
+                self._add_route(route, travel_time)
+                self._add_edges(vehicle["trajectory"], "time")
+        if times:
+            self.fleet_means.append(float(np.mean(times)))
+
+    def _add_route(self, route, travel_time):
+        self._route_keys.append(f"{route['source']}-{route['target']}")
+        self._route_times.append(travel_time)
+
+    def _add_edges(self, points, time_key):
+        for before, after in zip(points, points[1:]):
+            self._edge_keys.append(f"{before['node_id']}-{after['node_id']}")
+            self._edge_times.append(after[time_key] - before[time_key])
+
+    def summary(self):
+        """
+        Fleet, per-route and per-road statistics over every replicate added so far
+        """
+        fleet = self._table(["fleet"] * len(self.fleet_means), self.fleet_means)
+        return {
+            "replicates": self.replicates,
+            "confidence": self.confidence,
+            "unfinished": self.unfinished,
+            "fleet_mean_travel_time": fleet[0] if fleet else None,
+            "routes": self._table(self._route_keys, self._route_times, "route"),
+            "edges": self._table(self._edge_keys, self._edge_times, "road_id"),
+        }
+
+    def _table(self, keys, values, label=None):
+        if not keys:
+            return []
+        groups, stats = grouped_summary(keys, values, self.confidence)
+        columns = {name: column.tolist() for name, column in stats.items()}
+        rows = []
+        for i, key in enumerate(groups.tolist()):
+            row = {label: key} if label else {}
+            for name, column in columns.items():
+                value = column[i]
+                row[name] = None if value != value else value
+            rows.append(row)
+        return rows
@@ -0,0 +1,171 @@
+import heapq
+import numpy as np
+
+from app.core.graph import unwind_path
+
+
+class RerouteEngine:
+    """
+    Keeps a fleet's routes on one network and re-routes incrementally as incidents change.
+
+    An edge -> routes reverse index finds the routes that cross a slowed or
+    closed edge. For edges that got faster (an incident cleared or eased),
+    two searches bounded by the longest route cost give every node's cost to
+    the edge's tail and from its head, which shows exactly which routes could
+    now improve by using it. Only those routes are searched again, one
+    shortest-path tree per distinct origin, so the work follows the size of
+    the incident rather than the size of the fleet.
+    """
+
+    def __init__(self, core, weights="travel_time"):
+        self.core = core
+        self.weight = weights
+        self.base = core.weight_list(weights)
+        self.weights = list(self.base)
+        self.factors = {}
+        self.routes = {}
+        self.edge_routes = {}
+        self.source_routes = {}
+        self._reverse = None
+
+    def add_route(self, route_id, source, target):
+        """
+        Route a vehicle on the current weights and start tracking it
+        """
+        dist, pred = self.core.dijkstra(source, target=target, weights=self.weights)
+        self._track(route_id, source, target, self._path(dist, pred, target))
+        return self.routes[route_id]
+
+    def remove_route(self, route_id):
+        route = self.routes.pop(route_id)
+        self._unindex(route_id, route)
+        self.source_routes[route["source"]].discard(route_id)
+
+    def set_incidents(self, factors):
+        """
+        Replace the active incidents with {edge index: travel-time factor} (inf closes
+        the edge) and re-route what they affect.
+        Returns a list of changes: {"id", "before", "after"} route records.
+        """
+        changed = {
+            e for e in set(self.factors) | set(factors)
+            if self.factors.get(e, 1.0) != factors.get(e, 1.0)
+        }
+        slower, faster = [], []
+        for e in changed:
+            (slower if factors.get(e, 1.0) > self.factors.get(e, 1.0) else faster).append(e)
+            self.weights[e] = self.base[e] * factors.get(e, 1.0)
+        self.factors = {e: f for e, f in factors.items() if f != 1.0}
+
+        affected = set()
+        for e in slower:
+            affected |= self.edge_routes.get(e, set())
+        if faster and self.routes:
+            # No route can gain from a detour costlier than the longest route
+            limit = max(route["cost"] for route in self.routes.values())
+            for e in faster:
+                affected |= self._improvable(e, limit)
+        return self._reroute(affected)
+
+    def _improvable(self, edge, limit):
+        """
+        Routes that a cheaper `edge` could shorten
+        """
+        cost = self.weights[edge]
+        if cost == float("inf"):
+            return set()
+        u, v = int(self.core.edge_u[edge]), int(self.core.edge_v[edge])
+        ends = [(u, v)] if self.core.directed else [(u, v), (v, u)]
+
+        improvable = set()
+        for tail, head in ends:
+            # Cost from every origin to the tail, and from the head to every destination
+            to_tail = self._bounded(tail, limit, reverse=True)
+            from_head = self._bounded(head, limit, reverse=False)
+            for source, d_source in to_tail.items():
+                for route_id in self.source_routes.get(source, ()):
+                    route = self.routes[route_id]
+                    d_target = from_head.get(route["target"])
+                    if d_target is not None and d_source + cost + d_target < route["cost"]:
+                        improvable.add(route_id)
+        return improvable
+
+    def _reroute(self, route_ids):
+        by_source = {}
+        for route_id in route_ids:
+            by_source.setdefault(self.routes[route_id]["source"], []).append(route_id)
+
+        changes = []
+        for source, ids in by_source.items():
+            targets = {self.routes[route_id]["target"] for route_id in ids}
+            dist, pred = self.core.dijkstra(source, weights=self.weights, targets=targets)
+            for route_id in ids:
+                before = self.routes[route_id]
+                self._unindex(route_id, before)
+                after = self._track(route_id, source, before["target"],
+                                    self._path(dist, pred, before["target"]))
+                if after["nodes"] != before["nodes"] or after["cost"] != before["cost"]:
+                    changes.append({"id": route_id, "before": before, "after": after})
+        return changes
+
+    def _path(self, dist, pred, target):
+        if target not in dist or dist[target] == float("inf"):
+            return None
+        return unwind_path(pred, target)
+
+    def _track(self, route_id, source, target, path):
+        nodes, edges = path if path is not None else (None, [])
+        route = {
+            "source": source,
+            "target": target,
+            "nodes": nodes,
+            "edges": edges,
+            "cost": sum(self.weights[e] for e in edges) if path is not None else float("inf"),
+        }
+        self.routes[route_id] = route
+        for e in edges:
+            self.edge_routes.setdefault(e, set()).add(route_id)
+        self.source_routes.setdefault(source, set()).add(route_id)
+        return route
+
+    def _unindex(self, route_id, route):
+        for e in route["edges"]:
+            routes = self.edge_routes.get(e)
+            if routes is not None:
+                routes.discard(route_id)
+                if not routes:
+                    del self.edge_routes[e]
+
+    def _bounded(self, start, limit, reverse):
+        """
+        Costs from `start` (or towards it when reverse) to every node within `limit`
+        """
+        if reverse and self.core.directed:
+            if self._reverse is None:
+                order = np.argsort(self.core.edge_v, kind="stable")
+                indptr = np.zeros(self.core.num_nodes + 1, dtype=np.int64)
+                np.cumsum(np.bincount(self.core.edge_v, minlength=self.core.num_nodes), out=indptr[1:])
+                self._reverse = (indptr.tolist(), self.core.edge_u[order].tolist(), order.tolist())
+            indptr, indices, adj_edges = self._reverse
+        else:
+            indptr, indices, adj_edges = self.core.adjacency_lists()
+
+        w = self.weights
+        inf = float("inf")
+        dist = {start: 0.0}
+        done = {}
+        heap = [(0.0, start)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            if d > limit:
+                break
+            done[u] = d
+            for slot in range(indptr[u], indptr[u + 1]):
+                nd = d + w[adj_edges[slot]]
+                v = indices[slot]
+                if nd < dist.get(v, inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return done
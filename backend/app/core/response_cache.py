@@ -0,0 +1,146 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+
+class CachedResponse:
+    """
+    Encoded response body plus its gzip variant and strong ETags
+    """
+
+    def __init__(self, version, fmt, body):
+        self.version = version
+        self.format = fmt
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6)
+        self.etag = make_etag(version, fmt)
+        self.gzip_etag = make_etag(version, fmt, "gzip")
+
+    @property
+    def size(self):
+        return len(self.body) + len(self.gzip_body)
+
+
+def make_etag(version, fmt, encoding=None):
+    """
+    Strong ETag for one representation (format and content coding) of a graph version
+    """
+    tag = f"{version}-{fmt}"
+    if encoding:
+        tag = f"{tag}-{encoding}"
+    return f'"{tag}"'
+
+
+def etag_matches(if_none_match, version, fmt):
+    """
+    True when an If-None-Match header names any representation of (version, format)
+    """
+    if not if_none_match:
+        return False
+    candidates = {make_etag(version, fmt), make_etag(version, fmt, "gzip")}
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag in candidates:
+            return True
+    return False
+
+
+def accepts_gzip(accept_encoding):
+    """
+    True when an Accept-Encoding header allows gzip
+    """
+    if not accept_encoding:
+        return False
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        key, _, value = params.strip().partition("=")
+        if key.strip() != "q":
+            return True
+        try:
+            return float(value) > 0
+        except ValueError:
+            return False
+    return False
+
+
+class ResponseCache:
+    """
+    LRU cache of encoded network responses keyed by (graph version, format).
+
+    Entries larger than max_entry_bytes are never stored so one huge network
+    cannot flush everything else.
+    """
+
+    def __init__(self, max_bytes, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, version, fmt):
+        with self._lock:
+            entry = self._entries.get((version, fmt))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((version, fmt))
+            self.hits += 1
+            return entry
+
+    def put(self, version, fmt, body):
+        """
+        Store an encoded body; returns the entry, or None if it is too large to keep
+        """
+        if len(body) > self.max_entry_bytes:
+            return None
+        entry = CachedResponse(version, fmt, body)
+        with self._lock:
+            old = self._entries.pop((version, fmt), None)
+            if old is not None:
+                self._size -= old.size
+            self._entries[(version, fmt)] = entry
+            self._size += entry.size
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+        return entry
+
+    def stream_and_store(self, version, fmt, chunks):
+        """
+        Pass chunks through to the client while collecting them for the cache
+        """
+        collected = []
+        size = 0
+        for chunk in chunks:
+            if collected is not None:
+                size += len(chunk)
+                if size > self.max_entry_bytes:
+                    collected = None
+                else:
+                    collected.append(chunk)
+            yield chunk
+        if collected is not None:
+            self.put(version, fmt, b"".join(collected))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,92 @@
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+
+# Rough per-entry bookkeeping cost (key tuple, arrays, OrderedDict slot) in bytes
+_ENTRY_OVERHEAD = 240
+
+
+def incident_key(closed):
+    """
+    Fingerprint of a set of closed edge indices ("" when nothing is closed)
+    """
+    if not closed:
+        return ""
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(array("i", sorted(closed)).tobytes())
+    return digest.hexdigest()
+
+
+class RouteCache:
+    """
+    Bounded LRU cache of shortest paths.
+
+    Keys are (graph version, incident key, source, target, weight); values are
+    the (nodes, edges) index lists of the path, held as int32 arrays. Entries
+    are evicted oldest first once either the entry count or the byte budget
+    is exceeded.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Cached (nodes, edges) for a key, or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry[0].tolist(), entry[1].tolist()
+
+    def put(self, key, path):
+        nodes, edges = array("i", path[0]), array("i", path[1])
+        size = _ENTRY_OVERHEAD + (len(nodes) + len(edges)) * nodes.itemsize
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[2]
+            self._entries[key] = (nodes, edges, size)
+            self._size += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._size > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted[2]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,370 @@
+import heapq
+import math
+import numpy as np
+import networkx as nx
+
+from app.core import config
+from app.core.graph import CompactGraph, unwind_path
+from app.core.overlay import WeightOverlay
+from app.core.snapshot import read_array_dir, write_array_dir
+
+# Search strategies selectable per simulation request
+ALGORITHMS = ("auto", "dijkstra", "astar", "alt")
+
+# Bump whenever the on-disk landmark layout or selection changes
+LANDMARKS_VERSION = 1
+
+EARTH_RADIUS_M = 6_371_008.8
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in metres between points given in radians (NumPy aware)
+    """
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def max_edge_speed(core, weights="travel_time"):
+    """
+    Largest straight-line speed (metres per weight unit) over any edge.
+
+    Dividing straight-line distance by this speed never overestimates the cost
+    of a path, and because it holds edge by edge the heuristic stays consistent
+    even where lengths or speed tags disagree with the coordinates.
+    Returns inf when there is no useful bound: a node lacks coordinates or a
+    zero-cost edge spans a distance.
+    """
+    if core.num_edges == 0 or np.isnan(core.x).any() or np.isnan(core.y).any():
+        return float("inf")
+    lat, lon = np.radians(core.y), np.radians(core.x)
+    span = haversine_m(lat[core.edge_u], lon[core.edge_u], lat[core.edge_v], lon[core.edge_v])
+    cost = core.edge_weights(weights).astype(np.float64)
+    usable = (span > 0) & np.isfinite(cost)
+    if not np.any(usable) or np.any(usable & (cost <= 0)):
+        return float("inf")
+    return float(np.max(span[usable] / cost[usable]))
+
+
+def astar(core, source, target, heuristic, weights="travel_time"):
+    """
+    A* over the CSR arrays with a consistent heuristic callable h(node index).
+    Returns (dist, pred, expanded) where dist/pred are as in CompactGraph.dijkstra
+    and expanded counts settled nodes; infinite weights are closed.
+    """
+    w = core.weight_list(weights) if isinstance(weights, str) else weights
+    indptr, indices, adj_edges = core.adjacency_lists()
+    inf = float("inf")
+    dist = {source: 0.0}
+    pred = {source: (-1, -1)}
+    estimate = {source: heuristic(source)}
+    done = set()
+    heap = [(estimate[source], source)]
+    while heap:
+        _, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        done.add(u)
+        if u == target:
+            break
+        d = dist[u]
+        for slot in range(indptr[u], indptr[u + 1]):
+            e = adj_edges[slot]
+            cost = w[e]
+            if cost == inf:
+                continue
+            v = indices[slot]
+            if v in done:
+                continue
+            nd = d + cost
+            if nd < dist.get(v, inf):
+                dist[v] = nd
+                pred[v] = (u, e)
+                h = estimate.get(v)
+                if h is None:
+                    h = estimate[v] = heuristic(v)
+                heapq.heappush(heap, (nd + h, v))
+    return dist, pred, len(done)
+
+
+class Landmarks:
+    """
+    ALT landmarks: exact travel times from (and, on directed graphs, to) a few
+    well-spread nodes. By the triangle inequality |d(L, t) - d(L, v)| never
+    exceeds d(v, t), which gives A* a much tighter bound than geometry alone.
+    """
+
+    def __init__(self, nodes, from_dist, to_dist=None, weight="travel_time", fingerprint=None):
+        self.nodes = np.asarray(nodes, dtype=np.int32)
+        self.from_dist = np.asarray(from_dist, dtype=np.float64)
+        self.to_dist = self.from_dist if to_dist is None else np.asarray(to_dist, dtype=np.float64)
+        self.weight = weight
+        self.fingerprint = fingerprint
+
+    @property
+    def count(self):
+        return len(self.nodes)
+
+    @classmethod
+    def select(cls, core, count, weights="travel_time"):
+        """
+        Pick landmarks by farthest-point selection: each new landmark is the node
+        whose travel time to the closest landmark so far is largest
+        """
+        n = core.num_nodes
+        count = min(count, n)
+        reverse = _reversed(core) if core.directed else None
+        nodes, rows_from, rows_to = [], [], []
+        if count == 0:
+            empty = np.zeros((0, n))
+            return cls([], empty, empty if core.directed else None, weights, core.fingerprint())
+
+        # Start from the node farthest from an arbitrary one (the westernmost)
+        seed = int(np.argmin(np.nan_to_num(core.x, nan=np.inf)))
+        nearest = _distances(core, seed, weights)
+        while len(nodes) < count:
+            candidates = np.where(np.isfinite(nearest), nearest, -1.0)
+            candidates[nodes] = -1.0
+            if candidates.max() < 0:
+                # Everything reachable is covered; seed the next component
+                remaining = np.setdiff1d(np.arange(n), nodes)
+                if not len(remaining):
+                    break
+                landmark = int(remaining[0])
+            else:
+                landmark = int(np.argmax(candidates))
+            nodes.append(landmark)
+            row = _distances(core, landmark, weights)
+            rows_from.append(row)
+            if reverse is not None:
+                rows_to.append(_distances(reverse, landmark, weights))
+            nearest = row if len(nodes) == 1 else np.minimum(nearest, row)
+
+        return cls(
+            nodes, np.vstack(rows_from), np.vstack(rows_to) if reverse is not None else None,
+            weights, core.fingerprint(),
+        )
+
+    def heuristic(self, target):
+        """
+        Lower-bound callable h(v) on the cost from v to target
+        """
+        rows_from = [memoryview(row) for row in self.from_dist]
+        rows_to = [memoryview(row) for row in self.to_dist]
+        pairs = [
+            (f, t, f[target], t[target]) for f, t in zip(rows_from, rows_to)
+        ]
+
+        def h(v):
+            best = 0.0
+            for f, t, f_target, t_target in pairs:
+                # inf - inf is nan and never wins the comparison
+                bound = f_target - f[v]
+                if bound > best:
+                    best = bound
+                bound = t[v] - t_target
+                if bound > best:
+                    best = bound
+            return best
+        return h
+
+    def save(self, path):
+        """
+        Persist the landmark tables next to the graph's other routing indexes
+        """
+        arrays = {"nodes": self.nodes, "from_dist": self.from_dist}
+        if self.to_dist is not self.from_dist:
+            arrays["to_dist"] = self.to_dist
+        return write_array_dir(path, arrays, {
+            "version": LANDMARKS_VERSION,
+            "weight": self.weight,
+            "fingerprint": self.fingerprint,
+            "directed": "to_dist" in arrays,
+        })
+
+    @classmethod
+    def load(cls, path, fingerprint=None):
+        """
+        Memory-map saved landmarks; returns None when missing, stale or for another graph
+        """
+        try:
+            meta, arrays = read_array_dir(path, ("nodes", "from_dist"), LANDMARKS_VERSION)
+            if meta.get("directed"):
+                arrays.update(read_array_dir(path, ("to_dist",), LANDMARKS_VERSION)[1])
+        except (OSError, ValueError):
+            return None
+        if fingerprint is not None and meta.get("fingerprint") != fingerprint:
+            return None
+        return cls(weight=meta["weight"], fingerprint=meta["fingerprint"], **arrays)
+
+
+class Router:
+    """
+    Point-to-point shortest paths over a compact graph with a chosen strategy.
+
+    "auto" keeps CompactGraph.shortest_path (contraction hierarchy when one is
+    attached, Dijkstra otherwise); "dijkstra" forces plain Dijkstra; "astar"
+    adds the straight-line bound and "alt" the landmark bound on top of it.
+    All strategies return paths of the same travel time.
+
+    With a RouteCache, paths are reused across requests for the same graph
+    version and set of closed edges.
+    """
+
+    def __init__(self, core, algorithm="auto", landmarks=None, weights="travel_time",
+                 tree_min_targets=None, cache=None):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown routing algorithm: {algorithm}")
+        if algorithm == "alt" and landmarks is None:
+            raise ValueError("ALT routing needs landmarks")
+        self.core = core
+        self.algorithm = algorithm
+        self.landmarks = landmarks
+        self.weights = weights
+        self.tree_min_targets = (
+            config.ROUTE_TREE_MIN_TARGETS if tree_min_targets is None else tree_min_targets
+        )
+        self.cache = cache
+        self.expanded = 0
+        self._version = None
+        self._speed = None
+        self._coords = None
+
+    def _haversine_heuristic(self, target):
+        if self._speed is None:
+            # Shave a hair off so float32 weights can never make the bound exceed a true cost
+            self._speed = max_edge_speed(self.core, self.weights) * (1 + 1e-9)
+            lat, lon = np.radians(self.core.y), np.radians(self.core.x)
+            self._coords = (memoryview(lat), memoryview(lon), memoryview(np.cos(lat)))
+        if not math.isfinite(self._speed):
+            return lambda v: 0.0
+        lat, lon, cos_lat = self._coords
+        lat_t, lon_t, cos_t = lat[target], lon[target], cos_lat[target]
+        scale = 2 * EARTH_RADIUS_M / self._speed
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+
+        def h(v):
+            a = sin((lat[v] - lat_t) / 2) ** 2 + cos_lat[v] * cos_t * sin((lon[v] - lon_t) / 2) ** 2
+            if a <= 0:
+                return 0.0
+            return scale * asin(sqrt(min(a, 1.0)))
+        return h
+
+    def heuristic(self, target):
+        """
+        Heuristic callable for the configured strategy (zero for Dijkstra)
+        """
+        if self.algorithm == "astar":
+            return self._haversine_heuristic(target)
+        if self.algorithm == "alt":
+            geometric = self._haversine_heuristic(target)
+            landmark = self.landmarks.heuristic(target)
+            return lambda v: max(geometric(v), landmark(v))
+        return lambda v: 0.0
+
+    def _cache_key(self, source, target, closures):
+        if self._version is None:
+            self._version = self.core.fingerprint()
+        return (self._version, closures, source, target, self.weights)
+
+    def _overlay(self, closed, overlay):
+        """
+        Single overlay combining explicit closures with an optional WeightOverlay
+        """
+        if not closed:
+            return overlay
+        combined = WeightOverlay(self.core, overlay.factors if overlay else None)
+        for e in closed:
+            combined.close(e)
+        return combined
+
+    def _weights(self, overlay):
+        return overlay.weights(self.weights) if overlay else self.core.weight_list(self.weights)
+
+    def shortest_path(self, source, target, closed=None, overlay=None):
+        """
+        (nodes, edges) of a shortest path between node indices, avoiding closed edges
+        and reading weights through an optional WeightOverlay;
+        raises nx.NetworkXNoPath when unreachable
+        """
+        overlay = self._overlay(closed, overlay)
+        if self.cache is None:
+            return self._shortest_path(source, target, overlay)
+        key = self._cache_key(source, target, overlay.key() if overlay else "")
+        path = self.cache.get(key)
+        if path is None:
+            path = self._shortest_path(source, target, overlay)
+            self.cache.put(key, path)
+        return path
+
+    def _shortest_path(self, source, target, overlay):
+        if self.algorithm == "auto":
+            return self.core.shortest_path(source, target, self.weights, overlay=overlay)
+        # Bounds come from base weights, which incident slowdowns only ever raise
+        dist, pred, expanded = astar(self.core, source, target, self.heuristic(target),
+                                     self._weights(overlay))
+        self.expanded += expanded
+        if target not in dist:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        return unwind_path(pred, target)
+
+    def paths_from(self, source, targets, closed=None, overlay=None):
+        """
+        Shortest paths from one source to many targets as {target: (nodes, edges)};
+        unreachable targets are left out.
+
+        Cached paths are served first. Of the rest, a handful of targets are
+        answered with point-to-point queries; beyond tree_min_targets one
+        shortest-path tree is grown until every target is settled and all
+        paths are read off its predecessors.
+        """
+        overlay = self._overlay(closed, overlay)
+        paths = {}
+        missing = set(targets)
+        if self.cache is not None:
+            closures = overlay.key() if overlay else ""
+            for target in list(missing):
+                path = self.cache.get(self._cache_key(source, target, closures))
+                if path is not None:
+                    paths[target] = path
+                    missing.discard(target)
+
+        found = {}
+        if len(missing) < self.tree_min_targets:
+            for target in missing:
+                try:
+                    found[target] = self._shortest_path(source, target, overlay)
+                except nx.NetworkXNoPath:
+                    continue
+        elif missing:
+            dist, pred = self.core.dijkstra(source, weights=self._weights(overlay), targets=missing)
+            for target in missing:
+                if target in dist:
+                    found[target] = unwind_path(pred, target)
+
+        if self.cache is not None:
+            for target, path in found.items():
+                self.cache.put(self._cache_key(source, target, closures), path)
+        paths.update(found)
+        return paths
+
+
+def _distances(core, source, weights):
+    """
+    Travel times from one node to every node as a float64 array (inf when unreachable)
+    """
+    dist, _ = core.dijkstra(source, weights=weights)
+    out = np.full(core.num_nodes, np.inf)
+    out[list(dist.keys())] = list(dist.values())
+    return out
+
+
+def _reversed(core):
+    """
+    Directed compact graph with every edge flipped, for distances towards a node
+    """
+    return CompactGraph(
+        node_ids=core.node_ids, x=core.x, y=core.y, edge_u=core.edge_v, edge_v=core.edge_u,
+        length=core.length, travel_time=core.travel_time, name_ids=core.name_ids,
+        names=core.names, directed=True, osm_ids=core.osm_ids, edge_keys=core.edge_keys,
+    )
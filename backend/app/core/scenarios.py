@@ -0,0 +1,94 @@
+"""
+Incident scenario sweeps over a process pool.
+
+A scenario is a set of incident factors (edge index -> travel-time
+multiplier, inf closes the road). Every scenario is evaluated against the
+same fleet of (source, target) pairs: each pair is re-routed under the
+scenario's WeightOverlay, with one Dijkstra search per distinct origin.
+Scenarios are independent, so they fan out to a process pool whose workers
+attach to the base graph through a SharedGraph; a task carries only its
+factors. Searches read the graph's arrays in place, so workers never copy
+the shared CSR into private lists.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.core import config
+from app.core.overlay import WeightOverlay
+from app.core.shared_graph import SharedGraph
+
+# Graph, its shared memory mapping and the fleet inside a pool worker
+_worker_core = None
+_worker_memory = None
+_worker_pairs = None
+
+
+def route_times(core, pairs, factors=None, weights="travel_time"):
+    """
+    Shortest travel time of each (source, target) pair under incident factors; inf when unreachable
+    """
+    w = WeightOverlay(core, factors).weights(core.weight_view(weights))
+    by_source = {}
+    for row, (source, target) in enumerate(pairs):
+        by_source.setdefault(source, []).append(row)
+    inf = float("inf")
+    times = [inf] * len(pairs)
+    for source, rows in by_source.items():
+        dist, _ = core.dijkstra(source, weights=w, targets={pairs[row][1] for row in rows}, views=True)
+        for row in rows:
+            times[row] = dist.get(pairs[row][1], inf)
+    return times
+
+
+def _init_worker(handle, pairs):
+    global _worker_core, _worker_memory, _worker_pairs
+    _worker_core, _worker_memory = SharedGraph.attach(handle)
+    _worker_pairs = pairs
+
+
+def _evaluate(factors):
+    return route_times(_worker_core, _worker_pairs, factors)
+
+
+class ScenarioRunner:
+    """
+    Travel times of one fleet under many incident scenarios
+    """
+
+    def __init__(self, core, workers=1, parallel_min=4):
+        self.core = core
+        self.workers = workers
+        self.parallel_min = parallel_min
+
+    def run(self, pairs, scenarios, progress=None):
+        """
+        (1 + len(scenarios), len(pairs)) array of travel times: the baseline
+        without incidents first, then one row per scenario's factors.
+        `progress(done, total)` is called as the scenarios finish.
+        """
+        pairs = [(int(source), int(target)) for source, target in pairs]
+        tasks = [{}] + [dict(factors) for factors in scenarios]
+        if self.workers > 1 and len(scenarios) >= self.parallel_min:
+            with SharedGraph(self.core) as shared, ProcessPoolExecutor(
+                max_workers=min(self.workers, len(tasks)), initializer=_init_worker,
+                initargs=(shared.handle, pairs),
+                mp_context=multiprocessing.get_context(config.PROCESS_START_METHOD),
+            ) as pool:
+                rows = self._collect(pool.map(_evaluate, tasks), len(scenarios), progress)
+        else:
+            rows = self._collect(
+                (route_times(self.core, pairs, factors) for factors in tasks), len(scenarios), progress
+            )
+        return np.array(rows, dtype=np.float64).reshape(len(tasks), len(pairs))
+
+    @staticmethod
+    def _collect(rows, total, progress):
+        collected = []
+        for row in rows:
+            collected.append(row)
+            if progress is not None:
+                progress(len(collected) - 1, total)
+        return collected
@@ -0,0 +1,69 @@
+"""
+Compact graphs published in shared memory for process pools.
+
+The publishing process copies a graph's array columns once into a single
+shared memory block. Pool workers receive only a small handle (block name,
+array layout, road names) and map the same memory as a read-only
+CompactGraph, so the graph is neither pickled per task nor duplicated per
+worker.
+"""
+
+from multiprocessing import shared_memory
+import numpy as np
+
+from app.core.graph import CompactGraph
+
+# Array columns of a CompactGraph laid out in the block
+_ARRAYS = (
+    "node_ids", "x", "y",
+    "edge_u", "edge_v", "length", "travel_time", "name_ids", "osm_ids", "edge_keys",
+    "indptr", "indices", "adj_edges",
+)
+
+# Arrays start on cache-line boundaries
+_ALIGN = 64
+
+
+class SharedGraph:
+    """
+    A compact graph's arrays in one shared memory block, owned by the publishing process.
+    Use as a context manager (or call close()) to free the block.
+    """
+
+    def __init__(self, core):
+        layout, size = [], 0
+        for name in _ARRAYS:
+            array = getattr(core, name)
+            layout.append((name, array.dtype.str, array.shape, size))
+            size += -(-array.nbytes // _ALIGN) * _ALIGN
+        self._memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for name, dtype, shape, offset in layout:
+            np.ndarray(shape, dtype, buffer=self._memory.buf, offset=offset)[...] = getattr(core, name)
+        self.handle = (self._memory.name, layout, list(core.names), core.directed)
+
+    @staticmethod
+    def attach(handle):
+        """
+        CompactGraph over a published block, and the SharedMemory mapping that
+        must stay referenced for as long as the graph is used
+        """
+        name, layout, names, directed = handle
+        memory = shared_memory.SharedMemory(name=name)
+        arrays = {}
+        for column, dtype, shape, offset in layout:
+            array = np.ndarray(shape, dtype, buffer=memory.buf, offset=offset)
+            array.flags.writeable = False
+            arrays[column] = array
+        return CompactGraph(names=names, directed=directed, **arrays), memory
+
+    def close(self):
+        if self._memory is not None:
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from app.core.graph import CompactGraph
+
+# Bump whenever the on-disk layout or the processing pipeline changes
+SNAPSHOT_VERSION = 4
+
+_ARRAYS = (
+    "node_ids", "x", "y",
+    "edge_u", "edge_v", "length", "travel_time", "name_ids", "osm_ids", "edge_keys",
+    "indptr", "indices", "adj_edges",
+)
+
+
+def canonical_bbox(north, south, east, west, precision=4):
+    """
+    Snap a bounding box outward onto a fixed decimal grid so that nearly
+    identical requests share one snapshot
+    """
+    scale = 10 ** precision
+    return (
+        math.ceil(north * scale) / scale,
+        math.floor(south * scale) / scale,
+        math.ceil(east * scale) / scale,
+        math.floor(west * scale) / scale,
+    )
+
+
+def snapshot_key(bbox, network_type="drive", precision=4):
+    """
+    Stable key for a canonical (north, south, east, west) bounding box
+    """
+    north, south, east, west = bbox
+    raw = (
+        f"v{SNAPSHOT_VERSION}:{network_type}:"
+        f"{north:.{precision}f},{south:.{precision}f},{east:.{precision}f},{west:.{precision}f}"
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def write_array_dir(path, arrays, meta):
+    """
+    Write named arrays as .npy files plus a meta.json header into a folder that
+    is renamed into place atomically, replacing any previous version
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f".{os.path.basename(path)}-", dir=parent)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return path
+
+
+def read_array_dir(path, names, version):
+    """
+    Read the header and memory-map the named arrays of a folder written by
+    write_array_dir; raises ValueError when it was written with another version
+    """
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != version:
+        raise ValueError(f"Stale array folder: {path}")
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in names
+    }
+    return meta, arrays
+
+
+class SnapshotStore:
+    """
+    Directory of versioned binary graph snapshots.
+
+    Each snapshot is a folder of raw .npy columns plus a meta.json header;
+    loading memory-maps the columns so no parsing or copying happens up front.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def exists(self, key):
+        return os.path.isfile(os.path.join(self._path(key), "meta.json"))
+
+    def save(self, key, core, **meta):
+        """
+        Write a compact graph as a snapshot; the folder is renamed into place atomically
+        """
+        header = {
+            "version": SNAPSHOT_VERSION,
+            "created": time.time(),
+            "directed": core.directed,
+            "num_nodes": core.num_nodes,
+            "num_edges": core.num_edges,
+            "fingerprint": core.fingerprint(),
+            "names": core.names,
+            **meta,
+        }
+        return write_array_dir(
+            self._path(key), {name: getattr(core, name) for name in _ARRAYS}, header
+        )
+
+    def load(self, key):
+        """
+        Memory-map a snapshot; returns None when it is missing, stale or unreadable
+        """
+        try:
+            header, arrays = read_array_dir(self._path(key), _ARRAYS, SNAPSHOT_VERSION)
+        except (OSError, ValueError):
+            return None
+        core = CompactGraph(names=header["names"], directed=header["directed"], **arrays)
+        # Saved with the snapshot, so loading never hashes the arrays again
+        core._fingerprint = header.get("fingerprint")
+        return core
+
+    def version(self, key):
+        """
+        Fingerprint of the graph in a snapshot, read from its header alone; None
+        when the snapshot is missing or stale
+        """
+        try:
+            with open(os.path.join(self._path(key), "meta.json"), encoding="utf-8") as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if header.get("version") != SNAPSHOT_VERSION:
+            return None
+        return header.get("fingerprint")
+
+    def delete(self, key):
+        shutil.rmtree(self._path(key), ignore_errors=True)
@@ -0,0 +1,124 @@
+import math
+import numpy as np
+
+from app.core.graph import CompactGraph
+
+
+def tiles_for_bbox(north, south, east, west, size):
+    """
+    (row, col) indices of the fixed grid tiles of `size` degrees covering a bbox
+    """
+    rows = range(math.floor(south / size), math.floor(north / size) + 1)
+    cols = range(math.floor(west / size), math.floor(east / size) + 1)
+    return [(row, col) for row in rows for col in cols]
+
+
+def tile_bbox(tile, size):
+    """
+    (north, south, east, west) bounds of a grid tile
+    """
+    row, col = tile
+    return (
+        round((row + 1) * size, 10),
+        round(row * size, 10),
+        round((col + 1) * size, 10),
+        round(col * size, 10),
+    )
+
+
+def merge_cores(cores):
+    """
+    Stitch tile graphs into one graph.
+
+    Nodes are unified by their original ID. Edges that cross a tile border are
+    present in both neighbouring tiles and are kept once, identified by their
+    endpoints, OSM way ID and MultiGraph key; parallel roads between the same
+    nodes stay distinct.
+    """
+    cores = [core for core in cores if core.num_nodes > 0]
+    if not cores:
+        return CompactGraph.empty()
+    if len(cores) == 1:
+        return cores[0]
+
+    all_ids = np.concatenate([core.node_ids for core in cores])
+    node_ids, first, inverse = np.unique(all_ids, return_index=True, return_inverse=True)
+    x = np.concatenate([core.x for core in cores])[first]
+    y = np.concatenate([core.y for core in cores])[first]
+
+    # Re-map per-tile node indices and name IDs into the merged numbering
+    names, name_index = [], {}
+    edge_u, edge_v, name_ids = [], [], []
+    offset = 0
+    for core in cores:
+        local = inverse[offset:offset + core.num_nodes]
+        offset += core.num_nodes
+        edge_u.append(local[core.edge_u])
+        edge_v.append(local[core.edge_v])
+        remap = np.empty(len(core.names) + 1, dtype=np.int32)
+        remap[-1] = -1
+        for i, name in enumerate(core.names):
+            if name not in name_index:
+                name_index[name] = len(names)
+                names.append(name)
+            remap[i] = name_index[name]
+        name_ids.append(remap[core.name_ids])
+    edge_u = np.concatenate(edge_u)
+    edge_v = np.concatenate(edge_v)
+    name_ids = np.concatenate(name_ids)
+    length = np.concatenate([core.length for core in cores])
+    travel_time = np.concatenate([core.travel_time for core in cores])
+    osm_ids = np.concatenate([core.osm_ids for core in cores])
+    edge_keys = np.concatenate([core.edge_keys for core in cores])
+
+    directed = cores[0].directed
+    if directed:
+        lo, hi = edge_u, edge_v
+    else:
+        lo, hi = np.minimum(edge_u, edge_v), np.maximum(edge_u, edge_v)
+    keys = np.rec.fromarrays([lo, hi, osm_ids, edge_keys])
+    _, keep = np.unique(keys, return_index=True)
+    keep.sort()
+
+    return CompactGraph(
+        node_ids=node_ids,
+        x=x,
+        y=y,
+        edge_u=edge_u[keep],
+        edge_v=edge_v[keep],
+        length=length[keep],
+        travel_time=travel_time[keep],
+        name_ids=name_ids[keep],
+        names=names,
+        directed=directed,
+        osm_ids=osm_ids[keep],
+        edge_keys=edge_keys[keep],
+    )
+
+
+def clip_core(core, north, south, east, west):
+    """
+    Subgraph of the nodes inside a bbox and the edges between them
+    """
+    inside = (core.y >= south) & (core.y <= north) & (core.x >= west) & (core.x <= east)
+    if inside.all():
+        return core
+    keep_nodes = np.flatnonzero(inside)
+    remap = np.full(core.num_nodes, -1, dtype=np.int32)
+    remap[keep_nodes] = np.arange(len(keep_nodes), dtype=np.int32)
+    keep_edges = np.flatnonzero(inside[core.edge_u] & inside[core.edge_v])
+
+    return CompactGraph(
+        node_ids=core.node_ids[keep_nodes],
+        x=core.x[keep_nodes],
+        y=core.y[keep_nodes],
+        edge_u=remap[core.edge_u[keep_edges]],
+        edge_v=remap[core.edge_v[keep_edges]],
+        length=core.length[keep_edges],
+        travel_time=core.travel_time[keep_edges],
+        name_ids=core.name_ids[keep_edges],
+        names=core.names,
+        directed=core.directed,
+        osm_ids=core.osm_ids[keep_edges],
+        edge_keys=core.edge_keys[keep_edges],
+    )
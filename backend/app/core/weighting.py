@@ -0,0 +1,132 @@
+import re
+import numpy as np
+
+from app.core import config
+
+# Typical free-flow speeds (km/h) per OSM highway class, used when an edge has no
+# usable maxspeed tag. Overridable per class through config.HIGHWAY_SPEEDS.
+DEFAULT_HIGHWAY_SPEEDS = {
+    "motorway": 100,
+    "trunk": 80,
+    "primary": 60,
+    "secondary": 50,
+    "tertiary": 40,
+    "unclassified": 30,
+    "residential": 30,
+    "living_street": 10,
+    "service": 20,
+    "road": 40,
+    "busway": 40,
+}
+
+_MPH = 1.609344
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def speed_table(overrides=None):
+    """
+    Per-class speed table: the defaults merged with configured overrides
+    """
+    table = dict(DEFAULT_HIGHWAY_SPEEDS)
+    table.update(config.HIGHWAY_SPEEDS if overrides is None else overrides)
+    return table
+
+
+def _first(value):
+    """
+    OSMnx stores merged tags as lists; the first entry stands for the edge
+    """
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value
+
+
+def parse_maxspeed(value):
+    """
+    Speed in km/h from one maxspeed tag, or NaN when it carries no number.
+
+    Handles "50", "30 mph", "40;60" and lists (averaged), and treats symbolic
+    values such as "none", "signals" or "PK:urban" as unknown.
+    """
+    if isinstance(value, (list, tuple)):
+        speeds = [parse_maxspeed(v) for v in value]
+        speeds = [s for s in speeds if not np.isnan(s)]
+        return float(np.mean(speeds)) if speeds else float("nan")
+    if value is None:
+        return float("nan")
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else float("nan")
+    text = str(value).lower()
+    numbers = [float(n) for n in _NUMBER.findall(text)]
+    numbers = [n for n in numbers if n > 0]
+    if not numbers:
+        return float("nan")
+    speed = sum(numbers) / len(numbers)
+    return speed * _MPH if "mph" in text else speed
+
+
+def _class_speed(highway, table, default):
+    if highway is None:
+        return default
+    highway = str(highway)
+    if highway in table:
+        return float(table[highway])
+    # motorway_link, primary_link, ... fall back to their parent class
+    base = highway[:-5] if highway.endswith("_link") else highway
+    return float(table.get(base, default))
+
+
+def _map_unique(values, fn):
+    """
+    Apply fn once per distinct value and broadcast the results back to every edge
+    """
+    keys = np.array([repr(v) for v in values], dtype=object)
+    if not len(keys):
+        return np.empty(0, dtype=np.float64)
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    mapped = np.array([fn(values[i]) for i in first], dtype=np.float64)
+    return mapped[inverse.ravel()]
+
+
+def edge_speeds(highway, maxspeed, table=None, default=None):
+    """
+    Speeds (km/h) for edges given their highway classes and maxspeed tags.
+
+    Tagged maxspeeds win; untagged edges are imputed from the class table.
+    Tags repeat heavily across a region, so each distinct tag is parsed once.
+    """
+    table = speed_table() if table is None else table
+    default = config.DEFAULT_SPEED_KPH if default is None else default
+    classes = [_first(h) for h in highway]
+    imputed = _map_unique(classes, lambda h: _class_speed(h, table, default))
+    tagged = _map_unique(list(maxspeed), parse_maxspeed)
+    return np.where(np.isnan(tagged), imputed, tagged)
+
+
+def travel_times(length, speed_kph):
+    """
+    Travel time in seconds for edges of the given length (m) and speed (km/h),
+    the unit the simulation engines, signal cycles and headways share
+    """
+    return np.asarray(length, dtype=np.float64) / (np.asarray(speed_kph, dtype=np.float64) / 3.6)
+
+
+def add_travel_times(G, table=None, default=None):
+    """
+    Set speed_kph and travel_time (seconds) on every edge of G in one pass.
+
+    Attributes are gathered into arrays, weighted together and written back to
+    the same edge dicts, so the cost is dominated by a single walk of G.edges.
+    Returns G for chaining.
+    """
+    edges = [data for *_, data in G.edges(data=True)]
+    length = np.array([data.get("length", 100) for data in edges], dtype=np.float64)
+    highway = [data.get("highway") for data in edges]
+    maxspeed = [data.get("maxspeed") for data in edges]
+
+    speeds = edge_speeds(highway, maxspeed, table, default)
+    times = travel_times(length, speeds)
+    for data, speed, time in zip(edges, speeds.tolist(), times.tolist()):
+        data["speed_kph"] = speed
+        data["travel_time"] = time
+    return G
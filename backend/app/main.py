@@ -3,6 +3,9 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.network import router as network_router
 from app.api.simulation import router as simulation_router  # Optional if you don't use it
+from app.api.routes import router as routes_router
+from app.api.signals import router as signals_router
+from app.api.jobs import router as jobs_router
 
 app = FastAPI(
     title="Smart Traffic Management System",
@@ -23,6 +26,9 @@ app.add_middleware(
 # Routes
 app.include_router(network_router, prefix="/network", tags=["Network"])
 app.include_router(simulation_router, prefix="/simulate", tags=["Simulation"])
+app.include_router(routes_router, prefix="/routes", tags=["Routes"])
+app.include_router(signals_router, prefix="/signals", tags=["Signals"])
+app.include_router(jobs_router, prefix="/jobs", tags=["Jobs"])
 
 @app.get("/")
 async def root():
@@ -48,9 +54,9 @@ def import_time():
 
 # Optional CLI test
 if __name__ == "__main__":
+    import sys
     from app.services.network_service import NetworkService
-    import geojson
 
     service = NetworkService()
-    geojson_data = service.get_faisalabad_satyana_road_map()
-    print(geojson.dumps(geojson_data, indent=2))
\ No newline at end of file
+    for chunk in service.get_faisalabad_satyana_road_map():
+        sys.stdout.buffer.write(chunk)
\ No newline at end of file
@@ -1,31 +1,408 @@
 import osmnx as ox
 import networkx as nx
-import geojson
+import atexit
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from types import SimpleNamespace
+from app.core import config
+from app.core.contraction import ContractionHierarchy
+from app.core.geojson_stream import iter_geojson
+from app.core.graph import CompactGraph
+from app.core.overpass_cache import OverpassCache
+from app.core.route_cache import RouteCache
+from app.core.routing import Landmarks, Router
+from app.core.snapshot import SnapshotStore, canonical_bbox, snapshot_key
+from app.core.tiles import clip_core, merge_cores, tile_bbox, tiles_for_bbox
+from app.core.weighting import add_travel_times
+
+# Array columns a worker process needs to rebuild a CompactGraph
+_CORE_ARRAYS = (
+    "node_ids", "x", "y", "edge_u", "edge_v", "length", "travel_time", "name_ids",
+    "osm_ids", "edge_keys", "indptr", "indices", "adj_edges",
+)
+
+# One manifest per cache directory, shared by every NetworkService
+overpass_cache = OverpassCache(
+    config.OVERPASS_CACHE_DIR,
+    max_bytes=config.OVERPASS_CACHE_MAX_BYTES,
+    max_age=config.OVERPASS_CACHE_MAX_AGE,
+    remove_raw=config.OVERPASS_CACHE_REMOVE_RAW,
+)
+atexit.register(overpass_cache.flush)
+
+# Tile loads are shared by every NetworkService so overlapping requests fetch a tile once
+_tile_executor = ThreadPoolExecutor(max_workers=config.NETWORK_TILE_WORKERS)
+_inflight = {}
+_inflight_lock = threading.RLock()
+
+# Contraction hierarchies are built in a background process, one graph at a
+# time and once per fingerprint; requests route with Dijkstra until one is ready
+_contraction_lock = threading.Lock()
+_contraction_builds = {}
+_contraction_executor = None
+
+
+def _contraction_pool():
+    global _contraction_executor
+    if _contraction_executor is None:
+        _contraction_executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context(config.PROCESS_START_METHOD)
+        )
+    return _contraction_executor
+
+
+def _build_contraction(arrays, names, directed, path):
+    """
+    Worker task: contract a graph given by its array columns and persist the hierarchy
+    """
+    core = CompactGraph(names=names, directed=directed, **arrays)
+    ContractionHierarchy.build(core).save(path)
+    return path
+
+
+def _forget_inflight(tile):
+    with _inflight_lock:
+        _inflight.pop(tile, None)
+
+
+def _is_empty_area_error(error):
+    """
+    True for the errors OSMnx (1.x or 2.x) raises when an area has no drivable roads
+    """
+    if type(error).__name__ in ("InsufficientResponseError", "EmptyOverpassResponse"):
+        return True
+    return isinstance(error, ValueError) and "no graph nodes" in str(error)
 
 class NetworkService:
     def __init__(self):
-        self.current_graph = None
-        self.current_geojson = None
+        self._graph = None
+        self._core = None
+        # Guards the loaded network: requests and background jobs load, swap and
+        # lazily materialize it concurrently. Hold it to load and read a network as one step.
+        self.lock = threading.RLock()
+        # Compact core of each graph handed out, so a job keeps routing on its
+        # own network after another one is loaded
+        self._cores = weakref.WeakKeyDictionary()
+        self.snapshots = SnapshotStore(config.SNAPSHOT_DIR)
+        self.overpass_cache = overpass_cache
+        self.route_cache = RouteCache(config.ROUTE_CACHE_MAX_ENTRIES, config.ROUTE_CACHE_MAX_BYTES)
+        self._routes_version = None
+        # Graph version last loaded for each request key (bbox snapshot key, "sample", ...)
+        self._versions = {}
+
+    @property
+    def current_graph(self):
+        """
+        NetworkX view of the loaded network, materialized on demand from the compact core
+        """
+        with self.lock:
+            if self._graph is None and self._core is not None:
+                self._graph = self._core.to_networkx()
+                self._cores[self._graph] = self._core
+            return self._graph
+
+    @current_graph.setter
+    def current_graph(self, G):
+        with self.lock:
+            self._graph = G
+            self._core = None
+            if G is not None:
+                self._cores.pop(G, None)
+
+    @property
+    def current_core(self):
+        """
+        Array-backed (CSR) representation of the loaded network
+        """
+        with self.lock:
+            if self._core is None and self._graph is not None:
+                self._core = CompactGraph.from_networkx(self._graph)
+                self._cores[self._graph] = self._core
+            return self._core
+
+    def snapshot(self):
+        """
+        The loaded network as one consistent (graph, core) pair, loading the
+        sample network when nothing is loaded. A job works on its pair
+        throughout, whatever network is loaded after it starts.
+        """
+        with self.lock:
+            if self.current_core is None:
+                self.load_sample_network()
+            return self.current_graph, self.current_core
+
+    def load_core(self, core):
+        """
+        Make a prebuilt compact graph (memory-mapped from a snapshot, or attached
+        from shared memory) the loaded network; the NetworkX view stays lazy
+        """
+        with self.lock:
+            self._graph = None
+            self._core = core
+            self._invalidate_routes()
+
+    def core_for(self, G):
+        """
+        Compact core for G, reusing the one built for it when G is (or was) the loaded network
+        """
+        with self.lock:
+            if G is self._graph:
+                return self.current_core
+            core = self._cores.get(G)
+        return core if core is not None else CompactGraph.from_networkx(G)
+
+    def prepare_routing(self, core, wait=False):
+        """
+        Attach a contraction hierarchy to a large enough core for fast travel_time routing.
+
+        Hierarchies are keyed by the graph fingerprint and persisted. One built
+        before is memory-mapped from disk; otherwise a build is started in a
+        background process and None is returned, so the caller routes with plain
+        Dijkstra until a later call finds the hierarchy ready. `wait` blocks
+        until the build has finished (for offline preparation).
+        Returns the hierarchy, or None when the graph is routed with Dijkstra.
+        """
+        if core.contraction is not None:
+            return core.contraction
+        if not config.CONTRACTION_HIERARCHIES or core.num_edges < config.CONTRACTION_MIN_EDGES:
+            return None
+        fingerprint = core.fingerprint()
+        path = os.path.join(self.snapshots.root, "contraction", fingerprint)
+        with _contraction_lock:
+            if core.contraction is not None:
+                return core.contraction
+            future = _contraction_builds.get(fingerprint)
+            if future is None or future.done():
+                ch = ContractionHierarchy.load(path, fingerprint)
+                if ch is not None:
+                    _contraction_builds.pop(fingerprint, None)
+                    core.contraction = ch
+                    return ch
+            if future is None:
+                # A failed build stays recorded so the graph keeps using Dijkstra
+                arrays = {name: getattr(core, name) for name in _CORE_ARRAYS}
+                future = _contraction_pool().submit(
+                    _build_contraction, arrays, core.names, core.directed, path
+                )
+                _contraction_builds[fingerprint] = future
+        if not wait:
+            return None
+        future.result()
+        return self.prepare_routing(core)
+
+    def landmarks_for(self, core, count=None):
+        """
+        ALT landmarks for a core, loaded from disk or selected once and persisted
+        """
+        count = config.ROUTING_LANDMARKS if count is None else count
+        if core.landmarks is not None and core.landmarks.count == min(count, core.num_nodes):
+            return core.landmarks
+        fingerprint = core.fingerprint()
+        path = os.path.join(self.snapshots.root, "landmarks", f"{fingerprint}-{count}")
+        landmarks = Landmarks.load(path, fingerprint)
+        if landmarks is None:
+            landmarks = Landmarks.select(core, count)
+            try:
+                landmarks.save(path)
+            except OSError:
+                pass
+        core.landmarks = landmarks
+        return landmarks
+
+    def router(self, core, algorithm="auto", landmarks=None):
+        """
+        Router for a core using the requested search strategy (see app.core.routing)
+        """
+        if algorithm == "auto":
+            self.prepare_routing(core)
+        table = self.landmarks_for(core, landmarks) if algorithm == "alt" else None
+        return Router(core, algorithm, table, cache=self.route_cache)
+
+    @property
+    def graph_version(self):
+        """
+        Version of the loaded network (a content fingerprint), or None when nothing is loaded
+        """
+        if self.current_core is None:
+            return None
+        return self.current_core.fingerprint()
+
+    def iter_geojson(self):
+        """
+        Stream the loaded network as GeoJSON bytes, feature by feature
+        """
+        return iter_geojson(self.current_core)
+
+    def _load_graph(self, G):
+        """
+        Install G as the current network and build its compact core once
+        """
+        core = CompactGraph.from_networkx(G)
+        with self.lock:
+            self.current_graph = G
+            self._core = self._cores[G] = core
+            self._invalidate_routes()
+
+    def _invalidate_routes(self):
+        """
+        Drop cached routes once a different network is loaded (reloading the same one keeps them)
+        """
+        version = self.graph_version
+        if version != self._routes_version:
+            self.route_cache.clear()
+            self._routes_version = version
 
     def get_network(self, bbox):
-        north = bbox.max_y
-        south = bbox.min_y
-        east = bbox.max_x
-        west = bbox.min_x
-        G = ox.graph_from_bbox(bbox=(north, south, east, west), network_type="drive")
-        G_undirected = ox.utils_graph.get_undirected(G)
-        for u, v, data in G_undirected.edges(data=True):
-            speed_kph = data.get("speed_kph", 50)
-            length_m = data.get("length", 100)
-            travel_time = (length_m / 1000) / (speed_kph / 60)  # in minutes
-            data["travel_time"] = travel_time
-        self.current_graph = G_undirected
-        self.current_geojson = self._graph_to_geojson(G_undirected)
-        return self.current_geojson
+        """
+        Load the network within a bounding box and stream it as GeoJSON bytes
+        """
+        self.load_network(bbox)
+        return self.iter_geojson()
+
+    def bbox_key(self, bbox):
+        """
+        Snapshot key of a bbox request, after snapping it to the canonical grid
+        """
+        precision = config.SNAPSHOT_BBOX_PRECISION
+        canonical = canonical_bbox(bbox.max_y, bbox.min_y, bbox.max_x, bbox.min_x, precision)
+        return snapshot_key(canonical, "drive", precision)
+
+    def request_version(self, key):
+        """
+        Graph version a request key loads, known without loading it: remembered
+        from the last load or read from the bbox snapshot header; None when unknown
+        """
+        version = self._versions.get(key)
+        if version is None:
+            version = self.snapshots.version(key)
+        return version
+
+    def load_network(self, bbox):
+        """
+        Load the road network within a bounding box as the current network
+        """
+        precision = config.SNAPSHOT_BBOX_PRECISION
+        north, south, east, west = canonical_bbox(
+            bbox.max_y, bbox.min_y, bbox.max_x, bbox.min_x, precision
+        )
+
+        # A bbox loaded before is memory-mapped whole, without merging its tiles again
+        key = snapshot_key((north, south, east, west), "drive", precision)
+        with self.lock:
+            # Already the current network
+            if self.graph_version is not None and self._versions.get(key) == self.graph_version:
+                return
+            core = self.snapshots.load(key)
+            if core is not None:
+                self.load_core(core)
+                self._versions[key] = self.graph_version
+                return
+
+        # Load the covering grid tiles (cached independently) and stitch them together
+        tiles = tiles_for_bbox(north, south, east, west, config.NETWORK_TILE_SIZE)
+        if len(tiles) > config.NETWORK_MAX_TILES:
+            raise ValueError(
+                f"Bounding box covers {len(tiles)} tiles (limit {config.NETWORK_MAX_TILES})"
+            )
+        cores = self._load_tiles(tiles)
+        core = clip_core(merge_cores(cores), north, south, east, west)
+        if core.num_nodes == 0:
+            raise ValueError("No road network found within the requested bounding box")
+        try:
+            self.snapshots.save(key, core, bbox=[north, south, east, west], network_type="drive")
+        except OSError:
+            pass
+        with self.lock:
+            self.load_core(core)
+            self._versions[key] = self.graph_version
+
+    def _load_tiles(self, tiles):
+        """
+        Compact graphs of the given tiles: snapshots where cached, the rest
+        fetched in parallel. Concurrent requests share in-flight tile loads.
+        """
+        cores = {}
+        pending = {}
+        for tile in tiles:
+            core = self.snapshots.load(self._tile_key(tile))
+            if core is not None:
+                cores[tile] = core
+                continue
+            with _inflight_lock:
+                future = _inflight.get(tile)
+                if future is None:
+                    future = _tile_executor.submit(self._fetch_tile, tile)
+                    _inflight[tile] = future
+                    future.add_done_callback(lambda _, tile=tile: _forget_inflight(tile))
+            pending[tile] = future
+        for tile, future in pending.items():
+            cores[tile] = future.result()
+        return [cores[tile] for tile in tiles]
+
+    def _tile_key(self, tile):
+        size = config.NETWORK_TILE_SIZE
+        return snapshot_key(tile_bbox(tile, size), f"drive:tile{size}", precision=10)
+
+    def _fetch_tile(self, tile):
+        """
+        Run the OSMnx pipeline for one tile and snapshot the result
+        """
+        north, south, east, west = tile_bbox(tile, config.NETWORK_TILE_SIZE)
+
+        # Areas Overpass already answered as empty fail fast instead of re-querying
+        self._prepare_overpass_cache()
+        if self.overpass_cache.is_known_empty(north, south, east, west):
+            core = CompactGraph.empty()
+        else:
+            try:
+                # Keep edges that cross the tile border so neighbouring tiles stitch together
+                # OSMnx 2.x takes the bbox as (left, bottom, right, top)
+                G = ox.graph_from_bbox(
+                    bbox=(west, south, east, north), network_type="drive", truncate_by_edge=True
+                )
+            except Exception as error:
+                if not _is_empty_area_error(error):
+                    raise
+                core = CompactGraph.empty()
+            else:
+                G_undirected = ox.convert.to_undirected(G)
+                add_travel_times(G_undirected)  # speed_kph and travel_time (seconds)
+                core = CompactGraph.from_networkx(G_undirected)
+        try:
+            self.snapshots.save(
+                self._tile_key(tile), core, bbox=[north, south, east, west], network_type="drive"
+            )
+        except OSError:
+            # A read-only or full disk only costs us the next cold load
+            pass
+        return core
+
+    def _prepare_overpass_cache(self):
+        """
+        Index and compact the Overpass cache directory and hook it into OSMnx (once)
+        """
+        with _inflight_lock:
+            if self.overpass_cache.installed:
+                return
+            self._install_overpass_cache()
+
+    def _install_overpass_cache(self):
+        cache = self.overpass_cache
+        remove_raw = config.OVERPASS_CACHE_REMOVE_RAW
+        cache.scan()
+        cache.compact(remove_raw=remove_raw)
+        cache.evict(cache.max_bytes, cache.max_age, remove_raw=remove_raw)
+        self.overpass_cache.install(ox)
 
     def get_sample_network(self):
-        # Return a small, hardcoded sample network (no OSMnx, always fast)
+        self.load_sample_network()
+        return self.iter_geojson()
+
+    def load_sample_network(self):
+        # Load a small, hardcoded sample network (no OSMnx, always fast)
         G = nx.Graph()
         nodes = [
             (1, {"y": 31.5200, "x": 74.3587}),
@@ -41,9 +418,47 @@ class NetworkService:
             (1, 3, {"length": 160, "travel_time": 16, "name": "Link Road"}),
         ]
         G.add_edges_from(edges)
-        self.current_graph = G
-        self.current_geojson = self._graph_to_geojson(G)
-        return self.current_geojson
+        with self.lock:
+            self._load_graph(G)
+            self._versions["sample"] = self.graph_version
+
+    def get_square_intersection_network(self):
+        self.load_square_intersection_network()
+        return self.iter_geojson()
+
+    def load_square_intersection_network(self):
+        """
+        Load a square intersection (chock): four signalized corners joined in a
+        ring, each with one external approach road
+        """
+        G = nx.Graph()
+        nodes = [
+            # Square corners
+            (1, {"y": 31.5210, "x": 74.3580}),
+            (2, {"y": 31.5210, "x": 74.3590}),
+            (3, {"y": 31.5200, "x": 74.3590}),
+            (4, {"y": 31.5200, "x": 74.3580}),
+            # External approaches
+            (5, {"y": 31.5225, "x": 74.3580}),
+            (6, {"y": 31.5210, "x": 74.3605}),
+            (7, {"y": 31.5185, "x": 74.3590}),
+            (8, {"y": 31.5200, "x": 74.3565}),
+        ]
+        G.add_nodes_from(nodes)
+        edges = [
+            (1, 2, {"length": 100, "travel_time": 10, "name": "North Road"}),
+            (2, 3, {"length": 100, "travel_time": 10, "name": "East Road"}),
+            (3, 4, {"length": 100, "travel_time": 10, "name": "South Road"}),
+            (4, 1, {"length": 100, "travel_time": 10, "name": "West Road"}),
+            (5, 1, {"length": 150, "travel_time": 15, "name": "North Approach"}),
+            (6, 2, {"length": 150, "travel_time": 15, "name": "East Approach"}),
+            (7, 3, {"length": 150, "travel_time": 15, "name": "South Approach"}),
+            (8, 4, {"length": 150, "travel_time": 15, "name": "West Approach"}),
+        ]
+        G.add_edges_from(edges)
+        with self.lock:
+            self._load_graph(G)
+            self._versions["square-intersection"] = self.graph_version
 
     def get_faisalabad_satyana_road_map(self):
         G = nx.Graph()
@@ -61,34 +476,50 @@ class NetworkService:
             (2, 4, {"length": 80, "travel_time": 8, "name": "Link Road"}),
         ]
         G.add_edges_from(edges)
-        self.current_graph = G
-        self.current_geojson = self._graph_to_geojson(G)
-        return self.current_geojson
-
-    def _graph_to_geojson(self, G):
-        features = []
-        for node, data in G.nodes(data=True):
-            point = geojson.Point((data.get("x", 0), data.get("y", 0)))
-            features.append(geojson.Feature(geometry=point, properties={
-                "id": str(node), "type": "intersection"
-            }))
-        for u, v, data in G.edges(data=True):
-            u_data = G.nodes[u]
-            v_data = G.nodes[v]
-            coords = [
-                (u_data.get("x", 0), u_data.get("y", 0)),
-                (v_data.get("x", 0), v_data.get("y", 0))
-            ]
-            features.append(geojson.Feature(geometry=geojson.LineString(coords), properties={
+        self._load_graph(G)
+        return self.iter_geojson()
+
+    def get_intersections(self):
+        """
+        List intersections (nodes) of the current network with their degree
+        """
+        core = self.current_core
+        if core is None:
+            return []
+        degrees = core.degree().tolist()
+        xs, ys = core.x.tolist(), core.y.tolist()
+        return [
+            {
+                "id": str(core.node_id(i)),
+                "latitude": ys[i],
+                "longitude": xs[i],
+                "degree": degrees[i],
+            }
+            for i in range(core.num_nodes)
+        ]
+
+    def get_roads(self):
+        """
+        List roads (edges) of the current network with their attributes
+        """
+        core = self.current_core
+        if core is None:
+            return []
+        lengths, times = core.length.tolist(), core.travel_time.tolist()
+        roads = []
+        for e in range(core.num_edges):
+            u = core.node_id(core.edge_u[e])
+            v = core.node_id(core.edge_v[e])
+            name_id = core.name_ids[e]
+            roads.append({
                 "id": f"{u}-{v}",
                 "source": str(u),
                 "target": str(v),
-                "length": data.get("length", 0),
-                "travel_time": data.get("travel_time", 0),
-                "name": data.get("name", "Unknown Road"),
-                "type": "road"
-            }))
-        return geojson.FeatureCollection(features)
+                "length": lengths[e],
+                "travel_time": times[e],
+                "name": core.names[name_id] if name_id >= 0 else "Unknown Road",
+            })
+        return roads
 
 # Initialize the service (singleton style)
 network_service = NetworkService()
@@ -0,0 +1,66 @@
+from app.core import config
+from app.core.matrix import nearest_nodes, travel_time_matrix
+
+
+class RouteService:
+    """
+    Routing queries (travel-time matrices) over the network loaded in a NetworkService
+    """
+
+    def __init__(self, network_service):
+        self.network_service = network_service
+
+    def resolve_locations(self, core, locations):
+        """
+        Node indices for a list of node IDs and/or [longitude, latitude] pairs;
+        coordinates snap to the nearest node
+        """
+        indices = [None] * len(locations)
+        points = []
+        for i, location in enumerate(locations):
+            if isinstance(location, (list, tuple)):
+                if len(location) != 2:
+                    raise ValueError(f"Coordinates must be [longitude, latitude]: {location}")
+                points.append((i, location))
+                continue
+            try:
+                node = int(location) if core.node_ids.dtype.kind in "iu" else str(location)
+                indices[i] = core.index_of(node)
+            except (KeyError, ValueError):
+                raise ValueError(f"Unknown node: {location}")
+        if points:
+            snapped = nearest_nodes(
+                core, [p[1][0] for p in points], [p[1][1] for p in points]
+            )
+            for (i, _), index in zip(points, snapped.tolist()):
+                indices[i] = index
+        return indices
+
+    def travel_time_matrix(self, sources, targets=None):
+        """
+        Travel times (seconds) between every source and target of the loaded network.
+        Returns (source node IDs, target node IDs, matrix) with inf where unreachable.
+        """
+        if self.network_service.current_core is None:
+            self.network_service.load_sample_network()
+        core = self.network_service.current_core
+        targets = sources if targets is None else targets
+        if len(sources) * len(targets) > config.MATRIX_MAX_CELLS:
+            raise ValueError(
+                f"Matrix of {len(sources)}x{len(targets)} exceeds {config.MATRIX_MAX_CELLS} cells"
+            )
+
+        source_index = self.resolve_locations(core, sources)
+        target_index = self.resolve_locations(core, targets)
+        self.network_service.prepare_routing(core)
+        matrix = travel_time_matrix(
+            core, source_index, target_index,
+            workers=config.MATRIX_WORKERS,
+            batch_size=config.MATRIX_BATCH_SIZE,
+            parallel_min=config.MATRIX_PARALLEL_MIN_SOURCES,
+        )
+        return (
+            [str(core.node_id(i)) for i in source_index],
+            [str(core.node_id(i)) for i in target_index],
+            matrix,
+        )
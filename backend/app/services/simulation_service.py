@@ -1,24 +1,76 @@
 import networkx as nx
+import multiprocessing
 import random
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Any, Optional
-import heapq
+import threading
+import time
 import numpy as np
+from app.core import config
+from app.core.contraction import ContractionHierarchy
+from app.core.jobs import checkpoint
+from app.core.overlay import WeightOverlay
+from app.core.plan_cache import SignalPlanCache
+from app.core.replicates import ReplicateStats, replicate_seeds
+from app.core.rerouting import RerouteEngine
+from app.core.scenarios import ScenarioRunner
+from app.core.shared_graph import SharedGraph
+from app.core.coordination import GreenWave
+from app.core.ctm import CellTransmissionModel
+from app.core.events import EventSimulation
+from app.core.microsim import MicroSimulation
+from app.core.signals import STATE_NAMES, SignalTable
+from app.core.webster import WebsterOptimizer
 from app.services.network_service import NetworkService
 
+# Ways /simulate/complex can play the fleet out: static shortest paths only,
+# a microsimulation with signals and queues (time-stepped, or event-driven for
+# sparse demand), or city-wide flow with the cell transmission model
+ENGINES = ("static", "micro", "event", "ctm")
+
+# Signal plans for /simulate/complex: the fixed adaptive timings, or Webster
+# cycles and splits from the routed (or supplied) demand
+SIGNAL_TIMINGS = ("fixed", "webster")
+
+# Service, shared memory mapping and simulation arguments inside a replicate pool worker
+_replicate_service = None
+_replicate_memory = None
+_replicate_args = None
+
+def _init_replicate_worker(handle, contraction_path, args):
+    global _replicate_service, _replicate_memory, _replicate_args
+    core, _replicate_memory = SharedGraph.attach(handle)
+    # Route with the hierarchy the parent has ready; workers never build one
+    config.CONTRACTION_HIERARCHIES = False
+    if contraction_path is not None:
+        core.contraction = ContractionHierarchy.load(contraction_path, core.fingerprint())
+    _replicate_service = SimulationService()
+    _replicate_service.network_service.load_core(core)
+    _replicate_args = args
+
+def _run_replicate(seed):
+    return _replicate_service._complex_simulation(*_replicate_args, seed)
+
 class SimulationService:
     def __init__(self):
         self.network_service = NetworkService()
         self.current_simulation = None
+        # Network the current simulation ran on, which /signals/state reads it against
+        self._simulation_core = None
+        self.reroute_engine = None
+        self._signal_table = None
+        self.signal_plans = SignalPlanCache(self._adaptive_traffic_light)
+        # Background jobs may generate plans concurrently with requests
+        self._plans_lock = threading.Lock()
+        # Guards the current simulation, the rerouting engine and the compiled signal table
+        self._lock = threading.RLock()
 
     def run_basic_simulation(self):
         """
         Run a basic simulation with default timings & routes for static light traffic
         """
-        # Ensure we have a network
-        if self.network_service.current_graph is None:
-            self.network_service.get_sample_network()
-
-        G = self.network_service.current_graph
+        # Work on the loaded (or sample) network even if another one is loaded meanwhile
+        G, core = self.network_service.snapshot()
 
         # Generate traffic light timings for each intersection
         traffic_lights = self._generate_default_traffic_light_timings(G)
@@ -27,79 +79,327 @@ class SimulationService:
         routes = self._generate_random_routes(G, 5)
 
         # Store the current simulation
-        self.current_simulation = {
+        return self._set_current({
             "traffic_lights": traffic_lights,
             "routes": routes,
             "incidents": []
-        }
-
-        return self.current_simulation
+        }, core)
 
     def run_dynamic_simulation(self, incident):
         """
         Run a dynamic simulation with an incident, returning updated timings & alternative routes
         """
-        # Ensure we have a network
-        if self.network_service.current_graph is None:
-            self.network_service.get_sample_network()
-
-        G = self.network_service.current_graph.copy()
-
-        # Apply the incident to the graph
-        self._apply_incident(G, incident)
-
-        # Generate adaptive traffic light timings
-        traffic_lights = self._generate_adaptive_traffic_light_timings(G, [incident])
-
-        # Generate routes that avoid the incident
-        routes = self._generate_routes_avoiding_incidents(G, 5, [incident])
+        return self.update_incidents([incident])
 
-        # Store the current simulation
-        self.current_simulation = {
-            "traffic_lights": traffic_lights,
-            "routes": routes,
-            "incidents": [incident.dict()]
-        }
-
-        return self.current_simulation
-
-    def run_complex_simulation(self, duration, incidents, vehicles_count):
+    def update_incidents(self, incidents):
+        """
+        Replace the active incidents and re-route only the vehicles they affect.
+        The fleet is kept between calls, so clearing or easing an incident
+        moves vehicles back; the result lists what changed in "route_changes",
+        and the signal plans that changed in "signal_changes".
+        """
+        G, core = self.network_service.snapshot()
+
+        # One update at a time mutates the shared fleet
+        with self._lock:
+            engine = self._reroute_engine(G)
+            changes = engine.set_incidents(self._incident_factors(engine.core, incidents))
+
+            # Generate adaptive traffic light timings
+            traffic_lights = self._generate_adaptive_traffic_light_timings(G, incidents)
+
+            # Store the current simulation
+            return self._set_current({
+                "traffic_lights": traffic_lights,
+                "routes": self._engine_routes(engine),
+                "incidents": [incident.dict() for incident in incidents],
+                "route_changes": [self._route_change(engine, change) for change in changes],
+                "signal_changes": self.signal_plans.changes
+            }, core)
+
+    def run_complex_simulation(self, duration, incidents, vehicles_count, routing="auto", landmarks=None,
+                               engine="static", signal_timing="fixed", demand=None, green_wave=False,
+                               seed=None, progress=None):
         """
-        Run a complex simulation with multiple incidents & concurrent vehicles
+        Run a complex simulation with multiple incidents & concurrent vehicles.
+        The random routes are drawn from `seed` when given, so a run can be repeated.
+        `progress(done, total, stage)` is called as each stage starts.
         """
-        # Ensure we have a network
-        if self.network_service.current_graph is None:
-            self.network_service.get_sample_network()
+        network = self.network_service.snapshot()
+        simulation = self._complex_simulation(
+            duration, incidents, vehicles_count, routing, landmarks, engine, signal_timing,
+            demand, green_wave, seed, progress, network
+        )
+        return self._set_current(simulation, network[1])
+
+    def _complex_simulation(self, duration, incidents, vehicles_count, routing, landmarks, engine,
+                            signal_timing, demand, green_wave, seed, progress=None, network=None):
+        """
+        One complex simulation on `network`, a (graph, core) snapshot of the
+        loaded network, without making it the current simulation
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown simulation engine: {engine}")
+        if signal_timing not in SIGNAL_TIMINGS:
+            raise ValueError(f"Unknown signal timing: {signal_timing}")
 
-        G = self.network_service.current_graph.copy()
+        # Incidents are read through an overlay; the shared network is never copied
+        G, core = network or self.network_service.snapshot()
 
-        # Apply all incidents to the graph
-        for incident in incidents:
-            self._apply_incident(G, incident)
+        stages = ["signals", "routes"]
+        stages += ["webster"] if signal_timing == "webster" else []
+        stages += ["green_wave"] if green_wave else []
+        stages += [engine] if engine != "static" else []
+
+        def report(stage):
+            if progress is not None:
+                progress(stages.index(stage), len(stages), stage)
 
         # Generate adaptive traffic light timings
+        report("signals")
         traffic_lights = self._generate_adaptive_traffic_light_timings(G, incidents)
 
         # Generate routes for multiple vehicles
-        routes = self._generate_routes_avoiding_incidents(G, vehicles_count, incidents)
-
-        # Store the current simulation
-        self.current_simulation = {
+        report("routes")
+        paths = [] if engine != "static" or signal_timing == "webster" else None
+        routes = self._generate_routes_avoiding_incidents(
+            G, vehicles_count, incidents, routing=routing, landmarks=landmarks, paths_out=paths,
+            rng=None if seed is None else random.Random(seed)
+        )
+
+        simulation = {
             "traffic_lights": traffic_lights,
             "routes": routes,
             "incidents": [incident.dict() for incident in incidents],
-            "duration": duration
+            "duration": duration,
+            "routing": routing,
+            "engine": engine,
+            "signal_timing": signal_timing,
+            "seed": seed
+        }
+        if signal_timing == "webster":
+            # Time the signals for the demand before any engine plays it out
+            report("webster")
+            traffic_lights, signal_delay = self._generate_webster_traffic_light_timings(
+                core, paths, incidents, duration, demand, routing, landmarks
+            )
+            simulation.update(traffic_lights=traffic_lights, signal_delay=signal_delay)
+        if green_wave:
+            # Offset the signals along named arterials so platoons meet green lights
+            report("green_wave")
+            edge_times = self._incident_overlay(core, incidents).weights()
+            traffic_lights, corridors = GreenWave(core, traffic_lights, edge_times).coordinate()
+            simulation.update(traffic_lights=traffic_lights, corridors=corridors)
+        # The engines share the compiled plans that /signals/state answers from
+        if engine in ("micro", "event"):
+            report(engine)
+            simulation.update(self._run_microsimulation(
+                core, routes, paths, self.signal_table(traffic_lights, core), incidents, duration, engine
+            ))
+        elif engine == "ctm":
+            report(engine)
+            simulation.update(self._run_cell_transmission(
+                core, paths, self.signal_table(traffic_lights, core), incidents, duration
+            ))
+
+        return simulation
+
+    def run_replicates(self, replicates, duration, incidents, vehicles_count, routing="auto", landmarks=None,
+                       engine="static", signal_timing="fixed", demand=None, green_wave=False,
+                       seed=None, confidence=0.95, include_runs=False, workers=None, progress=None):
+        """
+        Run `replicates` seeded copies of a complex simulation and pool their
+        travel times into per-route and per-road statistics (mean, p50, p95
+        and a confidence interval of the mean). Replicate seeds are spawned
+        from `seed`; the raw runs are only returned when `include_runs` is set.
+        Enough replicates fan out to a process pool over the shared graph;
+        statistics are pooled in seed order either way.
+        `progress(done, total)` is called as the replicates finish.
+        """
+        if not 1 <= replicates <= config.SIMULATION_MAX_REPLICATES:
+            raise ValueError(f"Replicates must be between 1 and {config.SIMULATION_MAX_REPLICATES}")
+        if engine == "ctm":
+            raise ValueError("Replicates need vehicle travel times; use the static, micro or event engine")
+        if not 0 < confidence < 1:
+            raise ValueError("Confidence must be between 0 and 1")
+
+        root, seeds = replicate_seeds(seed, replicates)
+        args = (duration, incidents, vehicles_count, routing, landmarks, engine, signal_timing,
+                demand, green_wave)
+        workers = workers or config.REPLICATE_WORKERS
+        if workers > 1 and replicates >= config.REPLICATE_PARALLEL_MIN:
+            results = self._pooled_replicates(args, seeds, workers)
+        else:
+            # Every replicate runs on the network loaded when the replicates started
+            network = self.network_service.snapshot()
+            results = (self._complex_simulation(*args, replicate_seed, network=network)
+                       for replicate_seed in seeds)
+
+        stats = ReplicateStats(confidence)
+        runs = []
+        if progress is not None:
+            progress(0, replicates)
+        # Replicates do not replace the simulation that /signals/state serves
+        for i, run in enumerate(results):
+            stats.add(run["routes"], run.get("vehicles"))
+            if include_runs:
+                runs.append(run)
+            if progress is not None:
+                progress(i + 1, replicates)
+
+        result = stats.summary()
+        result.update(seed=root, seeds=seeds, engine=engine)
+        if include_runs:
+            result["runs"] = runs
+        return result
+
+    def _pooled_replicates(self, args, seeds, workers):
+        """
+        Complex simulations for `seeds`, in order, from a process pool whose
+        workers attach to the loaded network through a SharedGraph
+        """
+        core = self.network_service.current_core
+        if core is None:
+            _, core = self.network_service.snapshot()
+        self.network_service.prepare_routing(core)
+        path = core.contraction.path if core.contraction is not None else None
+        with SharedGraph(core) as shared:
+            pool = ProcessPoolExecutor(
+                max_workers=min(workers, len(seeds)), initializer=_init_replicate_worker,
+                initargs=(shared.handle, path, args),
+                mp_context=multiprocessing.get_context(config.PROCESS_START_METHOD),
+            )
+            try:
+                yield from pool.map(_run_replicate, seeds)
+            finally:
+                pool.shutdown(cancel_futures=True)
+
+    def run_scenarios(self, scenarios, vehicles_count, workers=None, progress=None):
+        """
+        Evaluate incident scenarios side by side on one shared fleet of OD pairs.
+        `scenarios` is a list of (scenario id, incidents) pairs; they run on a
+        process pool over the shared graph. Returns the baseline and, per
+        scenario, the extra travel time and the routes it affects or cuts off,
+        ranked most disruptive first. `progress(done, total)` follows the finished scenarios.
+        """
+        _, core = self.network_service.snapshot()
+        pairs = self._sample_pairs(core, vehicles_count)
+        runner = ScenarioRunner(
+            core, workers=workers or config.SCENARIO_WORKERS, parallel_min=config.SCENARIO_PARALLEL_MIN
+        )
+        started = time.perf_counter()
+        times = runner.run(pairs, [self._incident_factors(core, incidents) for _, incidents in scenarios],
+                           progress=progress)
+        elapsed = time.perf_counter() - started
+
+        # Only pairs with a route in the base network are compared
+        baseline = times[0]
+        reachable = np.isfinite(baseline)
+        results = []
+        for (scenario_id, incidents), row in zip(scenarios, times[1:]):
+            row, base = row[reachable], baseline[reachable]
+            routed = np.isfinite(row)
+            delay = row[routed] - base[routed]
+            results.append({
+                "id": scenario_id,
+                "incidents": [incident.dict() for incident in incidents],
+                "total_travel_time": float(row[routed].sum()),
+                "extra_travel_time": float(delay.sum()),
+                "mean_delay": float(delay.mean()) if len(delay) else 0.0,
+                "max_delay": float(delay.max()) if len(delay) else 0.0,
+                "routes_affected": int((delay > 1e-9).sum()),
+                "unreachable": int((~routed).sum())
+            })
+
+        # Cut-off routes weigh more than any delay
+        order = sorted(range(len(results)),
+                       key=lambda i: (-results[i]["unreachable"], -results[i]["extra_travel_time"]))
+        for rank, i in enumerate(order, 1):
+            results[i]["rank"] = rank
+        return {
+            "baseline": {
+                "routes": int(reachable.sum()),
+                "total_travel_time": float(baseline[reachable].sum())
+            },
+            "scenarios": results,
+            "ranking": [results[i]["id"] for i in order],
+            "workers": runner.workers if len(scenarios) >= runner.parallel_min else 1,
+            "elapsed": elapsed
         }
 
-        return self.current_simulation
+    def _set_current(self, simulation, core):
+        """
+        Make `simulation`, run on `core`, the current simulation and return it
+        """
+        with self._lock:
+            self.current_simulation = simulation
+            self._simulation_core = core
+        return simulation
+
+    def signal_table(self, traffic_lights=None, core=None):
+        """
+        SignalTable of the given traffic lights on `core`, or of the current
+        simulation's on the network it ran on; compiled once per set of plans
+        """
+        with self._lock:
+            if traffic_lights is None:
+                if self.current_simulation is None:
+                    raise ValueError("No simulation has been run")
+                traffic_lights, core = self.current_simulation["traffic_lights"], self._simulation_core
+            cached = self._signal_table
+        if cached is None or cached[0] is not traffic_lights or cached[1] is not core:
+            cached = (traffic_lights, core, SignalTable.compile(core, traffic_lights))
+            with self._lock:
+                self._signal_table = cached
+        return cached[2]
+
+    def signal_states(self, times, ids=None):
+        """
+        Light shown by signalized approaches of the current simulation at each time.
+        `ids` holds intersection IDs (all their approaches) or "<intersection>-<from>"
+        road IDs; all approaches when omitted. Returns the road IDs, one row
+        of states per time and the seconds until each light changes.
+        """
+        with self._lock:
+            table, core = self.signal_table(), self._simulation_core
+        if ids is None:
+            approaches = np.arange(len(table))
+        else:
+            at, come_from, intersections = [], [], []
+            for road_id in ids:
+                node, _, neighbour = road_id.partition("-")
+                try:
+                    if neighbour:
+                        at.append(core.index_of(int(node)))
+                        come_from.append(core.index_of(int(neighbour)))
+                    else:
+                        intersections.append(core.index_of(int(node)))
+                except (KeyError, ValueError):
+                    continue
+            approaches = np.r_[table.intersection_approaches(intersections), table.approaches(at, come_from)]
+            approaches = approaches[approaches >= 0].astype(np.int64)
+
+        states, remaining = table.states(approaches, times)
+        node_ids = [str(node) for node in core.node_ids.tolist()]
+        keys = table.keys[approaches]
+        return {
+            "times": [float(t) for t in times],
+            "road_ids": [
+                f"{node_ids[at]}-{node_ids[come_from]}"
+                for at, come_from in zip((keys // table.num_nodes).tolist(), (keys % table.num_nodes).tolist())
+            ],
+            "states": [[STATE_NAMES[state] for state in row] for row in states.tolist()],
+            "remaining": [[r if r != float("inf") else None for r in row] for row in remaining.tolist()]
+        }
 
     def run_square_intersection_simulation(self, vehicles_count=10, with_incident=False):
         """
         Run a simulation with a square intersection (chock) with traffic signals
         """
-        # Get the square intersection network
-        self.network_service.get_square_intersection_network()
-        G = self.network_service.current_graph.copy()
+        # Get the square intersection network, as loaded by this request
+        with self.network_service.lock:
+            self.network_service.load_square_intersection_network()
+            G, core = self.network_service.snapshot()
 
         # Create an incident if requested
         incidents = []
@@ -112,7 +412,6 @@ class SimulationService:
                 description="Traffic accident on North Road"
             )
             incidents.append(incident)
-            self._apply_incident(G, incident)
 
         # Generate traffic light timings for the square intersection
         # For a square intersection, we want coordinated traffic lights
@@ -122,14 +421,12 @@ class SimulationService:
         routes = self._generate_square_intersection_routes(G, vehicles_count, incidents)
 
         # Store the current simulation
-        self.current_simulation = {
+        return self._set_current({
             "traffic_lights": traffic_lights,
             "routes": routes,
             "incidents": [incident.dict() for incident in incidents] if incidents else [],
             "duration": 300  # 5 minutes simulation
-        }
-
-        return self.current_simulation
+        }, core)
 
     def _generate_square_intersection_traffic_lights(self, G, incidents):
         """
@@ -243,8 +540,10 @@ class SimulationService:
             [8, 4, 1, 2, 6]   # West to East via North
         ]
 
-        # Create a routing graph with incidents applied
-        G_routing = G.copy()
+        # Read incident slowdowns through an overlay instead of copying the graph
+        core = self.network_service.core_for(G)
+        overlay = self._incident_overlay(core, incidents)
+        router = self.network_service.router(core)
 
         # Generate routes based on common paths
         for i, path in enumerate(common_paths):
@@ -254,37 +553,21 @@ class SimulationService:
             # Convert path to strings for consistency
             path_str = [str(node) for node in path]
 
-            # Calculate travel time
-            travel_time = 0
+            # Travel time of each hop under the incidents
+            hop_times = []
             for j in range(len(path) - 1):
-                u, v = path[j], path[j+1]
-                edge_time = G[u][v]['travel_time']
-
-                # Check if this edge has an incident
-                edge_id = f"{u}-{v}"
-                for incident in incidents:
-                    if incident.road_id == edge_id:
-                        # Apply incident effect to travel time
-                        if incident.severity >= 0.99:
-                            # Find alternative path around the incident
-                            try:
-                                # Remove the edge with the incident
-                                G_temp = G_routing.copy()
-                                G_temp.remove_edge(u, v)
-
-                                # Find alternative path
-                                alt_path = nx.shortest_path(G_temp, source=u, target=v, weight='travel_time')
-
-                                # Calculate alternative path time
-                                alt_time = sum(G_temp[alt_path[k]][alt_path[k+1]]['travel_time'] for k in range(len(alt_path)-1))
-                                edge_time = alt_time
-                            except:
-                                edge_time = float('inf')
-                        else:
-                            edge_time = edge_time / (1 - incident.severity)
-                        break
-
-                travel_time += edge_time
+                u, v = core.index_of(path[j]), core.index_of(path[j+1])
+                edge = core.find_edge(u, v)
+                edge_time = overlay.weight(edge)
+                if edge_time == float('inf'):
+                    # Blocked road: detour around it, still avoiding every closure
+                    try:
+                        _, detour = router.shortest_path(u, v, closed={edge}, overlay=overlay)
+                        edge_time = sum(overlay.weight(e) for e in detour)
+                    except nx.NetworkXNoPath:
+                        pass
+                hop_times.append(edge_time)
+            travel_time = sum(hop_times)
 
             # Create waypoints
             waypoints = []
@@ -299,20 +582,9 @@ class SimulationService:
 
                 # Calculate arrival time
                 if j > 0:
-                    u, v = path[j-1], path[j]
-                    edge_time = G[u][v]['travel_time']
-
-                    # Check for incidents
-                    edge_id = f"{u}-{v}"
-                    for incident in incidents:
-                        if incident.road_id == edge_id:
-                            if incident.severity >= 0.99:
-                                edge_time = float('inf')
-                            else:
-                                edge_time = edge_time / (1 - incident.severity)
-                            break
-
-                    cumulative_time += edge_time
+                    cumulative_time += overlay.weight(core.find_edge(
+                        core.index_of(path[j-1]), core.index_of(node_id)
+                    ))
 
                 waypoints.append({
                     "node_id": str(node_id),
@@ -345,225 +617,400 @@ class SimulationService:
         Generate default traffic light timings for each intersection
         """
         traffic_lights = []
+        core = self.network_service.core_for(G)
+
+        # Only intersections with multiple roads need traffic lights
+        for index in np.flatnonzero(core.degree() > 1):
+            node = core.node_id(index)
+            # Default timing: 30 seconds green, 5 seconds yellow, 30 seconds red
+            # For each incoming road
+            incoming_roads = [(node, core.node_id(nbr)) for nbr in core.neighbors(index)]
+
+            light_cycles = []
+            cycle_time = 35  # 30 green + 5 yellow
 
-        for node, degree in G.degree():
-            if degree > 1:  # Only intersections with multiple roads need traffic lights
-                # Default timing: 30 seconds green, 5 seconds yellow, 30 seconds red
-                # For each incoming road
-                incoming_roads = list(G.edges(node))
-
-                light_cycles = []
-                cycle_time = 35  # 30 green + 5 yellow
-
-                for i, road in enumerate(incoming_roads):
-                    start_time = i * cycle_time
-                    light_cycles.append({
-                        "road_id": f"{road[0]}-{road[1]}",
-                        "green_start": start_time,
-                        "green_duration": 30,
-                        "yellow_duration": 5
-                    })
-
-                traffic_lights.append({
-                    "intersection_id": str(node),
-                    "cycles": light_cycles,
-                    "total_cycle_time": len(incoming_roads) * cycle_time
+            for i, road in enumerate(incoming_roads):
+                start_time = i * cycle_time
+                light_cycles.append({
+                    "road_id": f"{road[0]}-{road[1]}",
+                    "green_start": start_time,
+                    "green_duration": 30,
+                    "yellow_duration": 5
                 })
 
+            traffic_lights.append({
+                "intersection_id": str(node),
+                "cycles": light_cycles,
+                "total_cycle_time": len(incoming_roads) * cycle_time
+            })
+
         return traffic_lights
 
     def _generate_adaptive_traffic_light_timings(self, G, incidents):
         """
-        Generate adaptive traffic light timings based on incidents
+        Generate adaptive traffic light timings based on incidents.
+        Plans are cached per graph version and only the intersections at the
+        ends of roads whose incidents changed are regenerated.
         """
-        traffic_lights = []
+        core = self.network_service.core_for(G)
+        with self._plans_lock:
+            return self.signal_plans.plans(core, core.fingerprint(), [inc.road_id for inc in incidents])
 
-        # Get affected intersections (those connected to roads with incidents)
-        affected_intersections = set()
-        for incident in incidents:
-            road_parts = incident.road_id.split("-")
-            affected_intersections.add(road_parts[0])
-            affected_intersections.add(road_parts[1])
-
-        for node, degree in G.degree():
-            if degree > 1:  # Only intersections with multiple roads need traffic lights
-                incoming_roads = list(G.edges(node))
-
-                light_cycles = []
-
-                # Check if this intersection is affected by an incident
-                is_affected = str(node) in affected_intersections
-
-                # Adjust cycle times based on whether the intersection is affected
-                if is_affected:
-                    # Prioritize roads that don't have incidents
-                    incident_roads = [inc.road_id for inc in incidents]
-
-                    # Sort roads: non-incident roads first
-                    sorted_roads = []
-                    for road in incoming_roads:
-                        road_id = f"{road[0]}-{road[1]}"
-                        if road_id not in incident_roads:
-                            sorted_roads.append((road, 45))  # Longer green time for non-incident roads
-                        else:
-                            sorted_roads.append((road, 15))  # Shorter green time for incident roads
-
-                    # Create light cycles
-                    current_time = 0
-                    for road, green_time in sorted_roads:
-                        light_cycles.append({
-                            "road_id": f"{road[0]}-{road[1]}",
-                            "green_start": current_time,
-                            "green_duration": green_time,
-                            "yellow_duration": 5
-                        })
-                        current_time += green_time + 5  # green + yellow
-
-                    total_cycle_time = current_time
+    def _adaptive_traffic_light(self, core, index, is_affected, incident_roads):
+        """
+        Adaptive traffic light of one intersection; `is_affected` when an incident
+        road names it, `incident_roads` the active incident road IDs
+        """
+        node = core.node_id(index)
+        incoming_roads = [(node, core.node_id(nbr)) for nbr in core.neighbors(index)]
+
+        light_cycles = []
+
+        # Adjust cycle times based on whether the intersection is affected
+        if is_affected:
+            # Prioritize roads that don't have incidents
+            sorted_roads = []
+            for road in incoming_roads:
+                road_id = f"{road[0]}-{road[1]}"
+                if road_id not in incident_roads:
+                    sorted_roads.append((road, 45))  # Longer green time for non-incident roads
                 else:
-                    # Default timing for non-affected intersections
-                    cycle_time = 35  # 30 green + 5 yellow
-
-                    for i, road in enumerate(incoming_roads):
-                        start_time = i * cycle_time
-                        light_cycles.append({
-                            "road_id": f"{road[0]}-{road[1]}",
-                            "green_start": start_time,
-                            "green_duration": 30,
-                            "yellow_duration": 5
-                        })
-
-                    total_cycle_time = len(incoming_roads) * cycle_time
-
-                traffic_lights.append({
-                    "intersection_id": str(node),
-                    "cycles": light_cycles,
-                    "total_cycle_time": total_cycle_time
+                    sorted_roads.append((road, 15))  # Shorter green time for incident roads
+
+            # Create light cycles
+            current_time = 0
+            for road, green_time in sorted_roads:
+                light_cycles.append({
+                    "road_id": f"{road[0]}-{road[1]}",
+                    "green_start": current_time,
+                    "green_duration": green_time,
+                    "yellow_duration": 5
                 })
+                current_time += green_time + 5  # green + yellow
 
-        return traffic_lights
+            total_cycle_time = current_time
+        else:
+            # Default timing for non-affected intersections
+            cycle_time = 35  # 30 green + 5 yellow
+
+            for i, road in enumerate(incoming_roads):
+                start_time = i * cycle_time
+                light_cycles.append({
+                    "road_id": f"{road[0]}-{road[1]}",
+                    "green_start": start_time,
+                    "green_duration": 30,
+                    "yellow_duration": 5
+                })
+
+            total_cycle_time = len(incoming_roads) * cycle_time
 
-    def _generate_random_routes(self, G, count):
+        return {
+            "intersection_id": str(node),
+            "cycles": light_cycles,
+            "total_cycle_time": total_cycle_time
+        }
+
+    def _generate_webster_traffic_light_timings(self, core, paths, incidents, duration, demand=None,
+                                                routing="auto", landmarks=None):
+        """
+        Webster traffic light timings for every intersection at once.
+        Approach flows come from the demand matrix when given (veh/h per OD
+        pair), otherwise from the routed paths spread over `duration`.
+        Incidents cut the saturation flow of their roads by their severity.
+        Returns the traffic lights and a summary of the expected signal delay.
+        """
+        optimizer = WebsterOptimizer(core)
+        overlay = self._incident_overlay(core, incidents)
+        if demand:
+            router = self.network_service.router(core, routing, landmarks)
+            # Demand avoids incident roads like the routed fleet does
+            closed = WeightOverlay.closing(core, self._incident_edges(core, incidents))
+            paths, weights = [], []
+            for entry in demand:
+                try:
+                    source, target = core.index_of(int(entry.source)), core.index_of(int(entry.target))
+                except (KeyError, ValueError):
+                    continue
+                path = router.paths_from(source, {target}, overlay=closed).get(target)
+                if path is not None:
+                    paths.append(path)
+                    weights.append(entry.flow)
+            flows = optimizer.flows(paths, weights)
+        else:
+            flows = optimizer.flows(paths, period=max(duration, 1))
+
+        # An incident slowing a road by a factor f lets 1/f of its vehicles through
+        factors = np.ones(core.num_edges)
+        for edge, factor in overlay.factors.items():
+            factors[edge] = factor
+        saturation = optimizer.saturation_flow * np.maximum(1 / factors[optimizer.edge], 0.05)
+
+        plan = optimizer.optimize(flows, saturation)
+        used = plan["flow"] > 0
+        finite = used & np.isfinite(plan["delay"])
+        summary = {
+            "mean_delay": float(np.average(plan["delay"][finite], weights=plan["flow"][finite]))
+                          if finite.any() else None,
+            "total_delay": float(np.dot(plan["delay"][finite], plan["flow"][finite]) / 3600),
+            "oversaturated": int((used & ~finite).sum())
+        }
+        return optimizer.traffic_lights(plan), summary
+
+    def _generate_random_routes(self, G, count, routing="auto", landmarks=None):
         """
         Generate random routes in the graph
         """
-        routes = []
-        nodes = list(G.nodes())
+        core = self.network_service.core_for(G)
+        router = self.network_service.router(core, routing, landmarks)
+        return self._generate_routes(core, router, count)
 
-        for _ in range(count):
-            if len(nodes) < 2:
-                continue
+    def _generate_routes_avoiding_incidents(self, G, count, incidents, routing="auto", landmarks=None,
+                                            paths_out=None, rng=None):
+        """
+        Generate routes that avoid roads with incidents
+        """
+        core = self.network_service.core_for(G)
+        router = self.network_service.router(core, routing, landmarks)
 
-            source = random.choice(nodes)
-            target = random.choice([n for n in nodes if n != source])
+        # Close incident roads in an overlay instead of removing them from a graph copy
+        overlay = WeightOverlay.closing(core, self._incident_edges(core, incidents))
+        return self._generate_routes(core, router, count, overlay, paths_out, rng)
 
-            try:
-                # Find shortest path
-                path = nx.shortest_path(G, source=source, target=target, weight='travel_time')
-
-                # Calculate total travel time
-                travel_time = sum(G[path[i]][path[i+1]]['travel_time'] for i in range(len(path)-1))
-
-                # Create route with waypoints
-                waypoints = []
-                cumulative_time = 0
-
-                for i in range(len(path)):
-                    node_data = G.nodes[path[i]]
-
-                    # Ensure we have valid coordinates
-                    latitude = node_data.get("y")
-                    longitude = node_data.get("x")
-
-                    # If coordinates are missing, generate some based on the node index
-                    if latitude is None or longitude is None:
-                        # Generate deterministic coordinates based on node ID
-                        # This ensures the same node always gets the same coordinates
-                        node_id_num = int(path[i]) if str(path[i]).isdigit() else hash(str(path[i])) % 1000
-                        latitude = 40.7128 + (node_id_num % 10) * 0.01  # Around NYC latitude
-                        longitude = -74.0060 + (node_id_num // 10) * 0.01  # Around NYC longitude
-
-                    # Calculate arrival time
-                    if i > 0:
-                        edge_time = G[path[i-1]][path[i]]['travel_time']
-                        cumulative_time += edge_time
-
-                    waypoints.append({
-                        "node_id": str(path[i]),
-                        "latitude": latitude,
-                        "longitude": longitude,
-                        "arrival_time": cumulative_time
-                    })
-
-                routes.append({
-                    "id": f"route-{len(routes)+1}",
-                    "source": str(source),
-                    "target": str(target),
-                    "path": [str(node) for node in path],
-                    "travel_time": travel_time,
-                    "waypoints": waypoints
-                })
-            except nx.NetworkXNoPath:
-                # No path exists, try another pair
+    def _generate_routes(self, core, router, count, overlay=None, paths_out=None, rng=None):
+        """
+        Sample `count` random OD pairs (from `rng` when given) and route them, one search per distinct origin.
+        Pairs without a path are skipped. When `paths_out` is a list, the
+        (nodes, edges) index path of every returned route is appended to it.
+        """
+        pairs = self._sample_pairs(core, count, rng)
+
+        by_source = {}
+        for source, target in pairs:
+            by_source.setdefault(source, set()).add(target)
+        paths = {}
+        for source, targets in by_source.items():
+            checkpoint()
+            for target, path in router.paths_from(source, targets, overlay=overlay).items():
+                paths[(source, target)] = path
+
+        # Vehicles sharing an OD pair share the route body, only the id differs
+        routes, built = [], {}
+        for pair in pairs:
+            path = paths.get(pair)
+            if path is None:
                 continue
+            route_id = f"route-{len(routes)+1}"
+            if paths_out is not None:
+                paths_out.append(path)
+            if pair in built:
+                routes.append(dict(built[pair], id=route_id))
+            else:
+                built[pair] = self._build_route(core, path[0], path[1], route_id)
+                routes.append(built[pair])
+        return routes
+
+    def _run_microsimulation(self, core, routes, paths, traffic_lights, incidents, duration,
+                             engine="micro"):
+        """
+        Play the routed fleet out over `duration` with the tick-based ("micro") or
+        event-driven ("event") microsimulation engine.
+        Departures are spread evenly over the run and incident slowdowns lower
+        free-flow speeds; returns per-vehicle trajectories and fleet statistics.
+        """
+        departures = np.linspace(0, duration, len(paths), endpoint=False)
+        edge_times = self._incident_overlay(core, incidents).weights()
+        simulation = EventSimulation if engine == "event" else MicroSimulation
+        sim = simulation(core, paths, departures, traffic_lights, edge_times).run(duration)
+
+        vehicles = []
+        node_ids = [str(node) for node in core.node_ids.tolist()]
+        arrivals, delays = sim.arrivals.tolist(), sim.delays().tolist()
+        for i, (route, trajectory) in enumerate(zip(routes, sim.trajectories())):
+            arrived = arrivals[i] == arrivals[i]
+            vehicles.append({
+                "id": route["id"],
+                "depart_time": float(departures[i]),
+                "arrival_time": arrivals[i] if arrived else None,
+                "delay": delays[i] if arrived else None,
+                "trajectory": [
+                    {"node_id": node_ids[index], "time": time}
+                    for index, time in trajectory
+                ]
+            })
+        return {"vehicles": vehicles, "stats": sim.stats()}
 
+    def _run_cell_transmission(self, core, paths, traffic_lights, incidents, duration):
+        """
+        Propagate the routed demand as flow with the cell transmission model.
+        Returns network totals, a timeline and per-road vehicles and flow (veh/h)
+        for every road the demand used.
+        """
+        departures = np.linspace(0, duration, len(paths), endpoint=False)
+        edge_times = self._incident_overlay(core, incidents).weights()
+        ctm = CellTransmissionModel(core, paths, departures, traffic_lights, edge_times).run(duration)
+
+        node_ids = [str(node) for node in core.node_ids.tolist()]
+        tails, heads = ctm.link_tail.tolist(), ctm.link_head.tolist()
+        density = ctm.link_density()
+        vehicles, outflow = density.tolist(), ctm.link_outflow.tolist()
+        hours = max(ctm.time, ctm.tick) / 3600
+        links = []
+        for link in np.flatnonzero((ctm.link_outflow > 0) | (density > 0)).tolist():
+            links.append({
+                "road_id": f"{node_ids[tails[link]]}-{node_ids[heads[link]]}",
+                "vehicles": vehicles[link],
+                "flow": outflow[link] / hours
+            })
+        return {"stats": ctm.stats(), "timeline": ctm.timeline, "links": links}
+
+    def _sample_pairs(self, core, count, rng=None):
+        """
+        `count` random (source, target) node index pairs with distinct ends,
+        drawn from `rng` (a random.Random) or the global random module
+        """
+        rng = rng or random
+        n = core.num_nodes
+        if n < 2:
+            return []
+
+        # Draw a distinct target in O(1) by skipping over the source
+        pairs = []
+        for _ in range(count):
+            source = rng.randrange(n)
+            target = rng.randrange(n - 1)
+            if target >= source:
+                target += 1
+            pairs.append((source, target))
+        return pairs
+
+    def _reroute_engine(self, G, count=5):
+        """
+        Rerouting engine for the loaded network, seeded with a random fleet
+        the first time and whenever the network changes
+        """
+        core = self.network_service.core_for(G)
+        if self.reroute_engine is None or self.reroute_engine.core is not core:
+            engine = RerouteEngine(core)
+            for i, (source, target) in enumerate(self._sample_pairs(core, count)):
+                engine.add_route(f"route-{i+1}", source, target)
+            self.reroute_engine = engine
+        return self.reroute_engine
+
+    def _engine_routes(self, engine):
+        """
+        Route dicts for every vehicle of the rerouting engine that has a path
+        """
+        routes = []
+        for route_id, route in engine.routes.items():
+            if route["nodes"] is not None:
+                routes.append(self._build_route(
+                    engine.core, route["nodes"], route["edges"], route_id, engine.weights
+                ))
         return routes
 
-    def _generate_routes_avoiding_incidents(self, G, count, incidents):
+    def _route_change(self, engine, change):
         """
-        Generate routes that avoid roads with incidents
+        Describe one re-routed vehicle with node IDs; a null path means unreachable
+        """
+        core = engine.core
+
+        def describe(route):
+            if route["nodes"] is None:
+                return None, None
+            return [str(core.node_id(index)) for index in route["nodes"]], route["cost"]
+
+        previous_path, previous_time = describe(change["before"])
+        path, travel_time = describe(change["after"])
+        return {
+            "id": change["id"],
+            "previous_path": previous_path,
+            "previous_travel_time": previous_time,
+            "path": path,
+            "travel_time": travel_time
+        }
+
+    def _incident_overlay(self, core, incidents):
+        """
+        WeightOverlay of incident slowdowns and closures over the shared core
+        """
+        return WeightOverlay(core, self._incident_factors(core, incidents))
+
+    def _incident_factors(self, core, incidents):
         """
-        G_routing = G.copy()
+        Travel-time multiplier per edge index for a list of incidents, matching
+        _apply_incident; several incidents on one road compound
+        """
+        factors = {}
+        for incident in incidents:
+            for edge in self._incident_edges(core, [incident]):
+                factor = float("inf") if incident.severity >= 0.99 else 1 / (1 - incident.severity)
+                factors[edge] = factors.get(edge, 1.0) * factor
+        return factors
+
+    def _incident_edges(self, core, incidents):
+        """
+        Edge indices in the compact core referenced by incident road IDs
+        """
+        edges = []
         for incident in incidents:
             road_parts = incident.road_id.split("-")
-            u, v = int(road_parts[0]), int(road_parts[1])
-            if G_routing.has_edge(u, v):
-                G_routing.remove_edge(u, v)
-        routes = []
-        nodes = list(G.nodes())
-        for _ in range(count):
-            if len(nodes) < 2:
-                continue
-            source = random.choice(nodes)
-            target = random.choice([n for n in nodes if n != source])
             try:
-                path = nx.shortest_path(G_routing, source=source, target=target, weight='travel_time')
-                travel_time = 0
-                for i in range(len(path)-1):
-                    u, v = path[i], path[i+1]
-                    edge_time = G[u][v]['travel_time']
-                    travel_time += edge_time
-                waypoints = []
-                cumulative_time = 0
-                for i in range(len(path)):
-                    node_data = G.nodes[path[i]]
-                    latitude = node_data.get("y")
-                    longitude = node_data.get("x")
-                    if latitude is None or longitude is None:
-                        node_id_num = int(path[i]) if str(path[i]).isdigit() else hash(str(path[i])) % 1000
-                        latitude = 40.7128 + (node_id_num % 10) * 0.01
-                        longitude = -74.0060 + (node_id_num // 10) * 0.01
-                    if i > 0:
-                        u, v = path[i-1], path[i]
-                        edge_time = G[u][v]['travel_time']
-                        cumulative_time += edge_time
-                    waypoints.append({
-                        "node_id": str(path[i]),
-                        "latitude": latitude,
-                        "longitude": longitude,
-                        "arrival_time": cumulative_time
-                    })
-                routes.append({
-                    "id": f"route-{len(routes)+1}",
-                    "source": str(source),
-                    "target": str(target),
-                    "path": [str(node) for node in path],
-                    "travel_time": travel_time,
-                    "waypoints": waypoints
-                })
-            except nx.NetworkXNoPath:
+                u = core.index_of(int(road_parts[0]))
+                v = core.index_of(int(road_parts[1]))
+            except KeyError:
                 continue
-        return routes
+            edge = core.find_edge(u, v)
+            if edge >= 0:
+                edges.append(edge)
+        return edges
+
+    def _build_route(self, core, path, edges, route_id, edge_times=None):
+        """
+        Build a route dict with waypoints from a path of node indices and its edges
+        """
+        if edge_times is None:
+            edge_times = core.weight_list("travel_time")
+        travel_time = 0
+        for edge in edges:
+            travel_time += edge_times[edge]
+
+        waypoints = []
+        cumulative_time = 0
+
+        for i, index in enumerate(path):
+            node = core.node_id(index)
+
+            # Ensure we have valid coordinates
+            latitude = core.y[index]
+            longitude = core.x[index]
+
+            # If coordinates are missing, generate some based on the node index
+            if np.isnan(latitude) or np.isnan(longitude):
+                # Generate deterministic coordinates based on node ID
+                # This ensures the same node always gets the same coordinates
+                node_id_num = int(node) if str(node).isdigit() else hash(str(node)) % 1000
+                latitude = 40.7128 + (node_id_num % 10) * 0.01  # Around NYC latitude
+                longitude = -74.0060 + (node_id_num // 10) * 0.01  # Around NYC longitude
+
+            # Calculate arrival time
+            if i > 0:
+                cumulative_time += edge_times[edges[i-1]]
+
+            waypoints.append({
+                "node_id": str(node),
+                "latitude": float(latitude),
+                "longitude": float(longitude),
+                "arrival_time": cumulative_time
+            })
+
+        return {
+            "id": route_id,
+            "source": str(core.node_id(path[0])),
+            "target": str(core.node_id(path[-1])),
+            "path": [str(core.node_id(index)) for index in path],
+            "travel_time": travel_time,
+            "waypoints": waypoints
+        }
 
     def _apply_incident(self, G, incident):
         """
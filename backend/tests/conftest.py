@@ -3,6 +3,10 @@ Pytest configuration file for fixtures.
 """
 
 import pytest
+from fastapi.testclient import TestClient
+from app.api import simulation as simulation_api
+from app.core.snapshot import SnapshotStore
+from app.main import app
 from tests.fixtures import (
     TestFixtures,
     basic_test_graph,
@@ -14,3 +18,10 @@ from tests.fixtures import (
 )
 
 # Re-export the fixtures to make them available to all test files
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """API client whose simulation service keeps graph snapshots in a temporary directory"""
+    monkeypatch.setattr(simulation_api.simulation_service.network_service, "snapshots",
+                        SnapshotStore(str(tmp_path)))
+    return TestClient(app)
@@ -0,0 +1,70 @@
+"""
+Graph and signal plan builders shared by the test modules.
+"""
+
+import json
+import random
+import networkx as nx
+from app.core.graph import CompactGraph
+
+def corridor(lengths, times):
+    """Straight road 0-1-2-... with the given edge lengths and travel times"""
+    G = nx.Graph()
+    for i, (length, time) in enumerate(zip(lengths, times)):
+        G.add_edge(i, i + 1, length=length, travel_time=time)
+    core = CompactGraph.from_networkx(G)
+    nodes = list(range(core.num_nodes))
+    edges = [core.find_edge(u, v) for u, v in zip(nodes, nodes[1:])]
+    return core, (nodes, edges)
+
+def light(node, come_from, start, green, cycle):
+    """Signal plan for one approach into `node`"""
+    return {"intersection_id": str(node), "total_cycle_time": cycle, "cycles": [{
+        "road_id": f"{node}-{come_from}", "green_start": start,
+        "green_duration": green, "yellow_duration": 0
+    }]}
+
+def random_road_graph(size, seed, directed=False):
+    """Perturbed grid with random travel times, some shortcuts and a few parallel edges"""
+    rng = random.Random(seed)
+    grid = nx.convert_node_labels_to_integers(nx.grid_2d_graph(size, size))
+    G = nx.MultiDiGraph() if directed else nx.MultiGraph()
+    G.add_nodes_from((n, {"x": float(n % size), "y": float(n // size)}) for n in grid.nodes)
+    for u, v in grid.edges:
+        if directed and rng.random() < 0.3:
+            u, v = v, u
+        G.add_edge(u, v, length=100.0, travel_time=rng.uniform(0.5, 3.0))
+        if directed and rng.random() < 0.7:
+            G.add_edge(v, u, length=100.0, travel_time=rng.uniform(0.5, 3.0))
+    for _ in range(size):
+        u, v = rng.sample(range(size * size), 2)
+        G.add_edge(u, v, length=300.0, travel_time=rng.uniform(2.0, 8.0))
+    return CompactGraph.from_networkx(G)
+
+def city_graph(size, seed, directed=False):
+    """Street grid in degrees whose travel times follow lengths at mixed speeds"""
+    rng = random.Random(seed)
+    grid = nx.convert_node_labels_to_integers(nx.grid_2d_graph(size, size))
+    G = nx.DiGraph() if directed else nx.Graph()
+    for n in grid.nodes:
+        G.add_node(n, x=73.0 + (n % size) * 0.001 + rng.uniform(-2e-4, 2e-4),
+                   y=31.4 + (n // size) * 0.001 + rng.uniform(-2e-4, 2e-4))
+    for u, v in grid.edges:
+        for a, b in ((u, v), (v, u)) if directed else ((u, v),):
+            if directed and rng.random() < 0.2:
+                continue
+            speed = rng.choice([30, 50, 70])
+            length = 110.0 * rng.uniform(1.0, 1.3)
+            G.add_edge(a, b, length=length, travel_time=length / (speed / 3.6))
+    return CompactGraph.from_networkx(G)
+
+def grid_graph(size=12):
+    """Square grid of unit roads with integer node IDs"""
+    G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(size, size))
+    for u, v in G.edges:
+        G[u][v].update(length=100, travel_time=10)
+    return G
+
+def read_geojson(chunks):
+    """Parse a streamed GeoJSON body (an iterable of byte chunks)"""
+    return json.loads(b"".join(chunks))
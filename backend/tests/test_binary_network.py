@@ -0,0 +1,86 @@
+"""
+Tests for the compact binary network format.
+"""
+
+import pytest
+import numpy as np
+import networkx as nx
+from fastapi.testclient import TestClient
+from app.api.network import _prefers_binary
+from app.core import binary_network
+from app.core.geojson_stream import encode_geojson
+from app.core.graph import CompactGraph
+from app.main import app
+
+client = TestClient(app)
+
+def grid_core(size):
+    """Compact graph of a size x size street grid with real-looking coordinates"""
+    G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(size, size))
+    for n in G.nodes:
+        G.nodes[n].update(x=74.3587 + (n % size) * 0.0009, y=31.5200 + (n // size) * 0.0009)
+    for i, (u, v) in enumerate(G.edges):
+        G.edges[u, v].update(length=100.0 + i % 7, travel_time=0.12 + (i % 5) * 0.01,
+                             name=f"Street {i % 20}")
+    return CompactGraph.from_networkx(G)
+
+def test_round_trip(complex_test_graph):
+    """Test that decoding restores coordinates, topology and attributes"""
+    core = CompactGraph.from_networkx(complex_test_graph)
+    decoded = binary_network.decode_network(binary_network.encode_network(core))
+
+    np.testing.assert_array_equal(decoded["node_ids"], core.node_ids)
+    np.testing.assert_allclose(decoded["x"], core.x, atol=1e-7)
+    np.testing.assert_allclose(decoded["y"], core.y, atol=1e-7)
+    np.testing.assert_array_equal(decoded["edges"][:, 0], core.edge_u)
+    np.testing.assert_array_equal(decoded["edges"][:, 1], core.edge_v)
+    np.testing.assert_array_equal(decoded["travel_time"], core.travel_time)
+    assert [decoded["names"][i] for i in decoded["name_ids"]] == \
+        [core.names[i] for i in core.name_ids]
+
+def test_round_trip_string_ids():
+    """Test graphs whose node IDs are not integers"""
+    G = nx.Graph()
+    G.add_node("a", x=1.0, y=2.0)
+    G.add_node("b", x=1.5, y=2.5)
+    G.add_edge("a", "b", length=10, travel_time=1)
+    decoded = binary_network.decode_network(
+        binary_network.encode_network(CompactGraph.from_networkx(G))
+    )
+    assert decoded["node_ids"] == ["a", "b"]
+    assert decoded["name_ids"].tolist() == [-1]
+
+def test_binary_is_much_smaller_than_geojson():
+    """Test the payload is an order of magnitude smaller than GeoJSON"""
+    core = grid_core(50)
+    binary = binary_network.encode_network(core)
+    assert len(binary) * 10 < len(encode_geojson(core))
+
+def test_decode_rejects_other_payloads():
+    """Test that foreign payloads are refused"""
+    with pytest.raises(ValueError):
+        binary_network.decode_network(b"{" * 64)
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, False),
+    ("application/json", False),
+    ("*/*", False),
+    (binary_network.MEDIA_TYPE, True),
+    (f"{binary_network.MEDIA_TYPE}, application/geo+json;q=0.5", True),
+    (f"application/geo+json, {binary_network.MEDIA_TYPE};q=0.5", False),
+    (f"{binary_network.MEDIA_TYPE};q=0", False),
+])
+def test_accept_negotiation(accept, expected):
+    """Test Accept header negotiation between GeoJSON and binary"""
+    assert _prefers_binary(accept) is expected
+
+def test_sample_endpoint_serves_binary():
+    """Test that the sample network endpoint honours the binary Accept header"""
+    response = client.get("/network/sample", headers={"Accept": binary_network.MEDIA_TYPE})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == binary_network.MEDIA_TYPE
+    assert "Accept" in response.headers["vary"]
+
+    decoded = binary_network.decode_network(response.content)
+    assert len(decoded["node_ids"]) == 4
+    assert len(decoded["edges"]) == 4
@@ -0,0 +1,103 @@
+"""
+Tests for contraction hierarchy routing.
+"""
+
+import random
+import pytest
+import networkx as nx
+from app.core import config
+from app.core.contraction import ContractionHierarchy
+from app.core.graph import CompactGraph
+from app.core.snapshot import SnapshotStore
+from app.services.network_service import NetworkService
+from tests.helpers import random_road_graph
+
+def path_cost(core, nodes, edges):
+    """Travel time of a path, checking that consecutive edges really connect the nodes"""
+    assert len(nodes) == len(edges) + 1
+    for (u, v), e in zip(zip(nodes, nodes[1:]), edges):
+        ends = (core.edge_u[e], core.edge_v[e])
+        assert ends == (u, v) or (not core.directed and ends == (v, u))
+    return sum(float(core.travel_time[e]) for e in edges)
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_queries_match_dijkstra(directed):
+    """Test that hierarchy queries return valid paths as short as Dijkstra's"""
+    core = random_road_graph(12, seed=7, directed=directed)
+    ch = ContractionHierarchy.build(core)
+    assert ch.num_shortcuts > 0
+
+    rng = random.Random(1)
+    for _ in range(150):
+        s, t = rng.randrange(core.num_nodes), rng.randrange(core.num_nodes)
+        dist, _ = core.dijkstra(s, target=t)
+        if t not in dist:
+            with pytest.raises(nx.NetworkXNoPath):
+                ch.shortest_path(s, t)
+            continue
+        nodes, edges = ch.shortest_path(s, t)
+        assert nodes[0] == s and nodes[-1] == t
+        assert path_cost(core, nodes, edges) == pytest.approx(dist[t])
+        assert ch.distance(s, t) == pytest.approx(dist[t])
+
+def test_disconnected_nodes_have_no_path():
+    """Test that separate components stay unreachable"""
+    G = nx.Graph()
+    G.add_edge(1, 2, travel_time=1.0)
+    G.add_edge(3, 4, travel_time=1.0)
+    core = CompactGraph.from_networkx(G)
+    ch = ContractionHierarchy.build(core)
+    with pytest.raises(nx.NetworkXNoPath):
+        ch.shortest_path(0, 2)
+
+def test_closed_edges_fall_back_to_dijkstra():
+    """Test that closures on the hierarchy's path reroute and other closures do not"""
+    core = random_road_graph(10, seed=3)
+    core.contraction = ContractionHierarchy.build(core)
+    nodes, edges = core.shortest_path(0, core.num_nodes - 1)
+
+    closed = {edges[len(edges) // 2]}
+    detour_nodes, detour_edges = core.shortest_path(0, core.num_nodes - 1, closed=closed)
+    assert closed.isdisjoint(detour_edges)
+    dist, _ = core.dijkstra(0, target=core.num_nodes - 1, weights=[
+        float("inf") if e in closed else float(w) for e, w in enumerate(core.travel_time)
+    ])
+    assert path_cost(core, detour_nodes, detour_edges) == pytest.approx(dist[core.num_nodes - 1])
+
+    unused = set(range(core.num_edges)) - set(edges)
+    assert core.shortest_path(0, core.num_nodes - 1, closed={min(unused)}) == (nodes, edges)
+
+def test_save_and_load_round_trip(tmp_path):
+    """Test that persisted hierarchies reload only for the graph they were built on"""
+    core = random_road_graph(8, seed=5)
+    ch = ContractionHierarchy.build(core)
+    path = ch.save(str(tmp_path / "ch"))
+
+    loaded = ContractionHierarchy.load(path, core.fingerprint())
+    assert loaded is not None
+    assert loaded.shortest_path(0, core.num_nodes - 1) == ch.shortest_path(0, core.num_nodes - 1)
+    assert ContractionHierarchy.load(path, "another-graph") is None
+    assert ContractionHierarchy.load(str(tmp_path / "missing")) is None
+
+def test_prepare_routing_builds_once_and_persists(tmp_path, monkeypatch):
+    """Test that the network service attaches, persists and reuses hierarchies"""
+    monkeypatch.setattr(config, "CONTRACTION_MIN_EDGES", 50)
+    service = NetworkService()
+    service.snapshots = SnapshotStore(str(tmp_path))
+
+    small = CompactGraph.from_networkx(nx.path_graph(5))
+    assert service.prepare_routing(small) is None
+
+    core = random_road_graph(8, seed=5)
+    # The first request only schedules the build and keeps routing with Dijkstra
+    assert service.prepare_routing(core) is None
+    assert core.contraction is None
+    ch = service.prepare_routing(core, wait=True)
+    assert ch is not None and core.contraction is ch
+    assert (tmp_path / "contraction" / core.fingerprint() / "meta.json").exists()
+
+    builds = []
+    monkeypatch.setattr(ContractionHierarchy, "build", classmethod(lambda cls, c: builds.append(c)))
+    reloaded = random_road_graph(8, seed=5)
+    assert service.prepare_routing(reloaded) is not None
+    assert builds == []
@@ -0,0 +1,102 @@
+"""
+Tests for green-wave coordination along arterials.
+"""
+
+import time
+import networkx as nx
+import numpy as np
+from app.core.coordination import GreenWave, circular_overlap, find_arterials
+from app.core.graph import CompactGraph
+from app.core.microsim import MicroSimulation
+from app.services.simulation_service import SimulationService
+
+def main_street(signals, name="Main Street"):
+    """Arterial 0..signals+1 with a side street at every interior node, and its default lights"""
+    G = nx.Graph()
+    for i in range(signals + 1):
+        G.add_edge(i, i + 1, length=300, travel_time=20 + (i % 3) * 5, name=name)
+    for i in range(1, signals + 1):
+        G.add_edge(i, 1000 + i, length=100, travel_time=10, name=f"Side {i}")
+    core = CompactGraph.from_networkx(G)
+    service = SimulationService()
+    service.network_service.core_for = lambda graph: core
+    return core, service._generate_default_traffic_light_timings(G)
+
+def test_find_arterials_splits_at_forks():
+    """Test that arterials follow one road name and break where it forks"""
+    G = nx.Graph()
+    nx.add_path(G, [1, 2, 3, 4, 5], name="High Street", length=100, travel_time=10)
+    G.add_edge(3, 6, name="High Street", length=100, travel_time=10)
+    nx.add_path(G, [7, 3, 8], name="Mill Lane", length=100, travel_time=10)
+    nx.add_cycle(G, [10, 11, 12, 13], name="Ring", length=100, travel_time=10)
+    core = CompactGraph.from_networkx(G)
+
+    chains = {}
+    for arterial in find_arterials(core, min_nodes=2):
+        ids = [core.node_id(n) for n in arterial.nodes]
+        chains.setdefault(arterial.name, []).append(ids if ids[0] < ids[-1] else ids[::-1])
+        assert len(arterial.edges) == len(arterial.nodes) - 1
+    assert sorted(chains["High Street"]) == [[1, 2, 3], [3, 4, 5], [3, 6]]
+    assert chains["Mill Lane"] == [[7, 3, 8]]
+    assert len(chains["Ring"]) == 1 and len(chains["Ring"][0]) == 5
+
+def test_circular_overlap_wraps_around_the_cycle():
+    """Test window overlap modulo the cycle"""
+    assert circular_overlap(0, 30, 20, 30, 100) == 10
+    assert circular_overlap(90, 20, 0, 30, 100) == 10
+    assert circular_overlap(0, 30, 40, 30, 100) == 0
+
+def test_green_wave_on_fifty_signal_corridor():
+    """Test that a 50-signal corridor is coordinated quickly and vehicles mostly meet green"""
+    core, lights = main_street(50)
+    started = time.perf_counter()
+    coordinated, corridors = GreenWave(core, lights).coordinate()
+    assert time.perf_counter() - started < 1.0
+
+    assert len(corridors) == 1
+    corridor = corridors[0]
+    assert corridor["name"] == "Main Street" and len(corridor["intersections"]) == 50
+    for direction in ("outbound", "inbound"):
+        assert corridor["green_arrivals"][direction] > corridor["uncoordinated_green_arrivals"][direction]
+
+    # A vehicle driving the whole street loses less time at signals in both directions
+    nodes = [core.index_of(i) for i in range(52)]
+    edges = [core.find_edge(u, v) for u, v in zip(nodes, nodes[1:])]
+    for path in ((nodes, edges), (nodes[::-1], edges[::-1])):
+        before = MicroSimulation(core, [path], [0.0], lights).run(10000).stats()["mean_delay"]
+        after = MicroSimulation(core, [path], [0.0], coordinated).run(10000).stats()["mean_delay"]
+        assert after < before
+
+def test_shared_signal_keeps_a_consistent_plan():
+    """Test that crossing corridors share one cycle and phases still tile it"""
+    G = nx.Graph()
+    nx.add_path(G, [1, 2, 3, 4, 5], name="East Road", length=200, travel_time=20)
+    nx.add_path(G, [11, 12, 3, 13, 14], name="North Road", length=150, travel_time=15)
+    G.add_edge(2, 22, name="Spur", length=100, travel_time=10)
+    core = CompactGraph.from_networkx(G)
+    service = SimulationService()
+    service.network_service.core_for = lambda graph: core
+    lights = service._generate_default_traffic_light_timings(G)
+
+    coordinated, corridors = GreenWave(core, lights).coordinate()
+    assert len(corridors) == 2
+    assert corridors[0]["cycle"] == corridors[1]["cycle"] == 140
+    assert "3" in corridors[0]["intersections"] and "3" in corridors[1]["intersections"]
+    for light in coordinated:
+        green = sorted((c["green_start"], c["green_duration"] + c["yellow_duration"]) for c in light["cycles"])
+        spans = sum(span for _, span in green)
+        assert spans == light["total_cycle_time"]
+        assert all(0 <= start < light["total_cycle_time"] for start, _ in green)
+
+def test_complex_simulation_green_wave(client):
+    """Test that /simulate/complex can coordinate its signal plans"""
+    response = client.post("/simulate/complex", json={
+        "vehicles_count": 10, "duration": 300, "green_wave": True, "signal_timing": "webster"
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert isinstance(data["corridors"], list)
+    offsets = {light["intersection_id"]: light.get("offset") for light in data["traffic_lights"]}
+    for corridor in data["corridors"]:
+        assert len(corridor["offsets"]) == len(corridor["intersections"])
+        assert all(offsets[node] is not None for node in corridor["intersections"])
@@ -0,0 +1,87 @@
+"""
+Tests for the cell transmission model engine.
+"""
+
+import numpy as np
+import networkx as nx
+import pytest
+from app.core.ctm import CellTransmissionModel
+from app.core.graph import CompactGraph
+from tests.helpers import corridor, light
+
+def test_vehicles_are_conserved():
+    """Test that every departed vehicle is waiting, in the network or has exited"""
+    core, path = corridor([150, 150, 150], [10, 10, 10])
+    ctm = CellTransmissionModel(core, [path] * 200, np.linspace(0, 100, 200)).run(150)
+    stats = ctm.stats()
+    assert stats["entered"] + stats["waiting_at_origins"] == pytest.approx(200)
+    assert stats["entered"] == pytest.approx(stats["exited"] + stats["in_network"])
+    assert np.all(ctm.density >= -1e-9)
+    assert np.all(ctm.density <= ctm.jam + 1e-9)
+
+def test_light_demand_flows_at_free_flow_speed():
+    """Test that a lone vehicle leaves after about the free-flow time"""
+    core, path = corridor([150, 150], [10, 10])
+    ctm = CellTransmissionModel(core, [path], [0.0]).run(60)
+    assert ctm.stats()["exited"] == pytest.approx(1.0)
+    # A cell passes half a vehicle per tick, so the last half leaves one tick late
+    assert ctm.stats()["total_travel_time"] == pytest.approx(20.5)
+
+def test_red_light_stores_vehicles_upstream():
+    """Test that a permanently red approach lets nothing past and queues up to jam density"""
+    core, path = corridor([150, 150], [10, 10])
+    red = light(1, 0, 1000, 1, 2000)
+    ctm = CellTransmissionModel(core, [path] * 100, np.zeros(100), [red]).run(120)
+    stats = ctm.stats()
+    assert stats["exited"] == 0
+    assert stats["in_network"] == pytest.approx(ctm.jam[:ctm.link_last[0] + 1].sum(), rel=0.05)
+    assert stats["waiting_at_origins"] > 0
+
+def test_discharge_is_capped_at_saturation_flow():
+    """Test that a saturated road discharges one vehicle per headway"""
+    core, path = corridor([150, 150], [10, 10])
+    ctm = CellTransmissionModel(core, [path] * 2000, np.zeros(2000), headway=2.0).run(600)
+    rates = np.diff([sample["exited"] for sample in ctm.timeline]) / 60
+    assert rates[-1] == pytest.approx(0.5, rel=0.05)
+
+def test_every_road_gets_cells_and_unused_links_split_evenly():
+    """Test that the whole graph is modelled and unused links turn evenly, without U-turns"""
+    core, path = corridor([150, 150], [10, 10])
+    ctm = CellTransmissionModel(core, [path], [0.0])
+    assert len(ctm.links) == 2 * core.num_edges
+    assert len(ctm.link_first) == 2 * core.num_edges and ctm.num_cells >= 2 * core.num_edges
+
+    movements = {}
+    for m_from, m_to, share in zip(ctm.m_from, ctm.m_to, ctm.m_share):
+        tail, head = int(ctm.link_tail[m_from]), int(ctm.link_head[m_from])
+        to = None if m_to < 0 else (int(ctm.link_tail[m_to]), int(ctm.link_head[m_to]))
+        movements.setdefault((tail, head), {})[to] = share
+    # The fleet drives 0 -> 1 -> 2 and leaves at 2; the way back was never used
+    assert movements[(0, 1)] == {(1, 2): 1.0}
+    assert movements[(1, 2)] == {None: 1.0}
+    assert movements[(2, 1)] == {(1, 0): 1.0}
+    assert movements[(1, 0)] == {None: 1.0}
+
+    # At a junction an unused link splits over every other way on
+    G = nx.Graph()
+    for u, v in [(0, 1), (1, 2), (1, 3)]:
+        G.add_edge(u, v, length=150, travel_time=10)
+    core = CompactGraph.from_networkx(G)
+    ctm = CellTransmissionModel(core, [([0, 1, 2], [0, 1])], [0.0])
+    from_2 = [int(ctm.link_head[m]) for m, src in zip(ctm.m_to, ctm.m_from)
+              if (ctm.link_tail[src], ctm.link_head[src]) == (2, 1)]
+    assert sorted(from_2) == [0, 3]
+    assert ctm.m_share[ctm.link_tail[ctm.m_from] == 2].tolist() == [0.5, 0.5]
+
+def test_complex_simulation_ctm_engine(client):
+    """Test that /simulate/complex can run the cell transmission model"""
+    response = client.post("/simulate/complex", json={
+        "vehicles_count": 20, "duration": 300, "engine": "ctm"
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["engine"] == "ctm"
+    assert data["stats"]["vehicles"] <= 20
+    assert data["timeline"][-1]["time"] == 300
+    for link in data["links"]:
+        assert "-" in link["road_id"] and link["flow"] >= 0
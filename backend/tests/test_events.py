@@ -0,0 +1,88 @@
+"""
+Tests for the discrete-event simulation engine.
+"""
+
+import random
+import numpy as np
+import pytest
+import networkx as nx
+from app.core.events import EventSimulation
+from app.core.graph import unwind_path
+from app.core.microsim import MicroSimulation
+from app.services.simulation_service import SimulationService
+from tests.helpers import corridor
+
+def signalized_grid(size, vehicles, seed):
+    """Grid with default signal plans and a fleet of random shortest paths"""
+    grid = nx.convert_node_labels_to_integers(nx.grid_2d_graph(size, size))
+    G = nx.Graph()
+    G.add_nodes_from((n, {"x": float(n % size), "y": float(n // size)}) for n in grid.nodes)
+    G.add_edges_from(grid.edges, length=150.0, travel_time=12.0)
+    service = SimulationService()
+    service.network_service.current_graph = G
+    core = service.network_service.current_core
+    lights = service._generate_default_traffic_light_timings(G)
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(vehicles):
+        s, t = rng.randrange(core.num_nodes), rng.randrange(core.num_nodes)
+        _, pred = core.dijkstra(s, target=t)
+        paths.append(unwind_path(pred, t))
+    return core, lights, paths
+
+@pytest.mark.parametrize("seed", [2, 3, 4])
+def test_matches_time_stepped_run(seed):
+    """Test that the event engine reproduces the tick engine on whole-second inputs"""
+    core, lights, paths = signalized_grid(8, 400, seed=seed)
+    departures = np.floor(np.linspace(0, 600, len(paths), endpoint=False))
+    ticked = MicroSimulation(core, paths, departures, lights).run(3600)
+    evented = EventSimulation(core, paths, departures, lights).run(3600)
+    assert np.isnan(ticked.arrivals).sum() == 0
+    # Same-time arrivals at a stop line included: both queue them in vehicle order
+    assert evented.node_times.tolist() == ticked.node_times.tolist()
+
+def test_freed_storage_is_taken_at_once():
+    """Test the documented divergence: space on a full road is reused without waiting for the next tick"""
+    core, path = corridor([100, 7.5, 100], [10, 50, 10])
+    ticked = MicroSimulation(core, [path] * 2, [0.0, 0.0], headway=0.5).run(300)
+    evented = EventSimulation(core, [path] * 2, [0.0, 0.0], headway=0.5).run(300)
+    # The 7.5m road holds one vehicle; the first leaves it at t=60
+    assert ticked.node_times[ticked.fleet.first + 1].tolist() == [10.0, 61.0]
+    assert evented.node_times[evented.fleet.first + 1].tolist() == [10.0, 60.0]
+    assert (ticked.arrivals - evented.arrivals).tolist() == [0.0, 1.0]
+
+def test_sparse_demand_needs_few_events():
+    """Test that an idle network costs nothing between vehicles"""
+    core, lights, paths = signalized_grid(8, 5, seed=1)
+    departures = [0.0, 7200.0, 14400.0, 21600.0, 28000.0]
+    sim = EventSimulation(core, paths, departures, lights).run(8 * 3600)
+    assert sim.stats()["arrived"] == 5
+    assert sim.events < 20 * sum(len(edges) for _, edges in paths)
+    ticked = MicroSimulation(core, paths, departures, lights).run(8 * 3600)
+    assert sim.arrivals.tolist() == ticked.arrivals.tolist()
+
+def test_timed_closure_holds_vehicles_until_cleared():
+    """Test that a closed road is entered only once its incident clears"""
+    core, path = corridor([100, 100], [10, 10])
+    closure = (path[1][1], float("inf"), 5.0, 40.0)
+    sim = EventSimulation(core, [path], [0.0], incidents=[closure]).run(100)
+    assert sim.trajectories()[0][1][1] == 40.0
+    assert sim.arrivals[0] == 50.0
+
+def test_timed_slowdown_applies_while_active():
+    """Test that a slowdown affects vehicles entering the road during the incident"""
+    core, path = corridor([100, 100], [10, 10])
+    slowdown = (path[1][0], 3.0, 0.0, 15.0)
+    sim = EventSimulation(core, [path] * 2, [0.0, 25.0], incidents=[slowdown]).run(100)
+    assert sim.arrivals.tolist() == [40.0, 45.0]
+
+def test_complex_simulation_event_engine(client):
+    """Test that /simulate/complex can run the event-driven engine"""
+    response = client.post("/simulate/complex", json={
+        "vehicles_count": 6, "duration": 600, "engine": "event"
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["engine"] == "event"
+    assert data["stats"]["events"] > 0
+    assert len(data["vehicles"]) == len(data["routes"])
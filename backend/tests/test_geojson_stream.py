@@ -0,0 +1,83 @@
+"""
+Tests for the streaming GeoJSON encoder.
+"""
+
+import json
+import pytest
+import geojson
+import networkx as nx
+from fastapi.testclient import TestClient
+from app.core.geojson_stream import encode_geojson, iter_geojson
+from app.core.graph import CompactGraph
+from app.main import app
+
+client = TestClient(app)
+
+def legacy_geojson(G):
+    """FeatureCollection built feature by feature with the geojson package"""
+    features = []
+    for node, data in G.nodes(data=True):
+        features.append(geojson.Feature(geometry=geojson.Point((data["x"], data["y"])), properties={
+            "id": str(node), "type": "intersection"
+        }))
+    for u, v, data in G.edges(data=True):
+        coords = [(G.nodes[u]["x"], G.nodes[u]["y"]), (G.nodes[v]["x"], G.nodes[v]["y"])]
+        features.append(geojson.Feature(geometry=geojson.LineString(coords), properties={
+            "id": f"{u}-{v}",
+            "source": str(u),
+            "target": str(v),
+            "length": data["length"],
+            "travel_time": data["travel_time"],
+            "name": data.get("name", "Unknown Road"),
+            "type": "road"
+        }))
+    return json.loads(geojson.dumps(geojson.FeatureCollection(features)))
+
+def test_stream_matches_geojson_package(complex_test_graph):
+    """Test that the streamed bytes decode to the same FeatureCollection"""
+    core = CompactGraph.from_networkx(complex_test_graph)
+    assert json.loads(encode_geojson(core)) == legacy_geojson(complex_test_graph)
+
+def test_stream_is_chunked():
+    """Test that large graphs are emitted as several bounded chunks"""
+    G = nx.grid_2d_graph(40, 40)
+    G = nx.convert_node_labels_to_integers(G)
+    for n in G.nodes:
+        G.nodes[n].update(x=74.0 + n * 1e-4, y=31.0 + n * 1e-4)
+    for u, v in G.edges:
+        G.edges[u, v].update(length=100.5, travel_time=0.1234)
+    core = CompactGraph.from_networkx(G)
+
+    chunks = list(iter_geojson(core, chunk_size=4096))
+    assert len(chunks) > 10
+    assert max(len(c) for c in chunks) < 4096 + 1024
+
+    data = json.loads(b"".join(chunks))
+    assert len(data["features"]) == G.number_of_nodes() + G.number_of_edges()
+    road = next(f for f in data["features"] if f["properties"]["type"] == "road")
+    assert road["properties"]["travel_time"] == 0.1234
+    assert road["properties"]["name"] == "Unknown Road"
+
+def test_stream_encodes_blocked_roads_as_null(basic_test_graph):
+    """Test that non-finite travel times stay valid JSON"""
+    basic_test_graph[1][2]["travel_time"] = float("inf")
+    data = json.loads(encode_geojson(CompactGraph.from_networkx(basic_test_graph)))
+    road = next(f for f in data["features"] if f["properties"]["id"] == "1-2")
+    assert road["properties"]["travel_time"] is None
+
+def test_empty_network_streams_empty_collection():
+    """Test encoding a graph without nodes"""
+    assert json.loads(encode_geojson(CompactGraph.empty())) == {
+        "type": "FeatureCollection", "features": []
+    }
+
+@pytest.mark.parametrize("path, count", [
+    ("/network/sample", 8),
+    ("/network/square-intersection", 16),
+])
+def test_network_endpoints_stream_geojson(path, count):
+    """Test that network endpoints respond with streamed GeoJSON"""
+    response = client.get(path)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/geo+json")
+    assert len(response.json()["features"]) == count
@@ -0,0 +1,103 @@
+"""
+Tests for the array-backed (CSR) graph core.
+"""
+
+import pytest
+import numpy as np
+import networkx as nx
+from app.core.graph import CompactGraph
+from app.services.network_service import NetworkService
+from tests.fixtures import TestFixtures
+
+def test_compact_graph_layout(complex_test_graph):
+    """Test that the compact graph uses dense int32 indices and float32 columns"""
+    core = CompactGraph.from_networkx(complex_test_graph)
+
+    assert core.num_nodes == 10
+    assert core.num_edges == 16
+    assert core.indices.dtype == np.int32
+    assert core.adj_edges.dtype == np.int32
+    assert core.travel_time.dtype == np.float32
+    assert core.length.dtype == np.float32
+
+    # Undirected edges appear once per direction in the CSR arrays
+    assert core.indptr[-1] == 2 * core.num_edges
+
+def test_compact_graph_matches_networkx_adjacency(complex_test_graph):
+    """Test that degrees and neighbor order match NetworkX"""
+    G = complex_test_graph
+    core = CompactGraph.from_networkx(G)
+
+    degrees = core.degree()
+    for node, degree in G.degree():
+        index = core.index_of(node)
+        assert degrees[index] == degree
+
+        neighbors = [core.node_id(n) for n in core.neighbors(index)]
+        assert neighbors == [v for _, v in G.edges(node)]
+
+def test_compact_graph_shortest_paths_match_networkx(complex_test_graph):
+    """Test that CSR Dijkstra finds paths as short as NetworkX"""
+    G = complex_test_graph
+    core = CompactGraph.from_networkx(G)
+
+    for source in G.nodes():
+        lengths = nx.single_source_dijkstra_path_length(G, source, weight='travel_time')
+        for target, expected in lengths.items():
+            if target == source:
+                continue
+            path, edges = core.shortest_path(core.index_of(source), core.index_of(target))
+            assert core.node_id(path[0]) == source
+            assert core.node_id(path[-1]) == target
+            assert len(edges) == len(path) - 1
+            assert sum(core.travel_time[e] for e in edges) == pytest.approx(expected)
+
+def test_compact_graph_closed_edges(basic_test_graph):
+    """Test that infinite weights close an edge"""
+    core = CompactGraph.from_networkx(basic_test_graph)
+    u, v = core.index_of(1), core.index_of(3)
+
+    weights = list(core.weight_list("travel_time"))
+    weights[core.find_edge(u, v)] = float("inf")
+
+    path, _ = core.shortest_path(u, v, weights=weights)
+    assert [core.node_id(n) for n in path] == [1, 2, 3]
+
+def test_compact_graph_no_path():
+    """Test that unreachable targets raise NetworkXNoPath"""
+    G = nx.Graph()
+    G.add_edge(1, 2, travel_time=5)
+    G.add_node(3)
+    core = CompactGraph.from_networkx(G)
+
+    with pytest.raises(nx.NetworkXNoPath):
+        core.shortest_path(core.index_of(1), core.index_of(3))
+
+    with pytest.raises(KeyError):
+        core.index_of(42)
+
+def test_compact_graph_networkx_view(dynamic_test_graph):
+    """Test that the NetworkX view round-trips nodes, edges and attributes"""
+    core = CompactGraph.from_networkx(dynamic_test_graph)
+    G = core.to_networkx()
+
+    assert set(G.nodes()) == set(dynamic_test_graph.nodes())
+    assert G.number_of_edges() == dynamic_test_graph.number_of_edges()
+    for u, v, data in dynamic_test_graph.edges(data=True):
+        assert G[u][v]['travel_time'] == data['travel_time']
+        assert G[u][v]['name'] == data['name']
+    assert G.nodes[1]['x'] == dynamic_test_graph.nodes[1]['x']
+
+def test_network_service_builds_core_on_load():
+    """Test that loading a network builds the compact core once"""
+    service = NetworkService()
+    service.get_sample_network()
+
+    core = service.current_core
+    assert core is not None
+    assert core is service.current_core
+    assert core.num_nodes == service.current_graph.number_of_nodes()
+
+    # Assigning a new graph invalidates the core
+    service.current_graph = TestFixtures.create_basic_test_graph()
+    assert service.current_core.num_nodes == 3
@@ -4,13 +4,16 @@ Tests for graph loading and weighting functionality.
 
 import pytest
 import networkx as nx
+from app.core.geojson_stream import iter_geojson
+from app.core.graph import CompactGraph
 from app.services.network_service import NetworkService
 from tests.fixtures import TestFixtures
+from tests.helpers import read_geojson
 
 def test_sample_network_creation():
     """Test that the sample network is created correctly"""
     service = NetworkService()
-    network = service.get_sample_network()
+    network = read_geojson(service.get_sample_network())
     
     # Check that the network is a GeoJSON FeatureCollection
     assert network is not None
@@ -41,13 +44,11 @@ def test_graph_has_travel_time_weights():
 
 def test_graph_to_geojson_conversion():
     """Test conversion of graph to GeoJSON"""
-    service = NetworkService()
-    
     # Create a test graph
     G = TestFixtures.create_basic_test_graph()
     
     # Convert to GeoJSON
-    geojson = service._graph_to_geojson(G)
+    geojson = read_geojson(iter_geojson(CompactGraph.from_networkx(G)))
     
     # Check GeoJSON structure
     assert geojson is not None
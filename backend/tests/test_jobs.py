@@ -0,0 +1,124 @@
+"""
+Tests for the background simulation job queue and its endpoints.
+"""
+
+import json
+import threading
+import time
+import pytest
+from app.api import jobs as jobs_api
+from app.core.jobs import CANCELLED, FAILED, SUCCEEDED, TIMED_OUT, JobQueue, QueueFull, checkpoint
+
+def wait(job, timeout=10):
+    """Block until a job has finished"""
+    deadline = time.time() + timeout
+    while job.snapshot()["state"] not in (SUCCEEDED, FAILED, CANCELLED, TIMED_OUT):
+        assert time.time() < deadline
+        time.sleep(0.01)
+    return job.snapshot(include_result=True)
+
+def steps(count, delay=0.0):
+    """Job function that reports `count` steps and returns their count"""
+    def run(progress):
+        for i in range(count):
+            progress(i, count, "step")
+            time.sleep(delay)
+        return count
+    return run
+
+def test_job_runs_and_reports_progress():
+    """Test that a job returns its result and keeps its last progress"""
+    queue = JobQueue(workers=1)
+    status = wait(queue.submit("test", steps(3)))
+    assert status["state"] == SUCCEEDED and status["result"] == 3
+    assert status["progress"] == {"done": 2, "total": 3, "stage": "step"}
+    failed = wait(queue.submit("test", lambda progress: 1 / 0))
+    assert failed["state"] == FAILED and "division" in failed["error"]
+    queue.shutdown()
+
+def test_cancel_queued_and_running_jobs():
+    """Test that queued jobs never start and running jobs stop at their next report"""
+    queue = JobQueue(workers=1)
+    release = threading.Event()
+
+    def blocked(progress):
+        progress(0, 2)
+        release.wait(5)
+        progress(1, 2)
+        return "too late"
+
+    running = queue.submit("test", blocked)
+    queued = queue.submit("test", steps(1))
+    assert queued.cancel() and queued.snapshot()["state"] == CANCELLED
+    assert running.cancel()
+    release.set()
+    status = wait(running)
+    assert status["state"] == CANCELLED and status["result"] is None
+    assert not running.cancel()
+    queue.shutdown()
+
+def test_timeouts_and_bounded_queue():
+    """Test per-job timeouts and refusing jobs once the queue is full"""
+    queue = JobQueue(workers=1, max_pending=2, max_finished=1)
+    slow = queue.submit("test", steps(100, 0.01), timeout=0.05)
+    queue.submit("test", steps(1))
+    with pytest.raises(QueueFull):
+        queue.submit("test", steps(1))
+    assert wait(slow)["state"] == TIMED_OUT
+    time.sleep(0.05)
+    queue.submit("test", steps(1))
+    # Only the most recent finished job is kept
+    assert len(queue.jobs()) <= 2
+    queue.shutdown()
+
+def test_stopped_jobs_hold_their_slot_until_they_return():
+    """Test that checkpoints stop inner loops and stopping jobs still count as active"""
+    queue = JobQueue(workers=2, max_pending=1)
+    release = threading.Event()
+
+    def stuck(progress):
+        release.wait(5)
+        return "ignored"
+
+    job = queue.submit("test", stuck, timeout=0.01)
+    time.sleep(0.05)
+    assert job.snapshot()["state"] == TIMED_OUT
+    with pytest.raises(QueueFull):
+        queue.submit("test", steps(1))
+    release.set()
+    job.future.result(5)
+    queue.submit("test", steps(1)).future.result(5)
+
+    ticks = []
+
+    def loop(progress):
+        while True:
+            checkpoint()
+            ticks.append(None)
+
+    looping = queue.submit("test", loop, timeout=0.05)
+    looping.future.result(5)
+    assert looping.snapshot()["state"] == TIMED_OUT and ticks
+    checkpoint()
+    queue.shutdown()
+
+def test_job_endpoints(client):
+    """Test submitting, streaming, fetching and cancelling jobs over the API"""
+    response = client.post("/jobs/replicates", json={"replicates": 3, "vehicles_count": 4, "seed": 5})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    with client.stream("GET", f"/jobs/{job_id}/events", params={"interval": 0.01}) as stream:
+        events = [json.loads(line) for line in stream.iter_lines() if line]
+    assert events[-1]["state"] == SUCCEEDED
+
+    result = client.get(f"/jobs/{job_id}/result").json()
+    assert result["seed"] == 5 and result["replicates"] == 3
+    assert client.get(f"/jobs/{job_id}").json()["progress"]["total"] == 3
+    assert client.delete(f"/jobs/{job_id}").status_code == 409
+    assert client.get("/jobs/missing").status_code == 404
+
+    failed = client.post("/jobs/complex", json={"engine": "warp"}).json()
+    wait(jobs_api.job_queue.get(failed["id"]))
+    assert client.get(f"/jobs/{failed['id']}/result").status_code == 409
+    assert any(job["id"] == job_id for job in client.get("/jobs/").json())
@@ -0,0 +1,118 @@
+"""
+Tests for many-to-many travel-time matrices.
+"""
+
+import random
+import pytest
+import numpy as np
+import networkx as nx
+from fastapi.testclient import TestClient
+from app.core import matrix as matrix_format
+from app.core.contraction import ContractionHierarchy
+from app.core.graph import CompactGraph
+from app.core.matrix import nearest_nodes, travel_time_matrix
+from app.main import app
+
+client = TestClient(app)
+
+def random_network(size, seed, directed=False):
+    """Grid with random travel times; directed graphs drop some reverse edges"""
+    rng = random.Random(seed)
+    grid = nx.convert_node_labels_to_integers(nx.grid_2d_graph(size, size))
+    G = nx.DiGraph() if directed else nx.Graph()
+    G.add_nodes_from((n, {"x": 74.0 + (n % size) * 0.001, "y": 31.0 + (n // size) * 0.001})
+                     for n in grid.nodes)
+    for u, v in grid.edges:
+        G.add_edge(u, v, length=100.0, travel_time=rng.uniform(0.5, 2.0))
+        if directed and rng.random() < 0.7:
+            G.add_edge(v, u, length=100.0, travel_time=rng.uniform(0.5, 2.0))
+    return CompactGraph.from_networkx(G)
+
+def reference_matrix(core, sources, targets):
+    """Matrix built from one full Dijkstra per source"""
+    out = np.full((len(sources), len(targets)), np.inf)
+    for i, s in enumerate(sources):
+        dist, _ = core.dijkstra(s)
+        for j, t in enumerate(targets):
+            out[i, j] = dist.get(t, np.inf)
+    return out
+
+@pytest.mark.parametrize("directed", [False, True])
+@pytest.mark.parametrize("shape", [(12, 5), (5, 12)])
+def test_matrix_matches_dijkstra(directed, shape):
+    """Test both search directions against per-source Dijkstra"""
+    core = random_network(9, seed=3, directed=directed)
+    rng = random.Random(shape[0])
+    sources = [rng.randrange(core.num_nodes) for _ in range(shape[0])]
+    targets = [rng.randrange(core.num_nodes) for _ in range(shape[1])]
+    np.testing.assert_allclose(
+        travel_time_matrix(core, sources, targets), reference_matrix(core, sources, targets)
+    )
+
+def test_parallel_batches_match_serial():
+    """Test that pooled batches give the same matrix as the serial path"""
+    core = random_network(8, seed=5, directed=True)
+    nodes = list(range(core.num_nodes))
+    serial = travel_time_matrix(core, nodes, nodes)
+    parallel = travel_time_matrix(core, nodes, nodes, workers=2, batch_size=16, parallel_min=1)
+    np.testing.assert_array_equal(serial, parallel)
+
+    pool = matrix_format._pool
+    again = travel_time_matrix(core, nodes[::-1], nodes, workers=2, batch_size=16, parallel_min=1)
+    np.testing.assert_array_equal(again, serial[::-1])
+    assert matrix_format._pool is pool
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_contraction_buckets_match_dijkstra(directed):
+    """Test the bucket many-to-many search over a contraction hierarchy"""
+    core = random_network(8, seed=9, directed=directed)
+    core.contraction = ContractionHierarchy.build(core)
+    nodes = list(range(0, core.num_nodes, 3))
+    np.testing.assert_allclose(
+        travel_time_matrix(core, nodes, nodes[::-1]), reference_matrix(core, nodes, nodes[::-1])
+    )
+
+def test_contraction_batches_run_on_the_pool(tmp_path):
+    """Test that pooled hierarchy searches give the same matrix as serial ones"""
+    core = random_network(8, seed=9, directed=True)
+    ContractionHierarchy.build(core).save(str(tmp_path / "ch"))
+    core.contraction = ContractionHierarchy.load(str(tmp_path / "ch"))
+    nodes = list(range(0, core.num_nodes, 2))
+    serial = travel_time_matrix(core, nodes, nodes[::-1])
+    parallel = travel_time_matrix(core, nodes, nodes[::-1], workers=2, batch_size=8, parallel_min=1)
+    np.testing.assert_array_equal(serial, parallel)
+    np.testing.assert_allclose(parallel, reference_matrix(core, nodes, nodes[::-1]))
+
+def test_nearest_nodes():
+    """Test that coordinates snap to the closest node"""
+    core = random_network(4, seed=1)
+    assert nearest_nodes(core, [74.0011, 74.0], [31.0019, 30.9]).tolist() == [9, 0]
+
+def test_binary_round_trip():
+    """Test the binary matrix encoding"""
+    m = np.array([[0.0, 1.5], [np.inf, 2.25]])
+    np.testing.assert_array_equal(matrix_format.decode_matrix(matrix_format.encode_matrix(m)), m)
+
+def test_matrix_endpoint_json_and_binary():
+    """Test /routes/matrix on the sample network in both formats"""
+    client.get("/network/sample")
+    body = {"sources": [1, "2"], "targets": [[0.0, 0.0], 4]}
+    response = client.post("/routes/matrix", json=body)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["sources"] == ["1", "2"]
+    assert data["targets"] == ["1", "4"]
+    assert data["travel_time"] == [[0.0, 30.0], [10.0, 26.0]]
+
+    binary = client.post("/routes/matrix", json=body,
+                         headers={"Accept": matrix_format.MEDIA_TYPE})
+    assert binary.headers["content-type"] == matrix_format.MEDIA_TYPE
+    np.testing.assert_allclose(matrix_format.decode_matrix(binary.content),
+                               np.array(data["travel_time"], dtype=float))
+
+def test_matrix_endpoint_unknown_node():
+    """Test that unknown node IDs are reported"""
+    client.get("/network/sample")
+    response = client.post("/routes/matrix", json={"sources": [999]})
+    assert response.status_code == 500
+    assert "Unknown node" in response.json()["detail"]
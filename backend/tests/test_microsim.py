@@ -0,0 +1,80 @@
+"""
+Tests for the time-stepped microsimulation engine.
+"""
+
+import numpy as np
+import pytest
+import networkx as nx
+from app.core.graph import CompactGraph
+from app.core.microsim import MicroSimulation, group_rank
+from app.core.weighting import add_travel_times
+from tests.helpers import corridor, light
+
+def test_group_rank():
+    """Test ranking within groups by key"""
+    ranks = group_rank(np.array([3, 1, 3, 1, 3]), np.array([5.0, 2.0, 1.0, 0.5, 9.0]))
+    assert ranks.tolist() == [1, 1, 0, 0, 2]
+
+def test_free_flow_vehicle_has_no_delay():
+    """Test that a lone vehicle on unsignalized roads follows free-flow times"""
+    core, path = corridor([100, 100, 100], [10, 20, 30])
+    sim = MicroSimulation(core, [path], [5.0]).run(200)
+    assert sim.arrivals.tolist() == [65.0]
+    assert sim.delays().tolist() == [0.0]
+    assert [time for _, time in sim.trajectories()[0]] == [5.0, 15.0, 35.0, 65.0]
+    assert sim.stats()["arrived"] == 1
+
+def test_red_light_holds_vehicles():
+    """Test that a vehicle waits at a red approach until the next green"""
+    core, path = corridor([100, 100], [10, 10])
+    # Approach into node 1 from node 0 is green for 20s starting at t=40 of a 60s cycle
+    sim = MicroSimulation(core, [path], [0.0], [light(1, 0, 40, 20, 60)]).run(200)
+    assert sim.arrivals[0] == pytest.approx(50.0)
+    assert sim.delays()[0] == pytest.approx(30.0)
+
+def test_saturation_headway_spaces_discharge():
+    """Test that a queue discharges one vehicle per headway, first in first out"""
+    core, path = corridor([1000, 1000], [10, 10])
+    sim = MicroSimulation(core, [path] * 4, [0.0, 0.1, 0.2, 0.3], headway=2.0).run(100)
+    passed = sim.node_times[sim.fleet.first + 1]
+    assert passed.tolist() == pytest.approx([10.1, 12.1, 14.1, 16.1], abs=0.11)
+    assert np.all(np.diff(passed) >= 2.0 - 1e-9)
+
+def test_full_road_blocks_upstream():
+    """Test that vehicles wait while the next road has no storage left"""
+    core, path = corridor([100, 7.5, 100], [10, 50, 10])
+    sim = MicroSimulation(core, [path] * 2, [0.0, 0.0], headway=0.5).run(300)
+    entered = sim.node_times[sim.fleet.first + 1]
+    # The 7.5m road holds one vehicle, so the second enters once the first has left
+    assert entered[1] >= entered[0] + 50
+
+def test_weighted_osm_roads_run_in_seconds():
+    """Test that travel times from add_travel_times are seconds on the engine's clock"""
+    G = nx.MultiGraph()
+    G.add_edge(0, 1, length=500, highway="residential")
+    G.add_edge(1, 2, length=250, highway="primary")
+    core = CompactGraph.from_networkx(add_travel_times(G, table={"residential": 30, "primary": 60}))
+    path = ([0, 1, 2], [core.find_edge(0, 1), core.find_edge(1, 2)])
+    sim = MicroSimulation(core, [path], [0.0], [light(1, 0, 80, 20, 120)]).run(300)
+    # 60s on the residential road, a wait for green at t=80, then 15s on the primary
+    assert sim.node_times[1] == pytest.approx(80.0)
+    assert sim.arrivals[0] == pytest.approx(95.0)
+
+def test_complex_simulation_micro_engine(client):
+    """Test that /simulate/complex can run the microsimulation engine"""
+    response = client.post("/simulate/complex", json={
+        "vehicles_count": 6, "duration": 600, "engine": "micro"
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["engine"] == "micro"
+    assert len(data["vehicles"]) == len(data["routes"])
+    assert data["stats"]["vehicles"] == len(data["routes"])
+    for vehicle, route in zip(data["vehicles"], data["routes"]):
+        assert vehicle["id"] == route["id"]
+        assert vehicle["trajectory"][0]["node_id"] == route["path"][0]
+        if vehicle["arrival_time"] is not None:
+            assert vehicle["delay"] >= -1e-6
+
+    response = client.post("/simulate/complex", json={"engine": "warp"})
+    assert response.status_code == 500
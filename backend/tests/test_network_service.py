@@ -2,6 +2,7 @@ import pytest
 import networkx as nx
 from app.services.network_service import NetworkService
 from pydantic import BaseModel
+from tests.helpers import read_geojson
 
 class BoundingBox(BaseModel):
     min_x: float
@@ -12,7 +13,7 @@ class BoundingBox(BaseModel):
 def test_get_sample_network():
     """Test that the sample network is created correctly"""
     service = NetworkService()
-    network = service.get_sample_network()
+    network = read_geojson(service.get_sample_network())
     
     # Check that the network is a GeoJSON FeatureCollection
     assert network is not None
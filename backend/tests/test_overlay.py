@@ -0,0 +1,76 @@
+"""
+Tests for copy-free incident weight overlays.
+"""
+
+import random
+import pytest
+import networkx as nx
+from app.api.simulation import Incident
+from app.core.contraction import ContractionHierarchy
+from app.core.overlay import WeightOverlay
+from app.core.route_cache import RouteCache, incident_key
+from app.core.routing import Router
+from app.services.simulation_service import SimulationService
+from tests.helpers import random_road_graph
+
+def test_overlay_leaves_base_weights_untouched():
+    """Test that factors compound and patch only a copy of the weight column"""
+    core = random_road_graph(4, seed=1)
+    base = list(core.weight_list())
+    overlay = WeightOverlay(core, {2: 2.0})
+    overlay.scale(2, 1.5)
+    overlay.close(5)
+
+    weights = overlay.weights()
+    assert weights[2] == pytest.approx(base[2] * 3.0)
+    assert weights[5] == float("inf")
+    assert overlay.weight(2) == pytest.approx(weights[2])
+    assert core.weight_list() == base
+    assert overlay.closed == {5}
+    assert WeightOverlay(core).weights() is core.weight_list()
+
+def test_overlay_key():
+    """Test that closure-only overlays share incident_key and slowdowns change the key"""
+    core = random_road_graph(4, seed=1)
+    assert WeightOverlay.closing(core, [3, 1]).key() == incident_key({1, 3})
+    assert WeightOverlay(core).key() == ""
+    assert WeightOverlay(core, {1: 2.0}).key() != WeightOverlay(core, {1: 3.0}).key()
+
+@pytest.mark.parametrize("algorithm", ["auto", "dijkstra", "astar"])
+@pytest.mark.parametrize("contracted", [False, True])
+def test_routing_through_overlay_matches_modified_graph(algorithm, contracted):
+    """Test that routes read through an overlay equal routes on a graph with the weights rewritten"""
+    core = random_road_graph(10, seed=6, directed=True)
+    if contracted:
+        core.contraction = ContractionHierarchy.build(core)
+    rng = random.Random(3)
+    overlay = WeightOverlay(core)
+    for edge in rng.sample(range(core.num_edges), 40):
+        overlay.scale(edge, rng.choice([1.5, 4.0, float("inf")]))
+    router = Router(core, algorithm, cache=RouteCache(1000, 1 << 20))
+
+    for _ in range(40):
+        s, t = rng.randrange(core.num_nodes), rng.randrange(core.num_nodes)
+        dist, _ = core.dijkstra(s, target=t, weights=overlay.weights())
+        try:
+            _, edges = router.shortest_path(s, t, overlay=overlay)
+        except nx.NetworkXNoPath:
+            assert t not in dist
+            continue
+        assert sum(overlay.weight(e) for e in edges) == pytest.approx(dist[t])
+
+def test_simulations_do_not_copy_the_graph(complex_test_graph, complex_test_incidents, monkeypatch):
+    """Test that incident simulations leave the shared network uncopied"""
+    def fail(self, *args, **kwargs):
+        raise AssertionError("graph copied")
+
+    monkeypatch.setattr(nx.Graph, "copy", fail)
+    service = SimulationService()
+    service.network_service.current_graph = complex_test_graph
+    result = service.run_complex_simulation(60, complex_test_incidents, 5)
+    assert len(result["routes"]) > 0
+
+    result = service.run_square_intersection_simulation(vehicles_count=12, with_incident=True)
+    north = next(route for route in result["routes"] if route["path"] == ["5", "1", "2", "6"])
+    # 15s approach + 10s road slowed by a 0.8 severity incident + 15s approach
+    assert north["travel_time"] == pytest.approx(15 + 10 / 0.2 + 15)
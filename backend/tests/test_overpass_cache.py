@@ -0,0 +1,174 @@
+"""
+Tests for the managed Overpass response cache.
+"""
+
+import json
+import os
+import time
+import pytest
+from urllib.parse import urlencode
+from app.core import config
+from app.core.overpass_cache import OverpassCache, cache_key, parse_overpass_url
+from app.services.network_service import NetworkService
+
+EMPTY = {"version": 0.6, "elements": []}
+
+def overpass_url(south, west, north, east):
+    """Build a GET-style Overpass URL the way OSMnx does"""
+    poly = f"{south} {west} {north} {west} {north} {east} {south} {east}"
+    query = f'[out:json];(way["highway"](poly:"{poly}");>;);out;'
+    return "https://overpass-api.de/api/interpreter?" + urlencode({"data": query})
+
+def response_with(count):
+    return {"version": 0.6, "elements": [{"type": "node", "id": i, "lat": 0.0, "lon": 0.0} for i in range(count)]}
+
+def write_raw(root, url, response):
+    path = os.path.join(root, f"{cache_key(url)}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(response, f)
+    return path
+
+def test_parse_overpass_url():
+    """Test that the query and polygon bounds are recovered from a request URL"""
+    query, bbox = parse_overpass_url(overpass_url(31.0, 73.0, 31.5, 73.5))
+    assert 'way["highway"]' in query
+    assert bbox == [31.5, 31.0, 73.5, 73.0]
+
+def test_scan_indexes_legacy_files(tmp_path):
+    """Test that raw OSMnx cache files are indexed with size and empty flag"""
+    root = str(tmp_path)
+    empty_url = overpass_url(1, 1, 2, 2)
+    full_url = overpass_url(3, 3, 4, 4)
+    write_raw(root, empty_url, EMPTY)
+    write_raw(root, full_url, response_with(50))
+
+    cache = OverpassCache(root)
+    assert cache.scan() == 2
+    assert cache.entries[cache_key(empty_url)]["empty"] is True
+    assert cache.entries[cache_key(full_url)]["empty"] is False
+
+    # The manifest survives a restart
+    assert len(OverpassCache(root).entries) == 2
+
+def test_compact_keeps_raw_files_by_default(tmp_path):
+    """Test that compaction stores copies and never deletes or evicts files it does not own"""
+    root = str(tmp_path)
+    empty_url = overpass_url(1, 1, 2, 2)
+    full_url = overpass_url(3, 3, 4, 4)
+    empty_path = write_raw(root, empty_url, EMPTY)
+    full_path = write_raw(root, full_url, response_with(500))
+    old = time.time() - 365 * 24 * 3600
+    os.utime(full_path, (old, old))
+
+    cache = OverpassCache(root)
+    cache.scan()
+    assert cache.compact() == 0
+    assert os.path.exists(empty_path) and os.path.exists(full_path)
+    assert cache.entries[cache_key(full_url)]["location"] == "store"
+    assert cache.evict(max_bytes=0, max_age=60) == []
+
+    # A restart neither re-indexes nor loses the kept files
+    restarted = OverpassCache(root)
+    assert restarted.scan() == 0
+    assert restarted.get(full_url) == response_with(500)
+
+def test_legacy_entries_learn_query_and_access_time(tmp_path):
+    """Test that a legacy empty file becomes a bbox negative entry once looked up"""
+    root = str(tmp_path)
+    url = overpass_url(31.0, 73.0, 31.5, 73.5)
+    write_raw(root, url, EMPTY)
+    cache = OverpassCache(root, flush_interval=0)
+    cache.scan()
+    assert not cache.is_known_empty(31.4, 31.1, 73.4, 73.1)
+
+    assert cache.get(url)["elements"] == []
+    assert cache.is_known_empty(31.4, 31.1, 73.4, 73.1)
+    restarted = OverpassCache(root)
+    assert restarted.entries[cache_key(url)]["bbox"] == [31.5, 31.0, 73.5, 73.0]
+    assert restarted.entries[cache_key(url)]["last_access"] == cache.entries[cache_key(url)]["last_access"]
+
+def test_compact_moves_raw_json_into_store(tmp_path):
+    """Test that compaction with remove_raw gzips responses and drops the raw files"""
+    root = str(tmp_path)
+    empty_url = overpass_url(1, 1, 2, 2)
+    full_url = overpass_url(3, 3, 4, 4)
+    empty_path = write_raw(root, empty_url, EMPTY)
+    full_path = write_raw(root, full_url, response_with(500))
+
+    cache = OverpassCache(root)
+    cache.scan()
+    assert cache.compact(remove_raw=True) > 0
+
+    assert not os.path.exists(empty_path)
+    assert not os.path.exists(full_path)
+    assert cache.get(full_url) == response_with(500)
+    assert cache.get(empty_url)["elements"] == []
+    assert cache.stats()["compressed_entries"] == 1
+
+def test_remove_raw_setting_reclaims_raw_files(tmp_path, monkeypatch):
+    """Test that with OVERPASS_CACHE_REMOVE_RAW the installed cache compacts away and evicts raw files"""
+    root = str(tmp_path)
+    kept_url, stale_url = overpass_url(1, 1, 2, 2), overpass_url(3, 3, 4, 4)
+    kept_path = write_raw(root, kept_url, response_with(500))
+    stale_path = write_raw(root, stale_url, response_with(500))
+    old = time.time() - 365 * 24 * 3600
+    os.utime(stale_path, (old, old))
+
+    service = NetworkService()
+    service.overpass_cache = OverpassCache(root, max_age=60)
+    monkeypatch.setattr(service.overpass_cache, "install", lambda ox: True)
+    monkeypatch.setattr(config, "OVERPASS_CACHE_REMOVE_RAW", True)
+    service._install_overpass_cache()
+
+    assert not os.path.exists(kept_path) and not os.path.exists(stale_path)
+    assert service.overpass_cache.get(kept_url) == response_with(500)
+    assert service.overpass_cache.get(stale_url) is None
+
+def test_evict_with_remove_raw_deletes_raw_files(tmp_path):
+    """Test that eviction of raw-backed entries deletes their raw file only when remove_raw is set"""
+    root = str(tmp_path)
+    url = overpass_url(1, 1, 2, 2)
+    path = write_raw(root, url, response_with(500))
+
+    cache = OverpassCache(root, remove_raw=True)
+    cache.scan()
+    assert cache.evict(max_bytes=0, remove_raw=False) == []
+    assert cache.evict(max_bytes=0) == [cache_key(url)]
+    assert not os.path.exists(path)
+    assert cache.get(url) is None
+
+def test_empty_responses_short_circuit(tmp_path):
+    """Test that empty responses are remembered as negative entries by bbox"""
+    cache = OverpassCache(str(tmp_path))
+    cache.put(overpass_url(31.0, 73.0, 31.5, 73.5), EMPTY)
+
+    assert cache.stats()["bytes"] == 0
+    assert cache.is_known_empty(31.4, 31.1, 73.4, 73.1)
+    assert not cache.is_known_empty(31.6, 31.1, 73.4, 73.1)
+
+def test_evict_least_recently_used(tmp_path):
+    """Test size-based LRU eviction keeps the most recently used entries"""
+    cache = OverpassCache(str(tmp_path))
+    urls = [overpass_url(i, i, i + 1, i + 1) for i in range(3)]
+    for url in urls:
+        cache.put(url, response_with(2000))
+        time.sleep(0.01)
+
+    # Touch the oldest entry so the middle one becomes least recently used
+    cache.get(urls[0])
+    size = cache.entries[cache_key(urls[0])]["size"]
+
+    evicted = cache.evict(max_bytes=2 * size + size // 2)
+    assert evicted == [cache_key(urls[1])]
+    assert cache.get(urls[1]) is None
+    assert cache.get(urls[0]) is not None
+
+def test_evict_by_age(tmp_path):
+    """Test age-based eviction, including negative entries"""
+    cache = OverpassCache(str(tmp_path))
+    url = overpass_url(1, 1, 2, 2)
+    cache.put(url, EMPTY)
+    cache.entries[cache_key(url)]["last_access"] -= 3600
+
+    assert cache.evict(max_age=60) == [cache_key(url)]
+    assert cache.stats()["entries"] == 0
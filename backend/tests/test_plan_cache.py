@@ -0,0 +1,67 @@
+"""
+Tests for the incrementally updated signal plan cache.
+"""
+
+from app.api.simulation import Incident
+from app.services.simulation_service import SimulationService
+from tests.fixtures import TestFixtures
+from tests.helpers import grid_graph
+
+def test_incremental_plans_match_full_regeneration():
+    """Test that patched plans equal plans generated from scratch"""
+    G = grid_graph()
+    service = SimulationService()
+    service.network_service._graph = G
+    steps = [
+        [Incident(road_id="13-14", severity=0.5)],
+        [Incident(road_id="13-14", severity=0.5), Incident(road_id="50-62", severity=0.9)],
+        [Incident(road_id="50-62", severity=0.9), Incident(road_id="50-62", severity=0.2)],
+        [],
+    ]
+    for incidents in steps:
+        cached = service._generate_adaptive_traffic_light_timings(G, incidents)
+        fresh = SimulationService()
+        fresh.network_service._graph = G
+        assert cached == fresh._generate_adaptive_traffic_light_timings(G, incidents)
+
+def test_incident_update_only_rebuilds_its_intersections():
+    """Test that one new incident rebuilds two plans and reports them as a diff"""
+    G = grid_graph()
+    service = SimulationService()
+    service.network_service._graph = G
+    before = service._generate_adaptive_traffic_light_timings(G, [])
+    assert service.signal_plans.changes is None
+    builds = service.signal_plans.builds
+
+    after = service._generate_adaptive_traffic_light_timings(G, [Incident(road_id="13-14", severity=0.5)])
+    assert service.signal_plans.builds - builds == 2
+    changes = service.signal_plans.changes
+    assert sorted(change["intersection_id"] for change in changes) == ["13", "14"]
+    for change in changes:
+        assert change["before"] in before and change["after"] in after
+        assert change["after"]["total_cycle_time"] != change["before"]["total_cycle_time"]
+    # Untouched plans are the same objects as before
+    assert sum(light is previous for light, previous in zip(after, before)) == len(before) - 2
+
+    service._generate_adaptive_traffic_light_timings(G, [Incident(road_id="13-14", severity=0.9)])
+    assert service.signal_plans.changes == []
+
+def test_new_graph_version_rebuilds_plans():
+    """Test that plans are rebuilt when the graph changes"""
+    service = SimulationService()
+    small = TestFixtures.create_basic_test_graph()
+    assert len(service._generate_adaptive_traffic_light_timings(small, [])) == 3
+    G = grid_graph(4)
+    assert len(service._generate_adaptive_traffic_light_timings(G, [])) == 16
+    assert service.signal_plans.changes is None
+
+def test_update_incidents_reports_signal_changes():
+    """Test that incident updates return the plans they changed"""
+    service = SimulationService()
+    service.network_service.load_sample_network()
+    service.update_incidents([])
+    result = service.update_incidents([Incident(road_id="1-2", severity=0.7)])
+    changed = {change["intersection_id"] for change in result["signal_changes"]}
+    assert changed and changed <= {"1", "2"}
+    result = service.update_incidents([])
+    assert {change["intersection_id"] for change in result["signal_changes"]} == changed
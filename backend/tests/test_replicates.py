@@ -0,0 +1,77 @@
+"""
+Tests for seeded Monte Carlo replicates and their statistics.
+"""
+
+import numpy as np
+from app.core.replicates import grouped_summary, replicate_seeds
+from app.services.simulation_service import SimulationService
+
+def test_grouped_summary_matches_numpy():
+    """Test that grouped statistics equal per-group numpy results"""
+    rng = np.random.default_rng(0)
+    groups = rng.integers(0, 7, 500).astype(str)
+    values = rng.exponential(30, 500)
+    keys, stats = grouped_summary(groups, values)
+    for i, key in enumerate(keys):
+        sample = values[groups == key]
+        assert stats["count"][i] == len(sample)
+        assert np.isclose(stats["mean"][i], sample.mean())
+        assert np.isclose(stats["std"][i], sample.std(ddof=1))
+        assert np.isclose(stats["p50"][i], np.percentile(sample, 50))
+        assert np.isclose(stats["p95"][i], np.percentile(sample, 95))
+        assert stats["ci_low"][i] < sample.mean() < stats["ci_high"][i]
+
+def test_single_sample_has_no_interval():
+    """Test that a group seen once has no confidence interval"""
+    _, stats = grouped_summary(["a", "b", "b"], [5.0, 1.0, 3.0])
+    assert stats["p95"].tolist() == [5.0, 2.9]
+    assert np.isnan(stats["ci_low"][0]) and not np.isnan(stats["ci_low"][1])
+
+def test_replicate_seeds_are_reproducible():
+    """Test that a root seed spawns the same distinct replicate seeds"""
+    root, seeds = replicate_seeds(42, 5)
+    assert root == 42 and (root, seeds) == replicate_seeds(42, 5)
+    assert len(set(seeds)) == 5
+    root, seeds = replicate_seeds(None, 3)
+    assert replicate_seeds(root, 3)[1] == seeds
+
+def test_seeded_complex_simulation_is_reproducible():
+    """Test that a seed fixes the random routes of a complex simulation"""
+    service = SimulationService()
+    service.network_service.load_sample_network()
+    first = service.run_complex_simulation(60, [], 8, seed=7)["routes"]
+    assert service.run_complex_simulation(60, [], 8, seed=7)["routes"] == first
+
+def test_replicates_pool_statistics():
+    """Test that replicates are summarized per route and road without raw runs"""
+    service = SimulationService()
+    service.network_service.load_sample_network()
+    current = service.run_complex_simulation(60, [], 3, seed=1)
+    result = service.run_replicates(6, 120, [], 5, engine="micro", seed=3)
+    assert service.current_simulation is current
+    assert result["replicates"] == 6 and len(result["seeds"]) == 6 and "runs" not in result
+    assert sum(route["count"] for route in result["routes"]) + result["unfinished"] == 30
+    for row in result["routes"] + result["edges"]:
+        assert row["p50"] <= row["p95"] + 1e-9
+    assert result["fleet_mean_travel_time"]["count"] <= 6
+    again = service.run_replicates(6, 120, [], 5, engine="micro", seed=3)
+    assert again["routes"] == result["routes"]
+
+def test_pooled_replicates_match_serial_ones():
+    """Test that replicates run on a process pool pool the same statistics as serial runs"""
+    service = SimulationService()
+    service.network_service.load_sample_network()
+    serial = service.run_replicates(4, 120, [], 5, engine="micro", seed=3, workers=1)
+    pooled = service.run_replicates(4, 120, [], 5, engine="micro", seed=3, workers=2)
+    assert pooled == serial
+
+def test_replicate_endpoint(client):
+    """Test the replicate endpoint and optional raw runs"""
+    response = client.post("/simulate/replicates", json={
+        "replicates": 3, "vehicles_count": 4, "seed": 11, "include_runs": True
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["seed"] == 11 and len(data["runs"]) == 3
+    assert [run["seed"] for run in data["runs"]] == data["seeds"]
+    assert client.post("/simulate/replicates", json={"replicates": 0}).status_code == 500
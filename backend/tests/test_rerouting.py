@@ -2,10 +2,14 @@
 Tests for traffic rerouting logic.
 """
 
+import random
 import pytest
 import networkx as nx
+from app.api.simulation import Incident
+from app.core.rerouting import RerouteEngine
 from app.services.simulation_service import SimulationService
 from tests.fixtures import TestFixtures
+from tests.helpers import city_graph
 
 def test_apply_incident_to_graph():
     """Test applying an incident to a graph"""
@@ -227,3 +231,68 @@ def test_waypoints_generation():
 
         # Check that the last waypoint's arrival time matches the route's travel time
         assert waypoints[-1]['arrival_time'] == route['travel_time']
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_incremental_rerouting_matches_full_recomputation(directed):
+    """Test that re-routing only affected vehicles gives the same costs as routing them all again"""
+    core = city_graph(12, seed=5, directed=directed)
+    engine = RerouteEngine(core)
+    rng = random.Random(9)
+    for i in range(40):
+        engine.add_route(f"route-{i}", rng.randrange(core.num_nodes), rng.randrange(core.num_nodes))
+
+    used = sorted(engine.edge_routes)
+    factors = {}
+    for _ in range(15):
+        # Add, worsen, ease and clear incidents on roads the fleet uses
+        edge = rng.choice(used)
+        factor = rng.choice([1.0, 2.0, 5.0, float("inf")])
+        if factor == 1.0:
+            factors.pop(edge, None)
+        else:
+            factors[edge] = factor
+        engine.set_incidents(dict(factors))
+
+        weights = [w * factors.get(e, 1.0) for e, w in enumerate(core.weight_list())]
+        for route in engine.routes.values():
+            dist, _ = core.dijkstra(route["source"], target=route["target"], weights=weights)
+            expected = dist.get(route["target"], float("inf"))
+            assert route["cost"] == pytest.approx(expected)
+            for e in route["edges"]:
+                assert engine.weights[e] != float("inf")
+
+    engine.set_incidents({})
+    assert engine.weights == core.weight_list()
+
+def test_rerouting_skips_unaffected_routes(monkeypatch):
+    """Test that an incident on a road no vehicle uses triggers no searches"""
+    core = city_graph(10, seed=2)
+    engine = RerouteEngine(core)
+    engine.add_route("route-1", 0, 9)
+    unused = next(e for e in range(core.num_edges) if e not in engine.edge_routes)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("unexpected search")
+
+    monkeypatch.setattr(core, "dijkstra", fail)
+    assert engine.set_incidents({unused: float("inf")}) == []
+
+def test_incident_updates_report_route_changes(dynamic_test_graph):
+    """Test that replacing incidents returns only the routes that moved"""
+    service = SimulationService()
+    service.network_service.current_graph = dynamic_test_graph
+    core = service.network_service.core_for(dynamic_test_graph)
+    engine = service._reroute_engine(dynamic_test_graph)
+    engine.add_route("route-x", core.index_of(1), core.index_of(6))
+
+    blocked = Incident(road_id="2-6", severity=1.0)
+    result = service.update_incidents([blocked])
+    moved = {change["id"]: change for change in result["route_changes"]}
+    assert moved["route-x"]["previous_path"] == ["1", "2", "6"]
+    assert moved["route-x"]["path"] != ["1", "2", "6"]
+    assert all(change["previous_path"] != change["path"] for change in moved.values())
+
+    result = service.update_incidents([])
+    moved = {change["id"]: change for change in result["route_changes"]}
+    assert moved["route-x"]["path"] == ["1", "2", "6"]
+    assert result["incidents"] == []
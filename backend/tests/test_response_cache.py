@@ -0,0 +1,132 @@
+"""
+Tests for the versioned network response cache.
+"""
+
+import gzip
+import json
+import pytest
+from fastapi.testclient import TestClient
+from app.api import network as network_api
+from app.api.network import BoundingBox
+from app.core import binary_network
+from app.core.graph import CompactGraph
+from app.core.response_cache import ResponseCache, accepts_gzip, etag_matches, make_etag
+from app.core.snapshot import SnapshotStore
+from app.main import app
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    """Start every test with an empty response cache"""
+    network_api.response_cache.clear()
+    yield
+    network_api.response_cache.clear()
+
+def test_cache_evicts_least_recently_used():
+    """Test that the byte budget evicts the oldest entries first"""
+    cache = ResponseCache(max_bytes=600)
+    for version in ("a", "b", "c"):
+        cache.put(version, "geojson", bytes(range(200)))
+    assert cache.get("a", "geojson") is None
+    assert cache.get("c", "geojson").body == bytes(range(200))
+    assert cache.stats()["bytes"] <= 600
+
+def test_cache_skips_oversized_entries():
+    """Test that entries above the per-entry limit are not stored"""
+    cache = ResponseCache(max_bytes=10_000, max_entry_bytes=100)
+    assert cache.put("a", "binary", b"x" * 101) is None
+    streamed = list(cache.stream_and_store("a", "geojson", [b"x" * 60, b"y" * 60]))
+    assert streamed == [b"x" * 60, b"y" * 60]
+    assert cache.stats()["entries"] == 0
+
+def test_stream_and_store_keeps_full_body():
+    """Test that a fully consumed stream lands in the cache"""
+    cache = ResponseCache(max_bytes=10_000)
+    list(cache.stream_and_store("v1", "geojson", [b'{"a":', b"1}"]))
+    entry = cache.get("v1", "geojson")
+    assert entry.body == b'{"a":1}'
+    assert gzip.decompress(entry.gzip_body) == entry.body
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ('"v1-geojson"', True),
+    ('W/"v1-geojson"', True),
+    ('"v0-geojson", "v1-geojson-gzip"', True),
+    ('"v1-binary"', False),
+    ("*", True),
+])
+def test_etag_matching(header, expected):
+    """Test If-None-Match parsing against both encodings of a representation"""
+    assert etag_matches(header, "v1", "geojson") is expected
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("identity", False),
+    ("gzip, deflate", True),
+    ("br;q=1.0, gzip;q=0.5", True),
+    ("gzip;q=0", False),
+    ("*", True),
+])
+def test_accepts_gzip(header, expected):
+    """Test Accept-Encoding parsing"""
+    assert accepts_gzip(header) is expected
+
+def test_conditional_get_returns_not_modified():
+    """Test that a client with the current ETag gets a 304"""
+    first = client.get("/network/sample", headers={"Accept-Encoding": "identity"})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag == make_etag(network_api.network_service.graph_version, "geojson")
+
+    second = client.get("/network/sample", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+
+def test_repeat_request_served_from_cache():
+    """Test that the second request reuses the encoded body"""
+    first = client.get("/network/sample", headers={"Accept-Encoding": "identity"})
+    hits = network_api.response_cache.hits
+    second = client.get("/network/sample", headers={"Accept-Encoding": "identity"})
+    assert network_api.response_cache.hits == hits + 1
+    assert second.content == first.content
+    assert len(second.json()["features"]) == 8
+
+def test_cached_response_served_gzipped():
+    """Test that gzip-capable clients get the precompressed variant"""
+    client.get("/network/sample", headers={"Accept-Encoding": "identity"})
+    response = client.get("/network/sample", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"].endswith('-gzip"')
+    assert len(response.json()["features"]) == 8
+
+def test_etag_changes_with_network_and_format():
+    """Test that different graphs and formats never share an ETag"""
+    sample = client.get("/network/sample").headers["etag"]
+    binary = client.get(
+        "/network/sample", headers={"Accept": binary_network.MEDIA_TYPE}
+    ).headers["etag"]
+    square = client.get("/network/square-intersection").headers["etag"]
+    assert len({sample, binary, square}) == 3
+
+    stale = client.get("/network/sample", headers={"If-None-Match": square})
+    assert stale.status_code == 200
+    assert json.loads(stale.content)["type"] == "FeatureCollection"
+
+def test_not_modified_is_decided_before_loading(tmp_path, monkeypatch):
+    """Test that a current ETag gets a 304 without reloading the network"""
+    service = network_api.network_service
+    monkeypatch.setattr(service, "snapshots", SnapshotStore(str(tmp_path)))
+    etag = client.get("/network/sample").headers["etag"]
+    monkeypatch.setattr(service, "load_sample_network", lambda: pytest.fail("sample network reloaded"))
+    assert client.get("/network/sample", headers={"If-None-Match": etag}).status_code == 304
+
+    # A bbox snapshot answers from its header; loading it never re-hashes the graph
+    bbox = BoundingBox(min_x=74.35, min_y=31.51, max_x=74.37, max_y=31.53)
+    service.snapshots.save(service.bbox_key(bbox), CompactGraph.from_networkx(service.current_graph))
+    params = {"min_x": 74.35, "min_y": 31.51, "max_x": 74.37, "max_y": 31.53}
+    etag = client.get("/network/", params=params).headers["etag"]
+    assert service.current_core._fingerprint == service.request_version(service.bbox_key(bbox))
+    monkeypatch.setattr(service, "load_network", lambda bbox: pytest.fail("bbox reloaded"))
+    assert client.get("/network/", params=params, headers={"If-None-Match": etag}).status_code == 304
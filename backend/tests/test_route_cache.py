@@ -0,0 +1,87 @@
+"""
+Tests for the route cache.
+"""
+
+import pytest
+import networkx as nx
+from fastapi.testclient import TestClient
+from app.core.graph import CompactGraph
+from app.core.route_cache import RouteCache, incident_key
+from app.core.routing import Router
+from app.main import app
+from app.services.network_service import NetworkService
+
+client = TestClient(app)
+
+def test_evicts_by_entry_count():
+    """Test that the oldest entries go once the entry limit is reached"""
+    cache = RouteCache(max_entries=2, max_bytes=10 ** 6)
+    for target in range(3):
+        cache.put(("v", "", 0, target, "travel_time"), ([0, target], [target]))
+    assert cache.get(("v", "", 0, 0, "travel_time")) is None
+    assert cache.get(("v", "", 0, 2, "travel_time")) == ([0, 2], [2])
+    assert cache.stats()["evictions"] == 1
+
+def test_evicts_by_bytes():
+    """Test that the byte budget bounds long paths"""
+    cache = RouteCache(max_entries=100, max_bytes=2000)
+    long_path = (list(range(200)), list(range(199)))
+    cache.put("a", long_path)
+    cache.put("b", long_path)
+    assert len(cache) == 1 and cache.get("b") == long_path
+    cache.put("huge", (list(range(1000)), list(range(999))))
+    assert cache.get("huge") is None
+
+def test_incident_key():
+    """Test that closure fingerprints ignore order and separate different sets"""
+    assert incident_key(None) == incident_key(set()) == ""
+    assert incident_key({3, 1, 2}) == incident_key([2, 3, 1])
+    assert incident_key({1, 2}) != incident_key({1, 3})
+
+def test_router_serves_repeat_queries_from_cache(complex_test_graph, monkeypatch):
+    """Test that repeated OD pairs skip the search and closures get their own entries"""
+    core = CompactGraph.from_networkx(complex_test_graph)
+    cache = RouteCache(max_entries=100, max_bytes=10 ** 6)
+    searches = []
+    original = CompactGraph.dijkstra
+    monkeypatch.setattr(CompactGraph, "dijkstra",
+                        lambda self, *a, **kw: searches.append(a) or original(self, *a, **kw))
+
+    router = Router(core, "auto", cache=cache)
+    first = router.shortest_path(0, 9)
+    assert Router(core, "auto", cache=cache).shortest_path(0, 9) == first
+    assert len(searches) == 1
+    assert cache.hits == 1 and cache.misses == 1
+
+    closed = {first[1][0]}
+    detour = router.shortest_path(0, 9, closed=closed)
+    assert closed.isdisjoint(detour[1])
+    assert len(searches) == 2
+
+    assert router.paths_from(0, {9, 8, 7, 6, 5})[9] == first
+    assert len(searches) == 3
+    router.paths_from(0, {9, 8, 7, 6, 5})
+    assert len(searches) == 3
+
+def test_cache_invalidated_when_a_new_graph_loads():
+    """Test that loading a different network clears cached routes and reloading keeps them"""
+    service = NetworkService()
+    service.load_sample_network()
+    service.router(service.current_core).shortest_path(0, 3)
+    assert len(service.route_cache) == 1
+
+    service.load_sample_network()
+    assert len(service.route_cache) == 1
+
+    service.load_square_intersection_network()
+    assert len(service.route_cache) == 0
+
+def test_route_cache_stats_endpoint():
+    """Test that the counters are exposed for monitoring"""
+    client.post("/simulate/basic")
+    client.post("/simulate/basic")
+    response = client.get("/simulate/route-cache")
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["hits"] + stats["misses"] > 0
+    assert {"entries", "bytes", "evictions", "hit_rate"} <= stats.keys()
@@ -0,0 +1,113 @@
+"""
+Tests for goal-directed routing (A* and ALT landmarks).
+"""
+
+import random
+import pytest
+import networkx as nx
+from app.core.graph import CompactGraph
+from app.core.routing import Landmarks, Router, max_edge_speed
+from tests.helpers import city_graph
+
+def cost(core, edges):
+    """Travel time along a list of edge indices"""
+    return sum(float(core.travel_time[e]) for e in edges)
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_goal_directed_search_matches_dijkstra(directed):
+    """Test that A* and ALT find paths as short as Dijkstra with fewer expansions"""
+    core = city_graph(30, seed=11, directed=directed)
+    dijkstra = Router(core, "dijkstra")
+    astar = Router(core, "astar")
+    alt = Router(core, "alt", Landmarks.select(core, 6))
+
+    rng = random.Random(2)
+    checked = 0
+    for _ in range(60):
+        s, t = rng.randrange(core.num_nodes), rng.randrange(core.num_nodes)
+        try:
+            _, expected = dijkstra.shortest_path(s, t)
+        except nx.NetworkXNoPath:
+            with pytest.raises(nx.NetworkXNoPath):
+                alt.shortest_path(s, t)
+            continue
+        for router in (astar, alt):
+            nodes, edges = router.shortest_path(s, t)
+            assert nodes[0] == s and nodes[-1] == t
+            assert cost(core, edges) == pytest.approx(cost(core, expected))
+        checked += 1
+
+    assert checked > 30
+    assert astar.expanded < dijkstra.expanded
+    assert alt.expanded < astar.expanded
+
+def test_closed_edges_are_avoided():
+    """Test that goal-directed routing honours closures"""
+    core = city_graph(10, seed=4)
+    alt = Router(core, "alt", Landmarks.select(core, 4))
+    _, edges = alt.shortest_path(0, core.num_nodes - 1)
+    closed = set(edges[:2])
+    _, detour = alt.shortest_path(0, core.num_nodes - 1, closed=closed)
+    _, expected = Router(core, "dijkstra").shortest_path(0, core.num_nodes - 1, closed=closed)
+    assert closed.isdisjoint(detour)
+    assert cost(core, detour) == pytest.approx(cost(core, expected))
+
+def test_heuristic_disabled_without_coordinates():
+    """Test that nodes without coordinates fall back to a zero bound"""
+    G = nx.path_graph(4)
+    nx.set_edge_attributes(G, 1.0, "travel_time")
+    core = CompactGraph.from_networkx(G)
+    assert max_edge_speed(core) == float("inf")
+    assert Router(core, "astar").shortest_path(0, 3)[0] == [0, 1, 2, 3]
+
+def test_unknown_algorithm_rejected():
+    """Test that unsupported strategies are refused"""
+    core = city_graph(3, seed=1)
+    with pytest.raises(ValueError):
+        Router(core, "bfs")
+    with pytest.raises(ValueError):
+        Router(core, "alt")
+
+def test_landmarks_persist(tmp_path):
+    """Test that landmark tables round-trip and are tied to their graph"""
+    core = city_graph(8, seed=3, directed=True)
+    landmarks = Landmarks.select(core, 3)
+    path = landmarks.save(str(tmp_path / "lm"))
+
+    loaded = Landmarks.load(path, core.fingerprint())
+    assert loaded.nodes.tolist() == landmarks.nodes.tolist()
+    h, expected = loaded.heuristic(5), landmarks.heuristic(5)
+    assert [h(v) for v in range(core.num_nodes)] == [expected(v) for v in range(core.num_nodes)]
+    assert Landmarks.load(path, "other") is None
+
+def test_complex_simulation_selects_routing(client):
+    """Test that /simulate/complex accepts a routing strategy per request"""
+    for routing in ("dijkstra", "astar", "alt"):
+        response = client.post("/simulate/complex", json={
+            "vehicles_count": 4, "routing": routing, "landmarks": 2
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert data["routing"] == routing
+        assert len(data["routes"]) > 0
+
+    response = client.post("/simulate/complex", json={"routing": "teleport"})
+    assert response.status_code == 500
+
+@pytest.mark.parametrize("tree_min_targets", [1, 100])
+def test_paths_from_matches_point_queries(tree_min_targets):
+    """Test that one-to-many paths (tree or per target) match point-to-point costs"""
+    core = city_graph(12, seed=8, directed=True)
+    router = Router(core, "dijkstra", tree_min_targets=tree_min_targets)
+    targets = set(range(0, core.num_nodes, 7)) - {5}
+    paths = router.paths_from(5, targets)
+    assert paths
+    for target in targets:
+        try:
+            _, expected = router.shortest_path(5, target)
+        except nx.NetworkXNoPath:
+            assert target not in paths
+            continue
+        nodes, edges = paths[target]
+        assert nodes[0] == 5 and nodes[-1] == target
+        assert cost(core, edges) == pytest.approx(cost(core, expected))
@@ -0,0 +1,77 @@
+"""
+Tests for the parallel incident scenario runner.
+"""
+
+import numpy as np
+import pytest
+from app.core.graph import CompactGraph
+from app.core.scenarios import ScenarioRunner, route_times
+from app.core.shared_graph import SharedGraph
+from tests.helpers import grid_graph
+
+def test_shared_graph_round_trip():
+    """Test that an attached graph matches the original and is read-only"""
+    core = CompactGraph.from_networkx(grid_graph(5))
+    with SharedGraph(core) as shared:
+        attached, memory = SharedGraph.attach(shared.handle)
+        try:
+            assert attached.num_nodes == core.num_nodes and attached.num_edges == core.num_edges
+            assert np.array_equal(attached.travel_time, core.travel_time)
+            assert attached.dijkstra(0, 24)[0][24] == core.dijkstra(0, 24)[0][24]
+            with pytest.raises(ValueError):
+                attached.travel_time[0] = 0
+        finally:
+            del attached
+            memory.close()
+
+def test_route_times_read_shared_arrays_in_place():
+    """Test that scenario searches neither copy the shared CSR nor change the results"""
+    core = CompactGraph.from_networkx(grid_graph(5))
+    pairs = [(0, 24), (3, 20), (24, 0)]
+    with SharedGraph(core) as shared:
+        attached, memory = SharedGraph.attach(shared.handle)
+        try:
+            assert route_times(attached, pairs, {7: 2.0}) == route_times(core, pairs, {7: 2.0})
+            assert route_times(attached, pairs) == [core.dijkstra(s, t)[0][t] for s, t in pairs]
+            assert attached._lists is None and attached._weight_lists == {}
+        finally:
+            del attached
+            memory.close()
+
+def test_pool_matches_serial_run():
+    """Test that scenarios evaluated on a process pool equal the serial results"""
+    core = CompactGraph.from_networkx(grid_graph(8))
+    rng = np.random.default_rng(0)
+    pairs = rng.integers(0, core.num_nodes, (20, 2))
+    scenarios = [{int(e): 3.0 for e in rng.integers(0, core.num_edges, 6)} for _ in range(4)]
+    serial = ScenarioRunner(core).run(pairs, scenarios)
+    pooled = ScenarioRunner(core, workers=2, parallel_min=1).run(pairs, scenarios)
+    assert serial.shape == (5, 20)
+    assert np.array_equal(serial, pooled)
+    assert (serial[1:] >= serial[0]).all()
+
+def test_closures_delay_or_cut_off_routes():
+    """Test that a closed road lengthens detours and isolates dead ends"""
+    core = CompactGraph.from_networkx(grid_graph(3))
+    edge = core.find_edge(core.index_of(0), core.index_of(1))
+    base, closed = route_times(core, [(0, 1)]), route_times(core, [(0, 1)], {edge: float("inf")})
+    assert base == [10.0] and closed == [30.0]
+    cut = {core.find_edge(core.index_of(0), core.index_of(n)): float("inf") for n in (1, 3)}
+    assert route_times(core, [(0, 8)], cut) == [float("inf")]
+
+def test_scenario_endpoint(client):
+    """Test batch scenario comparison through the API"""
+    response = client.post("/simulate/scenarios", json={
+        "vehicles_count": 30,
+        "workers": 1,
+        "scenarios": [
+            {"id": "minor", "incidents": [{"road_id": "1-2", "severity": 0.1}]},
+            {"incidents": [{"road_id": "1-2", "severity": 1.0}, {"road_id": "2-3", "severity": 1.0}]},
+        ],
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert [s["id"] for s in data["scenarios"]] == ["minor", "2"]
+    assert sorted(data["ranking"]) == ["2", "minor"]
+    for scenario in data["scenarios"]:
+        assert scenario["extra_travel_time"] >= 0 and scenario["rank"] in (1, 2)
@@ -0,0 +1,81 @@
+"""
+Tests for compiled signal plans and the signal state endpoint.
+"""
+
+import numpy as np
+from app.core.signals import GREEN, RED, YELLOW, SignalTable
+from tests.helpers import corridor
+
+def random_table(intersections=200, seed=0):
+    """Sequential plans with random greens, yellows and offsets at every intersection"""
+    rng = np.random.default_rng(seed)
+    keys, start, span, cycle, green = [], [], [], [], []
+    for node in range(intersections):
+        phases, total = [], 0.0
+        for _ in range(rng.integers(2, 5)):
+            g, y = 7 + 30 * rng.random(), float(rng.choice([0, 3, 5]))
+            phases.append((total, g, y))
+            total += g + y
+        offset = total * rng.random()
+        for j, (s, g, y) in enumerate(phases):
+            keys.append(node * 1000 + j)
+            start.append((s + offset) % total)
+            green.append(g)
+            span.append(g + y)
+            cycle.append(total)
+    return SignalTable(1000, np.array(keys), np.array(start), np.array(span), np.array(cycle), np.array(green))
+
+def test_states_match_the_plans():
+    """Test that binary-searched states agree with the phase arithmetic"""
+    table = random_table()
+    times = np.random.default_rng(1).uniform(0, 2000, 40)
+    states, remaining = table.states(np.arange(len(table)), times)
+
+    phase = np.mod(times[:, None] - table.start, table.period)
+    expected = np.where(phase < table.green, GREEN, np.where(phase < table.span, YELLOW, RED))
+    assert (states == expected).all()
+    assert (remaining > 0).all() and (remaining <= table.period).all()
+
+    # Just before the reported change every light still shows the same state
+    later, _ = table.states(np.arange(len(table)), times[:1] + remaining[0].min() - 1e-6)
+    assert (later == states[:1]).all()
+
+def test_states_of_unsignalized_approaches():
+    """Test that unsignalized approaches read as green forever"""
+    table = random_table(3)
+    states, remaining = table.states([-1, 0], [0.0, 50.0])
+    assert states[:, 0].tolist() == [GREEN, GREEN]
+    assert np.isinf(remaining[:, 0]).all() and np.isfinite(remaining[:, 1]).all()
+    assert table.intersection_approaches([1, 7]).tolist() == np.flatnonzero(table.keys // 1000 == 1).tolist()
+
+def test_compile_reuses_a_compiled_table():
+    """Test that engines can be handed an already compiled table"""
+    core, _ = corridor([100, 100], [10, 10])
+    lights = [{"intersection_id": "1", "total_cycle_time": 60, "cycles": [
+        {"road_id": "1-0", "green_start": 0, "green_duration": 25, "yellow_duration": 5},
+        {"road_id": "1-2", "green_start": 30, "green_duration": 25, "yellow_duration": 5},
+    ]}]
+    table = SignalTable.compile(core, lights)
+    assert SignalTable.compile(core, table) is table
+    states, remaining = table.states(table.approaches([1, 1], [0, 2]), [27.0])
+    assert states.tolist() == [[YELLOW, RED]]
+    assert remaining.tolist() == [[3.0, 3.0]]
+
+def test_signal_state_endpoint(client):
+    """Test batch signal state queries for the current simulation"""
+    data = client.post("/simulate/complex", json={"vehicles_count": 5}).json()
+    light = data["traffic_lights"][0]
+    phase = light["cycles"][0]
+
+    response = client.get("/signals/state", params={
+        "t": f"{phase['green_start']},{phase['green_start'] + phase['green_duration']}",
+        "ids": light["intersection_id"],
+    })
+    assert response.status_code == 200
+    states = response.json()
+    assert len(states["road_ids"]) == len(light["cycles"])
+    column = states["road_ids"].index(phase["road_id"])
+    assert [row[column] for row in states["states"]] == ["green", "yellow"]
+
+    everything = client.get("/signals/state", params={"t": "0"}).json()
+    assert len(everything["road_ids"]) == sum(len(l["cycles"]) for l in data["traffic_lights"])
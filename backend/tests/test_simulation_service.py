@@ -80,3 +80,41 @@ def test_run_complex_simulation():
     assert len(result['routes']) > 0
     assert len(result['incidents']) == 2
     assert result['duration'] == 600
+
+def test_routes_grouped_by_origin(complex_test_graph, monkeypatch):
+    """Test that many vehicles cost one shortest-path tree per distinct origin"""
+    from app.core.graph import CompactGraph
+    service = SimulationService()
+    trees = []
+    original = CompactGraph.dijkstra
+    def counting_dijkstra(self, source, *args, **kwargs):
+        trees.append(source)
+        return original(self, source, *args, **kwargs)
+    monkeypatch.setattr(CompactGraph, "dijkstra", counting_dijkstra)
+
+    routes = service._generate_random_routes(complex_test_graph, 5000)
+
+    assert len(routes) == 5000
+    assert len(trees) == len(set(trees)) <= complex_test_graph.number_of_nodes()
+    assert len({route["id"] for route in routes}) == 5000
+    for route in routes[:50]:
+        assert route["source"] != route["target"]
+        assert route["path"][0] == route["source"] and route["path"][-1] == route["target"]
+
+def test_simulation_keeps_its_network_snapshot():
+    """Test that a simulation and its signal states stay on the network it started on"""
+    service = SimulationService()
+    network = service.network_service
+    network.load_square_intersection_network()
+
+    def load_other_network(done, total, stage):
+        if stage == "routes":
+            network.load_sample_network()
+
+    result = service.run_complex_simulation(300, [], 6, engine="micro", seed=1, progress=load_other_network)
+    square_nodes = {str(node) for node in range(1, 9)}
+    assert all(set(route["path"]) <= square_nodes for route in result["routes"])
+    assert any(node in {"5", "6", "7", "8"} for route in result["routes"] for node in route["path"])
+    assert network.graph_version != service._simulation_core.fingerprint()
+    # The external approaches only exist in the square intersection network
+    assert "1-5" in service.signal_states([0.0])["road_ids"]
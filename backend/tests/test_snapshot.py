@@ -0,0 +1,50 @@
+"""
+Tests for memory-mapped graph snapshots.
+"""
+
+import json
+import os
+import pytest
+import numpy as np
+import networkx as nx
+from app.core.graph import CompactGraph
+from app.core.snapshot import SnapshotStore, canonical_bbox, snapshot_key
+
+def test_canonical_bbox_snaps_outward():
+    """Test that nearby bounding boxes share one canonical key"""
+    a = canonical_bbox(31.52204, 31.51996, 74.36071, 74.35869)
+    b = canonical_bbox(31.52201, 31.51999, 74.36079, 74.35861)
+
+    assert a == b == (31.5221, 31.5199, 74.3608, 74.3586)
+    assert snapshot_key(a) == snapshot_key(b)
+    assert snapshot_key(a) != snapshot_key(a, network_type="walk")
+
+def test_snapshot_round_trip(tmp_path, complex_test_graph):
+    """Test that a saved snapshot loads back memory-mapped with identical data"""
+    store = SnapshotStore(str(tmp_path))
+    core = CompactGraph.from_networkx(complex_test_graph)
+    store.save("abc", core, bbox=[1, 0, 1, 0])
+
+    loaded = store.load("abc")
+    assert loaded is not None
+    assert isinstance(np.load(tmp_path / "abc" / "indices.npy", mmap_mode="r"), np.memmap)
+    np.testing.assert_array_equal(loaded.indptr, core.indptr)
+    np.testing.assert_array_equal(loaded.travel_time, core.travel_time)
+    assert loaded.names == core.names
+
+    path, _ = loaded.shortest_path(loaded.index_of(1), loaded.index_of(9))
+    expected = nx.shortest_path(complex_test_graph, 1, 9, weight='travel_time')
+    assert [loaded.node_id(n) for n in path] == expected
+
+def test_snapshot_version_mismatch_is_ignored(tmp_path, basic_test_graph):
+    """Test that snapshots from another format version are treated as missing"""
+    store = SnapshotStore(str(tmp_path))
+    store.save("abc", CompactGraph.from_networkx(basic_test_graph))
+
+    meta_path = tmp_path / "abc" / "meta.json"
+    meta = json.loads(meta_path.read_text())
+    meta["version"] = -1
+    meta_path.write_text(json.dumps(meta))
+
+    assert store.load("abc") is None
+    assert store.load("missing") is None
@@ -6,13 +6,14 @@ import pytest
 from app.services.simulation_service import SimulationService
 from app.services.network_service import NetworkService
 from app.api.simulation import Incident
+from tests.helpers import read_geojson
 
 def test_square_intersection_network():
     """Test creation of square intersection network"""
     service = NetworkService()
     
     # Get the square intersection network
-    network = service.get_square_intersection_network()
+    network = read_geojson(service.get_square_intersection_network())
     
     # Check that the network is valid
     assert network is not None
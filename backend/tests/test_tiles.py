@@ -0,0 +1,148 @@
+"""
+Tests for tiled network loading.
+"""
+
+import pytest
+import numpy as np
+import networkx as nx
+from types import SimpleNamespace
+from app.core import config
+from app.core.graph import CompactGraph
+from app.core.overpass_cache import OverpassCache
+from app.core.snapshot import SnapshotStore
+from app.core.tiles import clip_core, merge_cores, tile_bbox, tiles_for_bbox
+from app.services import network_service as network_module
+from app.services.network_service import NetworkService
+from tests.fixtures import TestFixtures
+from tests.helpers import read_geojson
+
+def fake_graph_from_bbox(G, calls):
+    """Mimic OSMnx 2.x graph_from_bbox(truncate_by_edge=True) on an in-memory graph"""
+    def graph_from_bbox(bbox, network_type, truncate_by_edge=False):
+        west, south, east, north = bbox
+        calls.append(bbox)
+        inside = {n for n, d in G.nodes(data=True)
+                  if south <= d['y'] <= north and west <= d['x'] <= east}
+        edges = [(u, v) for u, v in G.edges() if u in inside or v in inside]
+        if not edges:
+            raise ValueError("Found no graph nodes within the requested polygon")
+        return G.edge_subgraph(edges).copy()
+    return graph_from_bbox
+
+@pytest.fixture
+def tiled_service(tmp_path, monkeypatch):
+    """NetworkService backed by a fake OSMnx and a temporary tile cache"""
+    calls = []
+    G = TestFixtures.create_complex_test_graph()
+    monkeypatch.setattr(network_module.ox, "graph_from_bbox", fake_graph_from_bbox(G, calls))
+    monkeypatch.setattr(network_module.ox, "convert", SimpleNamespace(to_undirected=lambda G: G))
+    monkeypatch.setattr(config, "NETWORK_TILE_SIZE", 0.003)
+
+    cache = OverpassCache(str(tmp_path / "overpass"))
+    monkeypatch.setattr(cache, "install", lambda ox: True)
+
+    def make_service():
+        service = NetworkService()
+        service.snapshots = SnapshotStore(str(tmp_path / "snapshots"))
+        service.overpass_cache = cache
+        return service
+
+    return make_service, calls, G
+
+def test_tiles_for_bbox():
+    """Test that a bbox maps onto the covering grid tiles"""
+    tiles = tiles_for_bbox(0.035, 0.005, 0.015, -0.005, 0.01)
+    assert tiles == [(r, c) for r in range(0, 4) for c in range(-1, 2)]
+    assert tile_bbox((0, -1), 0.01) == (0.01, 0.0, 0.0, -0.01)
+
+def test_default_tile_limit_covers_max_span():
+    """Test that the default tile limit admits an unaligned bbox of NETWORK_MAX_SPAN degrees a side"""
+    span, size = config.NETWORK_MAX_SPAN, config.NETWORK_TILE_SIZE
+    tiles = tiles_for_bbox(0.011 + span, 0.011, 0.013 + span, 0.013, size)
+    assert len(tiles) <= config.NETWORK_MAX_TILES
+
+def test_merge_deduplicates_border_edges(complex_test_graph):
+    """Test that edges present in two neighbouring tiles are kept once"""
+    left = complex_test_graph.subgraph([1, 2, 3, 4, 5]).copy()
+    right = complex_test_graph.subgraph([2, 3, 5, 6, 7, 8, 9, 10]).copy()
+    merged = merge_cores([CompactGraph.from_networkx(left), CompactGraph.from_networkx(right)])
+
+    expected = nx.compose(left, right)
+    assert merged.num_nodes == expected.number_of_nodes()
+    assert merged.num_edges == expected.number_of_edges()
+    assert sorted(merged.names) == sorted({d['name'] for _, _, d in expected.edges(data=True)})
+
+def test_clip_core(complex_test_graph):
+    """Test clipping a graph to a bbox keeps only inner nodes and their edges"""
+    core = CompactGraph.from_networkx(complex_test_graph)
+    clipped = clip_core(core, 40.7160, 40.7128, -74.0050, -74.0080)
+
+    expected = complex_test_graph.subgraph(
+        [n for n, d in complex_test_graph.nodes(data=True)
+         if 40.7128 <= d['y'] <= 40.7160 and -74.0080 <= d['x'] <= -74.0050]
+    )
+    assert clipped.num_nodes == expected.number_of_nodes()
+    assert clipped.num_edges == expected.number_of_edges()
+
+def test_get_network_stitches_tiles(tiled_service):
+    """Test that a bbox is loaded tile by tile and stitched into one graph"""
+    make_service, calls, G = tiled_service
+    bbox = SimpleNamespace(min_x=-74.0091, min_y=40.7124, max_x=-74.0029, max_y=40.7171)
+
+    service = make_service()
+    service.get_network(bbox)
+
+    assert len(calls) == 9
+    core = service.current_core
+    assert core.num_nodes == G.number_of_nodes()
+    assert core.num_edges == G.number_of_edges()
+
+    expected = nx.single_source_dijkstra_path_length(G, 1, weight='length')
+    merged = service.current_graph
+    for target, length in expected.items():
+        assert nx.shortest_path_length(merged, 1, target, weight='length') == pytest.approx(length)
+
+def test_repeated_bbox_reuses_its_snapshot(tiled_service):
+    """Test that a bbox loaded before is memory-mapped without touching its tiles"""
+    make_service, calls, G = tiled_service
+    bbox = SimpleNamespace(min_x=-74.0091, min_y=40.7124, max_x=-74.0029, max_y=40.7171)
+    network = read_geojson(make_service().get_network(bbox))
+
+    service = make_service()
+    service._load_tiles = lambda tiles: pytest.fail("tiles should not be loaded")
+    cached = read_geojson(service.get_network(bbox))
+    assert len(cached['features']) == len(network['features'])
+    assert service.current_core.num_edges == G.number_of_edges()
+
+def test_merge_keeps_parallel_edges_apart():
+    """Test that border duplicates match by OSM identity, not by length"""
+    G = nx.MultiGraph()
+    G.add_node(1, x=0.0, y=0.0)
+    G.add_node(2, x=1.0, y=0.0)
+    G.add_edge(1, 2, key=0, osmid=10, length=100.0, travel_time=1.0)
+    G.add_edge(1, 2, key=1, osmid=11, length=100.0, travel_time=1.0)
+    left = CompactGraph.from_networkx(G)
+    right = CompactGraph.from_networkx(G)
+    # The same road seen from another tile with a rounding difference in length
+    right.length = right.length + np.float32(0.001)
+
+    merged = merge_cores([left, right])
+    assert merged.num_edges == 2
+    assert sorted(merged.osm_ids.tolist()) == [10, 11]
+
+def test_overlapping_requests_hit_tile_cache(tiled_service):
+    """Test that a panned viewport only fetches tiles not seen before"""
+    make_service, calls, G = tiled_service
+
+    make_service().get_network(
+        SimpleNamespace(min_x=-74.0091, min_y=40.7124, max_x=-74.0061, max_y=40.7171)
+    )
+    first = len(calls)
+
+    # Pan east by one tile column: only the new column is fetched
+    service = make_service()
+    service.get_network(
+        SimpleNamespace(min_x=-74.0061, min_y=40.7124, max_x=-74.0031, max_y=40.7171)
+    )
+    assert len(calls) - first == 3
+    assert service.current_core.num_nodes > 0
@@ -0,0 +1,96 @@
+"""
+Tests for the Webster signal timing optimizer.
+"""
+
+import numpy as np
+import pytest
+from app.api.simulation import Demand
+from app.core.webster import WebsterOptimizer
+from app.services.simulation_service import SimulationService
+from tests.helpers import corridor
+
+def two_approach_flows(optimizer, from_left, from_right):
+    """Flow array for the middle node of a 0-1-2 corridor"""
+    flows = np.zeros(len(optimizer))
+    flows[optimizer.approaches([1], [0])[0]] = from_left
+    flows[optimizer.approaches([1], [2])[0]] = from_right
+    return flows
+
+def test_flows_count_routed_vehicles_per_approach():
+    """Test that vehicles count on the approaches they cross, not at their destination"""
+    core, path = corridor([100, 100, 100], [10, 10, 10])
+    optimizer = WebsterOptimizer(core)
+    assert optimizer.intersections.tolist() == [1, 2]
+
+    flows = optimizer.flows([path] * 3 + [(path[0][:2], path[1][:1])], period=1800)
+    assert flows[optimizer.approaches([1, 2], [0, 1])].tolist() == [6.0, 6.0]
+    assert flows[optimizer.approaches([1, 2], [2, 3])].tolist() == [0.0, 0.0]
+    assert optimizer.approaches([3], [2])[0] == -1
+
+def test_webster_cycle_and_splits():
+    """Test Webster's cycle length and flow-proportional green splits"""
+    core, _ = corridor([100, 100], [10, 10])
+    optimizer = WebsterOptimizer(core, saturation_flow=1800, lost_time=4, yellow=5)
+    plan = optimizer.optimize(two_approach_flows(optimizer, 900, 450))
+
+    # Y = 0.5 + 0.25, L = 2 * 4: C = (1.5 * 8 + 5) / (1 - 0.75) = 68
+    assert plan["cycle"][0] == pytest.approx(68.0)
+    left, right = optimizer.approaches([1, 1], [0, 2])
+    assert plan["green"][left] == pytest.approx(2 * plan["green"][right], abs=0.2)
+    assert plan["green"][left] + plan["green"][right] + 10 == pytest.approx(68.0)
+    assert plan["delay"][left] > 0 and np.isfinite(plan["delay"]).all()
+
+def test_oversaturated_approach_has_no_finite_delay():
+    """Test that demand above capacity caps the cycle and reports unbounded delay"""
+    core, _ = corridor([100, 100], [10, 10])
+    optimizer = WebsterOptimizer(core)
+    plan = optimizer.optimize(two_approach_flows(optimizer, 1800, 1800))
+    assert plan["cycle"][0] == pytest.approx(optimizer.max_cycle)
+    assert np.isinf(plan["delay"]).all()
+
+    lights = optimizer.traffic_lights(plan)
+    assert lights[0]["expected_delay"] is None
+    assert all(cycle["expected_delay"] is None for cycle in lights[0]["cycles"])
+    assert lights[0]["total_cycle_time"] == sum(
+        cycle["green_duration"] + cycle["yellow_duration"] for cycle in lights[0]["cycles"]
+    )
+
+def test_webster_timings_from_demand_with_incident(dynamic_test_graph, dynamic_test_incidents):
+    """Test that a demand matrix drives the splits and incidents cut saturation flow"""
+    service = SimulationService()
+    core = service.network_service.core_for(dynamic_test_graph)
+    demand = [Demand(source="4", target="2", flow=600), Demand(source="9", target="2", flow=100)]
+
+    lights, summary = service._generate_webster_traffic_light_timings(core, [], [], 300, demand)
+    light = next(light for light in lights if light["intersection_id"] == "1")
+    cycles = {cycle["road_id"]: cycle for cycle in light["cycles"]}
+    assert cycles["1-4"]["flow"] == 600
+    assert cycles["1-4"]["green_duration"] > cycles["1-3"]["green_duration"]
+    assert summary["oversaturated"] == 0 and summary["mean_delay"] > 0
+
+    # Severity 0.7 on 1-2 leaves 30% of its saturation flow, so vehicles from 2 wait longer at 1
+    nodes = [core.index_of(n) for n in (2, 1, 4)]
+    path = (nodes, [core.find_edge(u, v) for u, v in zip(nodes, nodes[1:])])
+    delays = []
+    for incidents in ([], dynamic_test_incidents):
+        lights, _ = service._generate_webster_traffic_light_timings(core, [path] * 50, incidents, 900)
+        light = next(light for light in lights if light["intersection_id"] == "1")
+        delays.append(next(c for c in light["cycles"] if c["road_id"] == "1-2")["expected_delay"])
+    assert delays[1] > delays[0]
+
+def test_complex_simulation_webster_timing(client):
+    """Test that /simulate/complex can replace the fixed timings with Webster plans"""
+    response = client.post("/simulate/complex", json={
+        "vehicles_count": 30, "duration": 300, "engine": "micro", "signal_timing": "webster"
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["signal_timing"] == "webster"
+    assert set(data["signal_delay"]) == {"mean_delay", "total_delay", "oversaturated"}
+    for light in data["traffic_lights"]:
+        assert "expected_delay" in light
+        for cycle in light["cycles"]:
+            assert cycle["green_duration"] >= 7
+
+    response = client.post("/simulate/complex", json={"signal_timing": "optimal"})
+    assert response.status_code == 500
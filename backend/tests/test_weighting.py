@@ -0,0 +1,63 @@
+"""
+Tests for vectorized edge speed and travel-time weighting.
+"""
+
+import math
+import pytest
+import numpy as np
+import networkx as nx
+from app.core import config
+from app.core.weighting import add_travel_times, edge_speeds, parse_maxspeed, speed_table
+
+@pytest.mark.parametrize("tag, expected", [
+    ("50", 50.0),
+    ("30 mph", 30 * 1.609344),
+    ("40;60", 50.0),
+    (["40", "60"], 50.0),
+    (70, 70.0),
+    ("none", None),
+    ("signals", None),
+    ("PK:urban", None),
+    (None, None),
+])
+def test_parse_maxspeed(tag, expected):
+    """Test parsing of the maxspeed tag variants found in OSM"""
+    speed = parse_maxspeed(tag)
+    if expected is None:
+        assert math.isnan(speed)
+    else:
+        assert speed == pytest.approx(expected)
+
+def test_edge_speeds_prefer_tags_then_class_table():
+    """Test that tagged speeds win and untagged edges are imputed by class"""
+    speeds = edge_speeds(
+        ["primary", "residential", "primary_link", ["secondary", "tertiary"], "track", None],
+        ["80", None, None, "none", None, None],
+        table={"primary": 60, "residential": 30, "secondary": 50},
+        default=45,
+    )
+    np.testing.assert_allclose(speeds, [80, 30, 60, 50, 45, 45])
+
+def test_speed_table_overrides(monkeypatch):
+    """Test that configured per-class speeds replace the defaults"""
+    monkeypatch.setattr(config, "HIGHWAY_SPEEDS", {"residential": 25})
+    table = speed_table()
+    assert table["residential"] == 25
+    assert table["motorway"] == 100
+
+def test_add_travel_times_on_multigraph():
+    """Test that speeds and travel times (seconds) are written back to every edge"""
+    G = nx.MultiGraph()
+    G.add_edge(1, 2, length=1000, highway="motorway")
+    G.add_edge(1, 2, length=1000, highway="residential", maxspeed="20")
+    G.add_edge(2, 3, length=500)
+    add_travel_times(G, table={"motorway": 100}, default=50)
+
+    assert G[1][2][0]["speed_kph"] == 100
+    assert G[1][2][0]["travel_time"] == pytest.approx(36.0)
+    assert G[1][2][1]["travel_time"] == pytest.approx(180.0)
+    assert G[2][3][0]["travel_time"] == pytest.approx(36.0)
+
+def test_add_travel_times_empty_graph():
+    """Test weighting a graph without edges"""
+    assert add_travel_times(nx.Graph()).number_of_edges() == 0
@@ -0,0 +1,64 @@
+// Decoder for the backend's compact binary network format
+// (see backend/app/core/binary_network.py for the layout)
+
+export const BINARY_NETWORK_MEDIA_TYPE = 'application/vnd.smart-traffic.network'
+
+const FLAG_STRING_IDS = 1
+
+const align8 = (offset) => offset + ((8 - (offset % 8)) % 8)
+
+const readStringTable = (buffer, view, offset, count) => {
+  const size = view.getUint32(offset, true)
+  offset += 4
+  const text = new TextDecoder().decode(new Uint8Array(buffer, offset, size))
+  return { strings: count ? text.split('\0') : [], offset: align8(offset + size) }
+}
+
+export const decodeBinaryNetwork = (buffer) => {
+  const view = new DataView(buffer)
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4))
+  if (magic !== 'STNB' || view.getUint16(4, true) !== 1) {
+    throw new Error('Unsupported binary network payload')
+  }
+  const flags = view.getUint16(6, true)
+  const nodes = view.getUint32(8, true)
+  const edges = view.getUint32(12, true)
+  const names = view.getUint32(16, true)
+  const scale = view.getUint32(20, true)
+  let offset = align8(24)
+
+  const take = (ArrayType, count) => {
+    const column = new ArrayType(buffer, offset, count)
+    offset = align8(offset + column.byteLength)
+    return column
+  }
+
+  let nodeIds
+  if (flags & FLAG_STRING_IDS) {
+    const table = readStringTable(buffer, view, offset, nodes)
+    nodeIds = table.strings
+    offset = table.offset
+  } else {
+    nodeIds = Array.from(take(BigInt64Array, nodes), (id) => id.toString())
+  }
+
+  // Coordinates are delta-encoded integers; undo the deltas and the quantization
+  const undelta = (deltas) => {
+    const out = new Float64Array(deltas.length)
+    let acc = 0
+    for (let i = 0; i < deltas.length; i++) {
+      acc += deltas[i]
+      out[i] = acc / scale
+    }
+    return out
+  }
+  const lon = undelta(take(Int32Array, nodes))
+  const lat = undelta(take(Int32Array, nodes))
+  const edgePairs = take(Int32Array, 2 * edges)
+  const length = take(Float32Array, edges)
+  const travelTime = take(Float32Array, edges)
+  const nameIds = take(Int32Array, edges)
+  const roadNames = readStringTable(buffer, view, offset, names).strings
+
+  return { nodeIds, lon, lat, edgePairs, length, travelTime, nameIds, names: roadNames }
+}